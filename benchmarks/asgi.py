@@ -0,0 +1,93 @@
+"""Minimal in-process ASGI client.
+
+Calls the FastAPI app directly, without sockets or extra dependencies, and
+records time-to-first-byte for streaming responses.
+"""
+import time, uuid, asyncio
+from typing import Dict, List, Optional, Tuple
+
+
+class Response:
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes, ttfb: Optional[float], elapsed: float):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.ttfb = ttfb
+        self.elapsed = elapsed
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+
+def encode_form(fields: Dict[str, str] = None, files: List[Tuple[str, str, bytes]] = None) -> Tuple[bytes, str]:
+    """Build a multipart/form-data body. `files` is a list of (field, filename, content)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, filename, content in files or []:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+async def request(app, method: str, path: str, body: bytes = b"", content_type: str = None,
+                  headers: Dict[str, str] = None) -> Response:
+    raw_headers = [(b"host", b"benchmark"), (b"content-length", str(len(body)).encode())]
+    if content_type:
+        raw_headers.append((b"content-type", content_type.encode()))
+    for key, value in (headers or {}).items():
+        raw_headers.append((key.lower().encode(), value.encode()))
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+
+    finished = asyncio.Event()
+    sent_body = False
+    status, response_headers, chunks = 0, {}, []
+    ttfb = None
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Only report a disconnect once the response is complete
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, response_headers, ttfb
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = {k.decode(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            if message.get("body"):
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                chunks.append(message["body"])
+            if not message.get("more_body"):
+                finished.set()
+
+    await app(scope, receive, send)
+    finished.set()
+    return Response(status, response_headers, b"".join(chunks), ttfb, time.perf_counter() - start)
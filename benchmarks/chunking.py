@@ -0,0 +1,108 @@
+"""Chunking throughput and per-worker memory of the text splitters.
+
+    python -m benchmarks.chunking --size-kb 200 --repeat 20
+
+Compares `utils.chunking.TextSplitter` with llama_index's `SentenceSplitter`,
+which `clean_page_content` used before, when llama_index is installed. For
+each implementation a fresh interpreter imports it, splits the fixtures
+inflated to `--size-kb` into 1024-token chunks and truncates them to their
+first 5000 tokens (what `clean_page_content` does), and reports:
+
+    - import time and peak RSS after the import, i.e. the cost per worker
+    - split throughput in MB/s
+    - truncate latency per page
+"""
+import sys, json, argparse, subprocess
+
+from benchmarks.common import SRC, load_fixtures, save_results
+
+_PROBE = r"""
+import sys, json, time, resource
+sys.path.insert(0, {src!r})
+rss = lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+baseline = rss()
+start = time.perf_counter()
+if {variant!r} == "chunking":
+    from utils.chunking import TextSplitter
+    split = lambda text: TextSplitter(chunk_size=1024).split_text(text)
+    truncate = lambda text: TextSplitter(chunk_size=5000).truncate(text)
+else:
+    from llama_index.core.node_parser import SentenceSplitter
+    splitter = SentenceSplitter()
+    split = lambda text: splitter._split_text(text, chunk_size=1024)
+    def truncate(text):
+        if len(splitter._tokenizer(text)) > 5000:
+            return splitter._split_text(text, chunk_size=5000)[0]
+        return text
+imported = time.perf_counter() - start
+import_rss = rss()
+
+pages = json.loads(sys.stdin.read())
+size = sum(len(page.encode()) for page in pages)
+split(pages[0])
+start = time.perf_counter()
+chunks = 0
+for _ in range({repeat}):
+    for page in pages:
+        chunks += len(split(page))
+split_time = time.perf_counter() - start
+start = time.perf_counter()
+for _ in range({repeat}):
+    for page in pages:
+        truncate(page)
+truncate_time = time.perf_counter() - start
+print(json.dumps({{
+    "variant": {variant!r},
+    "import_ms": round(imported * 1000, 1),
+    "import_rss_mb": round(import_rss - baseline, 1),
+    "peak_rss_mb": round(rss(), 1),
+    "split_mb_per_s": round(size * {repeat} / split_time / 1e6, 2),
+    "chunks_per_page": round(chunks / {repeat} / len(pages), 1),
+    "truncate_ms_per_page": round(truncate_time / {repeat} / len(pages) * 1000, 2),
+}}))
+"""
+
+
+def _pages(size_kb: int):
+    fixtures = load_fixtures()
+    target = size_kb * 1024
+    return [
+        ((text + "\n\n") * (target // len(text) + 1))[:target]
+        for text in fixtures["opportunities"] + fixtures["applications"]
+    ]
+
+
+def run_variant(variant: str, pages, repeat: int):
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(src=SRC, variant=variant, repeat=repeat)],
+        input=json.dumps(pages), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return {"variant": variant, "error": result.stderr.strip().splitlines()[-1]}
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-kb", type=int, default=200, help="Size of each page")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--out", default=None, help="Results directory")
+    args = parser.parse_args()
+
+    pages = _pages(args.size_kb)
+    runs = [run_variant(variant, pages, args.repeat) for variant in ("chunking", "llama_index")]
+    for run in runs:
+        if "error" in run:
+            print(f"{run['variant']:<12} skipped: {run['error']}")
+            continue
+        print(
+            f"{run['variant']:<12} import {run['import_ms']:>7} ms  +{run['import_rss_mb']:>6} MB RSS  "
+            f"split {run['split_mb_per_s']:>6} MB/s  truncate {run['truncate_ms_per_page']:>7} ms/page  "
+            f"peak {run['peak_rss_mb']} MB"
+        )
+    path = save_results("chunking", {"config": vars(args), "runs": runs}, *([args.out] if args.out else []))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Shared helpers for the benchmark scenarios."""
+import os, sys, json, time, platform, resource, subprocess
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def configure_environment(port: int, rate_limits: Optional[str] = None):
+    """Point both SDKs at the mock provider. Must run before anything under
+    `src/` is imported, since `configs` reads the environment at import time."""
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    # Unique benchmark inputs are near-duplicates of each other; measure the pipeline, not the cache
+    os.environ.setdefault("SEMANTIC_CACHE", "0")
+    # Usage totals and translations stay in memory instead of accumulating in files across runs
+    os.environ.setdefault("USAGE_DB_PATH", "")
+    os.environ.setdefault("TRANSLATION_MEMORY_PATH", "")
+    os.environ["LLM_RATE_LIMITS"] = rate_limits or json.dumps({
+        "groq": {"rpm": 1e6, "tpm": 1e9},
+        "openai": {"rpm": 1e6, "tpm": 1e9},
+    })
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+
+
+def start_mock_provider(port: int, latency: float, jitter: float, distribution: str,
+                        token_rate: float, error_rate: float = 0.0):
+    from utils.fake_provider import serve, FakeProviderConfig
+
+    with open(os.path.join(FIXTURES, "canned_responses.json")) as f:
+        responses = json.load(f)
+    config = FakeProviderConfig(
+        latency=latency,
+        jitter=jitter,
+        distribution=distribution,
+        error_rate=error_rate,
+        token_delay=1.0 / token_rate if token_rate > 0 else 0.0,
+        content=read_fixture("narration.txt"),
+        responses=responses,
+    )
+    return serve(port=port, config=config, background=True)
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def load_fixtures() -> Dict[str, List[str]]:
+    names = sorted(os.listdir(FIXTURES))
+    return {
+        "opportunities": [read_fixture(name) for name in names if name.startswith("jd_")],
+        "applications": [read_fixture(name) for name in names if name.startswith("cv_")],
+    }
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+    return {
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def save_results(name: str, results: Dict, out_dir: str = RESULTS) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    results = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        **results,
+    }
+    path = os.path.join(out_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def compare(results: Dict, baseline_path: str, tolerance: float = 0.10) -> List[str]:
+    """Return a line for every metric that got worse than the baseline by more
+    than `tolerance` (relative). Throughput regresses when it drops, everything
+    else when it grows."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for run, base_run in zip(results.get("runs", []), baseline.get("runs", [])):
+        label = f"{run.get('scenario')}@{run.get('users')}u"
+        checks = [("throughput_rps", run.get("throughput_rps"), base_run.get("throughput_rps"), -1)]
+        for metric in ("latency", "ttfb"):
+            for q in ("p50", "p95", "p99"):
+                checks.append((f"{metric}.{q}", (run.get(metric) or {}).get(q), (base_run.get(metric) or {}).get(q), 1))
+        regressions += _regressions(label, checks, tolerance)
+
+    checks = [("peak_rss_mb", results.get("peak_rss_mb"), baseline.get("peak_rss_mb"), 1)]
+    return regressions + _regressions("process", checks, tolerance)
+
+
+def _regressions(label: str, checks: List, tolerance: float) -> List[str]:
+    lines = []
+    for metric, value, base, direction in checks:
+        if not value or not base:
+            continue
+        change = (value - base) / base
+        if change * direction > tolerance:
+            lines.append(f"{label} {metric}: {base} -> {value} ({change:+.0%})")
+    return lines
@@ -0,0 +1,77 @@
+"""Time to the first narration byte of `/evaluate-profile` and `/profile-helper`.
+
+    python -m benchmarks.narration --latency 0.8 --token-rate 250
+
+Narrates one evaluation and one improvement set, with each path:
+
+    - `template`: `core.narration`, rendered locally from the result
+    - `llm`: `structured_output_chat` on the compact JSON, streamed from the
+      mock provider (needs the provider SDKs installed)
+
+Reports the milliseconds to the first byte and to the end of the narration,
+and its size.
+"""
+import sys, time, argparse
+
+from benchmarks.common import configure_environment, start_mock_provider, save_results
+from benchmarks.storage import _population
+
+
+def _measure(pieces) -> dict:
+    start = time.perf_counter()
+    first, size = None, 0
+    for piece in pieces:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(piece.encode())
+    return {
+        "first_byte_ms": round((first or 0.0) * 1000, 3),
+        "total_ms": round((time.perf_counter() - start) * 1000, 3),
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8931)
+    parser.add_argument("--latency", type=float, default=0.8, help="Median provider latency in seconds")
+    parser.add_argument("--token-rate", type=float, default=250.0, help="Streamed tokens per second")
+    parser.add_argument("--skip-llm", action="store_true", help="Only measure the templated narration")
+    parser.add_argument("--out", default=None, help="Results directory")
+    args = parser.parse_args()
+
+    configure_environment(args.port)
+    from core.narration import narrate_evaluation, narrate_improvements
+    from core.serialization import serialize
+    from utils.helpers import structured_output_chat
+
+    results, suggestions = _population(1)
+    inputs = {"evaluation": (results[0], narrate_evaluation), "improvements": (suggestions[0], narrate_improvements)}
+    server = None if args.skip_llm else start_mock_provider(args.port, args.latency, 0.0, "constant", args.token_rate)
+
+    runs = []
+    try:
+        for name, (result, narrator) in inputs.items():
+            runs.append({"result": name, "path": "template", **_measure(narrator(result))})
+            if server is not None:
+                try:
+                    runs.append({"result": name, "path": "llm", **_measure(structured_output_chat(serialize(result).text()))})
+                except ImportError as e:
+                    print(f"Skipping the llm path: {e}", file=sys.stderr)
+                    server.shutdown()
+                    server = None
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    for run in runs:
+        print(
+            f"{run['result']:<13} {run['path']:<9} first byte {run['first_byte_ms']:>9} ms  "
+            f"total {run['total_ms']:>9} ms  {run['bytes']:>6} B"
+        )
+    path = save_results("narration", {"config": vars(args), "runs": runs}, *([args.out] if args.out else []))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
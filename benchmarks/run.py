@@ -0,0 +1,269 @@
+"""Benchmark the evaluation pipeline against the local mock LLM provider.
+
+    python -m benchmarks.run --scenarios evaluate,evaluate-sse --users 1,8,32 --requests 64
+    python -m benchmarks.run --compare benchmarks/results/pipeline-20241101-120000.json
+
+Each scenario runs once per concurrency level and reports p50/p95/p99 latency,
+time-to-first-byte for the SSE endpoints, requests/sec and the peak RSS of the
+process. Results are written as JSON under benchmarks/results/.
+"""
+import sys, json, time, asyncio, argparse
+from typing import Dict
+
+from benchmarks.common import (
+    configure_environment, start_mock_provider, load_fixtures, percentiles, peak_rss_mb, save_results, compare,
+)
+
+
+class Context:
+    def __init__(self, fixtures: Dict, unique_inputs: bool):
+        self.fixtures = fixtures
+        self.unique_inputs = unique_inputs
+        self.app = None
+        self.application_ids = []
+        self.revised_ids = []
+        self.evaluation = None
+        self.batch_size = 16
+
+    def pair(self, i: int):
+        opportunities, applications = self.fixtures["opportunities"], self.fixtures["applications"]
+        opportunity = opportunities[i % len(opportunities)]
+        application = applications[i % len(applications)]
+        if self.unique_inputs:
+            # Defeat request coalescing and caching so every request pays full price
+            application = f"{application}\n\nReference: benchmark-{i}-{time.perf_counter_ns()}"
+        return opportunity, application
+
+
+async def scenario_evaluate(ctx: Context, i: int):
+    from core.agents import ProfileEvaluationSystem
+    from utils.routing import chat
+
+    opportunity, application = ctx.pair(i)
+    evaluator = ProfileEvaluationSystem(chat, application_id=f"benchmark-{i}")
+    await evaluator.evaluate_application(opportunity, application)
+
+
+async def scenario_improve(ctx: Context, i: int):
+    from core.agents import ProfileHelper
+    from utils.routing import chat
+
+    opportunity, application = ctx.pair(i)
+    helper = ProfileHelper(chat, application_id=f"benchmark-{i}")
+    await helper._generate_improvements(
+        opportunity, application, ctx.evaluation["reviews"], ctx.evaluation["bias_analysis"]
+    )
+
+
+async def scenario_upload(ctx: Context, i: int):
+    return await _upload(ctx, *ctx.pair(i))
+
+
+async def _upload(ctx: Context, opportunity: str, application: str, fields: Dict = None):
+    from benchmarks.asgi import request, encode_form
+
+    body, content_type = encode_form(fields, files=[
+        ("files", "opportunity.txt", opportunity.encode()),
+        ("files", "application.txt", application.encode()),
+    ])
+    response = await request(ctx.app, "POST", "/upload", body, content_type)
+    if response.status != 200:
+        raise RuntimeError(f"/upload returned {response.status}")
+    return response
+
+
+async def _stream(ctx: Context, path: str, i: int, application_ids=None):
+    from benchmarks.asgi import request, encode_form
+
+    application_ids = application_ids or ctx.application_ids
+    application_id = application_ids[i % len(application_ids)]
+    body, content_type = encode_form({"application_id": application_id})
+    response = await request(ctx.app, "POST", path, body, content_type)
+    if response.status != 200:
+        raise RuntimeError(f"{path} returned {response.status}")
+    return response
+
+
+async def scenario_batch(ctx: Context, i: int):
+    from benchmarks.asgi import request, encode_form
+
+    opportunity, _ = ctx.pair(i)
+    files = [("opportunity", "opportunity.txt", opportunity.encode())]
+    for j in range(ctx.batch_size):
+        _, application = ctx.pair(i * ctx.batch_size + j)
+        files.append(("applications", f"application-{j}.txt", application.encode()))
+    body, content_type = encode_form(files=files)
+    response = await request(ctx.app, "POST", "/batch-evaluate", body, content_type)
+    if response.status != 200 or b"event: ranking" not in response.body:
+        raise RuntimeError(f"/batch-evaluate returned {response.status}")
+    return response
+
+
+async def scenario_evaluate_sse(ctx: Context, i: int):
+    return await _stream(ctx, "/evaluate-profile", i)
+
+
+async def scenario_helper_sse(ctx: Context, i: int):
+    return await _stream(ctx, "/profile-helper", i)
+
+
+async def scenario_revise_sse(ctx: Context, i: int):
+    # Re-evaluation of an application revised after its first evaluation
+    return await _stream(ctx, "/evaluate-profile", i, ctx.revised_ids)
+
+
+SCENARIOS = {
+    "evaluate": scenario_evaluate,
+    "improve": scenario_improve,
+    "upload": scenario_upload,
+    "evaluate-sse": scenario_evaluate_sse,
+    "helper-sse": scenario_helper_sse,
+    "batch": scenario_batch,
+    "revise-sse": scenario_revise_sse,
+}
+
+
+async def setup(ctx: Context, scenarios, sessions: int):
+    import app as api
+    from core.agents import ProfileEvaluationSystem, export_results
+    from utils.routing import chat
+
+    ctx.app = api.app
+    if "improve" in scenarios:
+        opportunity, application = ctx.pair(0)
+        result = await ProfileEvaluationSystem(chat).evaluate_application(opportunity, application)
+        ctx.evaluation = export_results(result, format="dict")
+
+    if {"evaluate-sse", "helper-sse"} & set(scenarios):
+        for i in range(sessions):
+            response = await scenario_upload(ctx, i)
+            ctx.application_ids.append(json.loads(response.body)["output"]["application_id"])
+        if "helper-sse" in scenarios:
+            for i in range(len(ctx.application_ids)):
+                await scenario_evaluate_sse(ctx, i)
+
+    if "revise-sse" in scenarios:
+        for i in range(sessions):
+            opportunity, application = ctx.pair(i)
+            response = await _upload(ctx, opportunity, application)
+            previous_id = json.loads(response.body)["output"]["application_id"]
+            await _stream(ctx, "/evaluate-profile", 0, [previous_id])
+            # A new section: the reviewers that read it update their feedback, the rest keep theirs
+            revised = f"{application}\n\nCertifications\nCloud certification {i}"
+            response = await _upload(ctx, opportunity, revised, {"previous_application_id": previous_id})
+            ctx.revised_ids.append(json.loads(response.body)["output"]["application_id"])
+
+
+async def run_scenario(ctx: Context, name: str, users: int, total: int) -> Dict:
+    requests = iter(range(total))
+    latencies, ttfbs, errors = [], [], []
+
+    async def user():
+        for i in requests:
+            start = time.perf_counter()
+            try:
+                response = await SCENARIOS[name](ctx, i)
+            except Exception as e:
+                errors.append(repr(e))
+                continue
+            latencies.append(time.perf_counter() - start)
+            if getattr(response, "ttfb", None) is not None:
+                ttfbs.append(response.ttfb)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[user() for _ in range(users)])
+    wall = time.perf_counter() - start
+
+    return {
+        "scenario": name,
+        "users": users,
+        "requests": total,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "latency": percentiles(latencies),
+        "ttfb": percentiles(ttfbs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", default="1,8,32", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=0.3, help="Median provider latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--distribution", default="lognormal")
+    parser.add_argument("--token-rate", type=float, default=250.0, help="Streamed tokens per second")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--batch-size", type=int, default=16, help="Applications per /batch-evaluate request")
+    parser.add_argument("--shared-inputs", action="store_true", help="Allow identical prompts across requests")
+    parser.add_argument("--name", default="pipeline")
+    parser.add_argument("--out", default=None, help="Results directory")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    configure_environment(args.port)
+    server = start_mock_provider(
+        args.port, args.latency, args.jitter, args.distribution, args.token_rate, args.error_rate
+    )
+    ctx = Context(load_fixtures(), unique_inputs=not args.shared_inputs)
+    ctx.batch_size = args.batch_size
+
+    async def run_all():
+        # One uploaded session per request unless identical inputs are allowed
+        sessions = len(ctx.fixtures["applications"]) if args.shared_inputs else args.requests
+        await setup(ctx, scenarios, sessions)
+        runs = []
+        for name in scenarios:
+            for users in (int(u) for u in args.users.split(",")):
+                result = await run_scenario(ctx, name, users, args.requests)
+                print(
+                    f"{name:<14} users={users:<4} rps={result['throughput_rps']:<8} "
+                    f"p50={result['latency']['p50']} p95={result['latency']['p95']} "
+                    f"p99={result['latency']['p99']} ttfb_p50={result['ttfb']['p50']} errors={result['errors']}"
+                )
+                runs.append(result)
+        return runs
+
+    try:
+        runs = asyncio.run(run_all())
+    finally:
+        server.shutdown()
+
+    from utils.routing import route_stats
+    prompt_cache = {
+        route: {key: stats[key] for key in ("prompt_tokens", "cached_tokens", "cache_hit_rate")}
+        for route, stats in route_stats().items() if stats["calls"]
+    }
+    for route, stats in prompt_cache.items():
+        print(f"{route:<14} prompt_tokens={stats['prompt_tokens']:<10} cached={stats['cached_tokens']:<10} "
+              f"hit_rate={stats['cache_hit_rate']}")
+
+    results = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("compare", "out")},
+        "runs": runs,
+        "prompt_cache": prompt_cache,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    path = save_results(args.name, results, *([args.out] if args.out else []))
+    print(f"Peak RSS {results['peak_rss_mb']} MB. Results saved to {path}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
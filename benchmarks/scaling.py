@@ -0,0 +1,130 @@
+"""Benchmark throughput of `src/launcher.py` as the number of workers grows.
+
+    python -m benchmarks.scaling --workers 1,2,4 --clients 16 --flows 64
+
+For each worker count the launcher is started against the mock provider with
+the same deployment-wide rate limit, and `--clients` threads each run
+upload -> /evaluate-profile (read to the end of the stream) flows through
+its proxy. Reports flows/sec and p50/p95 latency per worker count. Throughput
+should grow with workers until the provider rate limit, which the launcher
+splits between them, becomes the bottleneck.
+"""
+import os, sys, json, time, signal, tempfile, argparse, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from urllib.request import Request, urlopen
+
+from benchmarks.common import (
+    SRC, configure_environment, start_mock_provider, load_fixtures, percentiles, save_results,
+)
+from benchmarks.asgi import encode_form
+
+
+def _post(base: str, path: str, body: bytes, content_type: str) -> bytes:
+    request = Request(base + path, data=body, headers={"Content-Type": content_type}, method="POST")
+    with urlopen(request, timeout=300) as response:
+        return response.read()
+
+
+def flow(base: str, fixtures: Dict, i: int) -> float:
+    opportunities, applications = fixtures["opportunities"], fixtures["applications"]
+    application = f"{applications[i % len(applications)]}\n\nReference: scaling-{i}-{time.perf_counter_ns()}"
+    started = time.perf_counter()
+    body, content_type = encode_form(files=[
+        ("files", "opportunity.txt", opportunities[i % len(opportunities)].encode()),
+        ("files", "application.txt", application.encode()),
+    ])
+    application_id = json.loads(_post(base, "/upload", body, content_type))["application_id"]
+    body, content_type = encode_form({"application_id": application_id})
+    stream = _post(base, "/evaluate-profile", body, content_type)
+    if b"event: evaluation" not in stream:
+        raise RuntimeError("/evaluate-profile ended without an evaluation")
+    return time.perf_counter() - started
+
+
+def run_workers(args, workers: int, fixtures: Dict) -> Dict:
+    state_dir = tempfile.mkdtemp(prefix="scaling-")
+    launcher = subprocess.Popen(
+        [
+            sys.executable, os.path.join(SRC, "launcher.py"), "--workers", str(workers),
+            "--host", "127.0.0.1", "--port", str(args.launcher_port), "--worker-port", str(args.launcher_port + 1),
+            "--state-db", os.path.join(state_dir, "state.db"), "--rate-limits", args.rate_limits,
+        ],
+        cwd=SRC,
+    )
+    base = f"http://127.0.0.1:{args.launcher_port}"
+    deadline = time.monotonic() + 120
+    while True:
+        try:
+            with urlopen(base + "/healthz", timeout=1):
+                break
+        except OSError:
+            if time.monotonic() > deadline or launcher.poll() is not None:
+                launcher.kill()
+                raise RuntimeError("Launcher did not start")
+            time.sleep(0.2)
+
+    latencies, errors = [], 0
+    try:
+        # Warm-up: imports and first connections of every worker
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(lambda i: flow(base, fixtures, i), range(workers)))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            futures = [pool.submit(flow, base, fixtures, i) for i in range(args.flows)]
+            for future in futures:
+                try:
+                    latencies.append(future.result())
+                except Exception:
+                    errors += 1
+        elapsed = time.perf_counter() - started
+    finally:
+        launcher.send_signal(signal.SIGTERM)
+        launcher.wait(timeout=120)
+    return {
+        "workers": workers,
+        "clients": args.clients,
+        "flows": args.flows,
+        "errors": errors,
+        "throughput_fps": round(len(latencies) / elapsed, 2),
+        "latency": percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--flows", type=int, default=64, help="Upload + evaluation flows per worker count")
+    parser.add_argument("--port", type=int, default=8911, help="Mock provider port")
+    parser.add_argument("--launcher-port", type=int, default=8920)
+    parser.add_argument("--latency", type=float, default=0.3, help="Median provider latency in seconds")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Streamed tokens per second, 0 for instant")
+    parser.add_argument("--rate-limits", default=json.dumps({
+        "groq": {"rpm": 6000, "tpm": 1e9},
+        "openai": {"rpm": 6000, "tpm": 1e9},
+    }), help="LLM_RATE_LIMITS for the whole deployment")
+    parser.add_argument("--out", default=None, help="Results directory")
+    args = parser.parse_args()
+
+    configure_environment(args.port)
+    server = start_mock_provider(args.port, args.latency, 0.1, "lognormal", args.token_rate)
+    fixtures = load_fixtures()
+    runs = []
+    try:
+        for workers in (int(w) for w in args.workers.split(",")):
+            result = run_workers(args, workers, fixtures)
+            print(
+                f"workers={workers:<3} flows/s={result['throughput_fps']:<8} "
+                f"p50={result['latency']['p50']} p95={result['latency']['p95']} errors={result['errors']}"
+            )
+            runs.append(result)
+    finally:
+        server.shutdown()
+
+    path = save_results("scaling", {"config": vars(args), "runs": runs}, *([args.out] if args.out else []))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
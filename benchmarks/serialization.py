@@ -0,0 +1,100 @@
+"""Model construction and export cost of one evaluation.
+
+    python -m benchmarks.serialization --evaluations 2000
+
+Replays what `/evaluate-profile` does with the three parsed reviewer
+responses once the provider calls are done, for both code paths:
+
+    - `before`: rebuild each `ReviewerFeedback`, dump the reviews to dicts,
+      validate them again into `EvaluationResult`, then export it with
+      `model_dump()` for storage and `model_dump_json(indent=2)` for the wire
+    - `after`: copy the parsed feedback, dump the reviews with the `REVIEWS`
+      adapter, build `EvaluationResult` from the models, pack it for storage
+      and serialize it once to compact JSON
+
+Reports microseconds per evaluation and the size of the JSON sent.
+"""
+import sys, json, time, argparse
+from datetime import datetime
+
+from benchmarks.common import SRC, save_results
+from benchmarks.storage import _canned
+
+
+def _paths():
+    from core.base import ReviewerFeedback, Reviewer, EvaluationResult
+    from core.compact import CompactEvaluation
+    from core.serialization import REVIEWS, serialize
+
+    raw = json.dumps(_canned("formatting a reviewer's feedback", "system"))
+    reviewers = [
+        Reviewer(name="Reviewer A", bias_level="biased", specialization="technical"),
+        Reviewer(name="Reviewer B", bias_level="biased", specialization="leadership"),
+        Reviewer(name="Reviewer C", bias_level="unbiased"),
+    ]
+    bias_analysis = {"analysis_summary": "No significant disparity between reviewers", "bias_score": None}
+
+    def before():
+        feedbacks = []
+        for reviewer in reviewers:
+            parsed = ReviewerFeedback.model_validate_json(raw)
+            feedbacks.append(ReviewerFeedback(
+                reviewer=reviewer,
+                review_scores=parsed.review_scores,
+                strengths=parsed.strengths,
+                weaknesses=parsed.weaknesses,
+                areas_of_concern=parsed.areas_of_concern,
+                areas_of_potential=parsed.areas_of_potential,
+                recommendation=parsed.recommendation,
+                justification=parsed.justification,
+                timestamp=datetime.now(),
+            ))
+        reviews = [feedback.model_dump() for feedback in feedbacks]
+        result = EvaluationResult(reviews=reviews, bias_analysis=bias_analysis, overall_decision="accept")
+        result.model_dump()
+        return result.model_dump_json(indent=2)
+
+    def after():
+        feedbacks = [
+            ReviewerFeedback.model_validate_json(raw).model_copy(
+                update={"reviewer": reviewer, "timestamp": datetime.now()}
+            )
+            for reviewer in reviewers
+        ]
+        REVIEWS.dump_python(feedbacks)
+        result = EvaluationResult(reviews=feedbacks, bias_analysis=bias_analysis, overall_decision="accept")
+        CompactEvaluation.pack(result)
+        return serialize(result).text()
+
+    return {"before": before, "after": after}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--evaluations", type=int, default=2000)
+    parser.add_argument("--out", default=None, help="Results directory")
+    args = parser.parse_args()
+
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    runs = []
+    for name, path in _paths().items():
+        output = path()
+        start = time.perf_counter()
+        for _ in range(args.evaluations):
+            path()
+        elapsed = time.perf_counter() - start
+        runs.append({
+            "path": name,
+            "us_per_evaluation": round(elapsed / args.evaluations * 1e6, 1),
+            "json_bytes": len(output.encode()),
+        })
+
+    for run in runs:
+        print(f"{run['path']:<7} {run['us_per_evaluation']:>8} us/evaluation  {run['json_bytes']:>6} JSON bytes")
+    path = save_results("serialization", {"config": vars(args), "runs": runs}, *([args.out] if args.out else []))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
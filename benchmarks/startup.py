@@ -0,0 +1,118 @@
+"""Import-time profile and cold-start readiness of the API worker.
+
+    python -m benchmarks.startup --runs 5 --top 15
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter and
+summarises the cumulative import time per top-level package, then starts
+uvicorn `--runs` times and measures how long each worker takes to answer
+`/healthz` and `/readyz`.
+"""
+import os, sys, time, socket, argparse, subprocess, urllib.request
+from collections import defaultdict
+
+from benchmarks.common import SRC, percentiles, save_results
+
+
+def _environment():
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "benchmark")
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC, env.get("PYTHONPATH")]))
+    return env
+
+
+def import_profile(module: str = "app"):
+    """Cumulative microseconds per top-level package and for `module` itself."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC, env=_environment(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    packages, total = defaultdict(int), None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Nested imports are indented by two spaces per level and already counted in their parent
+        name = name[1:]
+        if not name.startswith(" "):
+            packages[name.split(".")[0]] += int(cumulative)
+        if name.strip() == module:
+            total = int(cumulative)
+    return total, dict(packages)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url: str, deadline: float) -> float:
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.monotonic()
+        except OSError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} did not answer in time")
+
+
+def cold_start(timeout: float = 60.0):
+    """Seconds from spawning a worker until /healthz and then /readyz answer."""
+    port = _free_port()
+    start = time.monotonic()
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SRC, env=_environment(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        healthy = _wait_for(f"http://127.0.0.1:{port}/healthz", start + timeout)
+        ready = _wait_for(f"http://127.0.0.1:{port}/readyz", start + timeout)
+        return healthy - start, ready - start
+    finally:
+        worker.terminate()
+        worker.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to measure")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list")
+    parser.add_argument("--out", default=None, help="Results directory")
+    args = parser.parse_args()
+
+    total, packages = import_profile(args.module)
+    ranked = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+    print(f"import {args.module}: {total / 1e6 if total else float('nan'):.3f}s")
+    for name, micros in ranked:
+        print(f"  {name:<28} {micros / 1e3:>9.1f} ms")
+
+    healthz, readyz = [], []
+    for _ in range(args.runs):
+        healthy, ready = cold_start()
+        healthz.append(healthy)
+        readyz.append(ready)
+    health, readiness = percentiles(healthz), percentiles(readyz)
+    print(f"cold start to /healthz p50={health['p50']}s  to /readyz p50={readiness['p50']}s")
+
+    results = {
+        "config": vars(args),
+        "import_seconds": total / 1e6 if total else None,
+        "packages_ms": {name: round(micros / 1e3, 1) for name, micros in ranked},
+        "healthz": health,
+        "readyz": readiness,
+    }
+    path = save_results("startup", results, *([args.out] if args.out else []))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Memory held per stored evaluation, before and after compaction.
+
+    python -m benchmarks.storage --evaluations 2000
+
+Builds `--evaluations` distinct `EvaluationResult`s (three reviews each, from
+the canned reviewer responses) and `ImprovementSuggestions`, and measures the
+bytes each storage format keeps alive per result:
+
+    - `model_dump`: the dicts `state.evaluations` held before
+    - `model`: the Pydantic objects themselves
+    - `compact`: `CompactEvaluation` / `CompactImprovements`
+
+Sizes are deep `sys.getsizeof` totals over the whole population, counting
+each object once, so interned strings and shared reviewer records are paid
+for once rather than per evaluation. Also times packing and materializing.
+"""
+import os, sys, json, time, argparse
+
+from benchmarks.common import SRC, FIXTURES, save_results
+
+
+def _canned(fragment: str, key: str) -> dict:
+    with open(os.path.join(FIXTURES, "canned_responses.json")) as f:
+        for response in json.load(f):
+            if fragment in response.get(key, ""):
+                return response["content"]
+    raise KeyError(fragment)
+
+
+def _population(count: int):
+    from core.base import EvaluationResult, ReviewerFeedback, Reviewer, BiasAnalysis, ImprovementSuggestions
+
+    feedback = _canned("formatting a reviewer's feedback", "system")
+    improvements = _canned("suggest specific improvements", "message")
+    reviewers = [
+        Reviewer(name="Reviewer A", bias_level="biased", specialization="technical"),
+        Reviewer(name="Reviewer B", bias_level="biased", specialization="leadership"),
+        Reviewer(name="Reviewer C", bias_level="unbiased"),
+    ]
+    results, suggestions = [], []
+    for i in range(count):
+        # Free text differs per evaluation, as it does for real candidates
+        distinct = lambda text: f"{text} ({i})"
+        reviews = [
+            ReviewerFeedback(
+                reviewer=reviewer,
+                review_scores=[{**score, "comments": distinct(score["comments"])} for score in feedback["review_scores"]],
+                strengths=[distinct(text) for text in feedback["strengths"]],
+                weaknesses=[distinct(text) for text in feedback["weaknesses"]],
+                areas_of_concern=[distinct(text) for text in feedback["areas_of_concern"]],
+                areas_of_potential=[distinct(text) for text in feedback["areas_of_potential"]],
+                recommendation=feedback["recommendation"],
+                justification=distinct(feedback["justification"]),
+            )
+            for reviewer in reviewers
+        ]
+        results.append(EvaluationResult(
+            application_id=f"benchmark-{i}",
+            reviews=reviews,
+            bias_analysis=BiasAnalysis(analysis_summary=distinct("No significant disparity between reviewers")),
+            overall_decision="accept",
+        ))
+        groups = {
+            group: [{**item, "issue": distinct(item["issue"]), "suggestion": distinct(item["suggestion"])} for item in items]
+            for group, items in improvements.items() if group != "priority_summary"
+        }
+        suggestions.append(ImprovementSuggestions(**groups, priority_summary={"high": 1, "medium": 2, "low": 2}))
+    return results, suggestions
+
+
+def deep_size(objects, seen=None) -> int:
+    seen = set() if seen is None else seen
+    stack, total = list(objects), 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            stack.append(obj.__dict__)
+            stack.extend(getattr(obj, "__pydantic_fields_set__", ()))
+        if hasattr(type(obj), "__slots__"):
+            stack.extend(getattr(obj, name) for name in type(obj).__slots__ if hasattr(obj, name))
+    return total
+
+
+def _timed(function, items):
+    start = time.perf_counter()
+    output = [function(item) for item in items]
+    return output, round((time.perf_counter() - start) / len(items) * 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--evaluations", type=int, default=2000)
+    parser.add_argument("--out", default=None, help="Results directory")
+    args = parser.parse_args()
+
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    from core.compact import CompactEvaluation, CompactImprovements
+
+    results, suggestions = _population(args.evaluations)
+    dumps, dump_us = _timed(lambda result: result.model_dump(), results)
+    compact, pack_us = _timed(CompactEvaluation.pack, results)
+    _, materialize_us = _timed(lambda record: record.dump(), compact)
+    _, model_us = _timed(lambda record: record.model(), compact)
+    compact_suggestions, _ = _timed(CompactImprovements.pack, suggestions)
+
+    per = lambda objects: round(deep_size(objects) / args.evaluations)
+    runs = [
+        {"format": "model_dump", "evaluation_bytes": per(dumps),
+         "improvements_bytes": per([s.model_dump() for s in suggestions]), "build_us": dump_us},
+        {"format": "model", "evaluation_bytes": per(results), "improvements_bytes": per(suggestions)},
+        {"format": "compact", "evaluation_bytes": per(compact), "improvements_bytes": per(compact_suggestions),
+         "build_us": pack_us, "dump_us": materialize_us, "model_us": model_us},
+    ]
+    for run in runs:
+        timings = "  ".join(f"{key} {run[key]}" for key in ("build_us", "dump_us", "model_us") if key in run)
+        print(f"{run['format']:<11} {run['evaluation_bytes']:>7} B/evaluation  "
+              f"{run['improvements_bytes']:>7} B/improvements  {timings}")
+    path = save_results("storage", {"config": vars(args), "runs": runs}, *([args.out] if args.out else []))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
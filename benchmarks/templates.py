@@ -0,0 +1,108 @@
+"""Render time and memory of the evaluation prompts on large documents.
+
+    python -m benchmarks.templates --size-kb 50 --evaluations 200
+
+One evaluation renders the five prompts that share the documents: three
+reviewers, the bias detector and the profile helper. Three variants:
+
+    - `str.format`: re-parse and format every template on every call (before)
+    - `template`: precompiled templates, every prompt renders its own context
+    - `layout`: `PromptLayout`, the rendered context is shared by all five
+
+Memory is the tracemalloc growth while one evaluation's prompts are alive,
+which is how the agents hold them while the calls are in flight.
+"""
+import sys, time, argparse, tracemalloc
+
+from benchmarks.common import SRC, load_fixtures, peak_rss_mb, save_results
+
+
+def _documents(size_kb: int, count: int):
+    fixtures = load_fixtures()
+    opportunity, application = fixtures["opportunities"][0], fixtures["applications"][0]
+    target = size_kb * 1024
+    opportunity = (opportunity + "\n\n") * (target // len(opportunity) + 1)
+    application = (application + "\n\n") * (target // len(application) + 1)
+    # Distinct document pairs, so the layout memo only helps within one evaluation
+    return [(f"{i}\n{opportunity[:target]}", f"{i}\n{application[:target]}") for i in range(count)]
+
+
+def _variants():
+    from utils import prompts as p
+
+    reviews = [{"recommendation": "accept", "justification": "Strong payments background"}] * 3
+    bias = {"analysis_summary": "No major disparities", "bias_score": None}
+
+    def formatted(opportunity, application):
+        context = lambda: p.REVIEW_CONTEXT_TEMPLATE.format(opportunity=opportunity, application=application)
+        return [
+            (context(), p.BIASED_REVIEWER_INSTRUCTIONS.format(name="Reviewer A")),
+            (context(), p.BIASED_REVIEWER_INSTRUCTIONS.format(name="Reviewer B")),
+            (context(), p.UNBIASED_REVIEWER_INSTRUCTIONS.format(name="Reviewer C")),
+            (context(), p.BIAS_DETECTOR_INSTRUCTIONS.format(reviews=reviews)),
+            (context(), p.APPLICATION_ENHANCEMENT_INSTRUCTIONS.format(reviews=reviews, bias_analysis=bias)),
+        ]
+
+    def compiled(opportunity, application):
+        context = lambda: p.REVIEW_CONTEXT.render(opportunity=opportunity, application=application)
+        return [
+            (context(), p.BIASED_REVIEWER.render(name="Reviewer A")),
+            (context(), p.BIASED_REVIEWER.render(name="Reviewer B")),
+            (context(), p.UNBIASED_REVIEWER.render(name="Reviewer C")),
+            (context(), p.BIAS_DETECTOR.render(reviews=reviews)),
+            (context(), p.APPLICATION_ENHANCEMENT.render(reviews=reviews, bias_analysis=bias)),
+        ]
+
+    def layout(opportunity, application):
+        docs = {"opportunity": opportunity, "application": application}
+        return [
+            p.REVIEWER_LAYOUTS["biased"].render(name="Reviewer A", **docs),
+            p.REVIEWER_LAYOUTS["biased"].render(name="Reviewer B", **docs),
+            p.REVIEWER_LAYOUTS["unbiased"].render(name="Reviewer C", **docs),
+            p.BIAS_DETECTOR_LAYOUT.render(reviews=reviews, **docs),
+            p.APPLICATION_ENHANCEMENT_LAYOUT.render(reviews=reviews, bias_analysis=bias, **docs),
+        ]
+
+    return {"str.format": formatted, "template": compiled, "layout": layout}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-kb", type=int, default=50, help="Size of each document")
+    parser.add_argument("--evaluations", type=int, default=200)
+    parser.add_argument("--out", default=None, help="Results directory")
+    args = parser.parse_args()
+
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    documents = _documents(args.size_kb, args.evaluations)
+    runs = []
+    for name, render in _variants().items():
+        start = time.perf_counter()
+        for opportunity, application in documents:
+            render(opportunity, application)
+        wall = time.perf_counter() - start
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        prompts = render(*documents[0])
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del prompts
+
+        runs.append({
+            "variant": name,
+            "us_per_evaluation": round(wall / len(documents) * 1e6, 1),
+            "retained_kb_per_evaluation": round(retained / 1024, 1),
+        })
+
+    for run in runs:
+        print(f"{run['variant']:<11} {run['us_per_evaluation']:>10} us/evaluation  "
+              f"{run['retained_kb_per_evaluation']:>8} KB retained")
+    results = {"config": vars(args), "runs": runs, "peak_rss_mb": peak_rss_mb()}
+    path = save_results("templates", results, *([args.out] if args.out else []))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare the cost of echoing streamed tokens with `print` against `log_token`.
+
+    python -m benchmarks.token_logging --streams 64 --tokens 2000
+
+Each stream is an async generator that yields tokens the way the SSE handlers
+do; stdout is an unbuffered file on /dev/null so only the per-token write
+syscalls and formatting are measured, not a terminal.
+"""
+import os, sys, time, asyncio, argparse, contextlib
+
+from benchmarks.common import SRC, peak_rss_mb, save_results
+
+
+async def _stream(tokens: int, echo):
+    for i in range(tokens):
+        token = f" token{i}"
+        echo(token)
+        yield token
+        if i % 32 == 0:
+            await asyncio.sleep(0)
+
+
+async def _run(streams: int, tokens: int, echo) -> float:
+    async def consume():
+        async for _ in _stream(tokens, echo):
+            pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*[consume() for _ in range(streams)])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=64)
+    parser.add_argument("--tokens", type=int, default=2000, help="Tokens per stream")
+    parser.add_argument("--out", default=None, help="Results directory")
+    args = parser.parse_args()
+
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    from utils.logs import setup_logging, log_token
+
+    devnull = open(os.devnull, "w", buffering=1)
+    total = args.streams * args.tokens
+    runs = []
+    with contextlib.redirect_stdout(devnull):
+        setup_logging()
+        variants = {
+            "print": lambda token: print(token, end="", flush=True),
+            "log_token": log_token,
+        }
+        for name, echo in variants.items():
+            wall = asyncio.run(_run(args.streams, args.tokens, echo))
+            runs.append({"variant": name, "wall_seconds": round(wall, 4), "tokens_per_second": round(total / wall)})
+    devnull.close()
+
+    for run in runs:
+        print(f"{run['variant']:<10} {run['tokens_per_second']:>12} tokens/s  ({run['wall_seconds']}s)")
+    results = {"config": vars(args), "runs": runs, "peak_rss_mb": peak_rss_mb()}
+    path = save_results("token-logging", results, *([args.out] if args.out else []))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
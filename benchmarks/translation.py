@@ -0,0 +1,104 @@
+"""Provider requests and time spent translating narrated results.
+
+    python -m benchmarks.translation --evaluations 20 --language Yoruba --latency 0.6
+
+Narrates `--evaluations` evaluations and improvement sets (the same canned
+results with distinct free text, see `benchmarks.storage`) and translates
+them two ways against a simulated provider that takes `--latency` seconds
+per request plus `--segment-latency` per segment:
+
+    - `per-line`: one request per non-blank line, as before the translation memory
+    - `memory`: `utils.translation_memory`, which seeds the glossary once and
+      sends only novel segments, batched
+
+Reports requests, segments sent and the simulated provider time per result.
+"""
+import re, time, argparse
+
+from benchmarks.common import configure_environment, save_results
+from benchmarks.storage import _population
+
+
+def _distinct(line: str) -> str:
+    """The population marks free text with "(i)"; numbers are masked by the memory, so use a word."""
+    def word(match):
+        i, letters = int(match.group(1)), ""
+        while True:
+            i, rest = divmod(i, 26)
+            letters += chr(ord("a") + rest)
+            if not i:
+                return f"(case {letters})"
+    return re.sub(r"\((\d+)\)", word, line)
+
+
+class SimulatedProvider:
+    def __init__(self, latency: float, segment_latency: float):
+        self.latency = latency
+        self.segment_latency = segment_latency
+        self.requests = 0
+        self.segments = 0
+        self.seconds = 0.0
+
+    def __call__(self, segments, language):
+        self.requests += 1
+        self.segments += len(segments)
+        self.seconds += self.latency + self.segment_latency * len(segments)
+        return [f"[{language}] {segment}" for segment in segments]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--evaluations", type=int, default=20)
+    parser.add_argument("--language", default="Yoruba")
+    parser.add_argument("--latency", type=float, default=0.6, help="Simulated seconds per provider request")
+    parser.add_argument("--segment-latency", type=float, default=0.05, help="Simulated seconds per segment")
+    parser.add_argument("--out", default=None, help="Results directory")
+    args = parser.parse_args()
+
+    configure_environment(0)
+    from core.narration import narrate_evaluation, narrate_improvements, glossary
+    from utils.translation_memory import TranslationMemory
+
+    results, suggestions = _population(args.evaluations)
+    narrations = [
+        [_distinct(line) for line in [*narrate_evaluation(result), *narrate_improvements(improvements)]]
+        for result, improvements in zip(results, suggestions)
+    ]
+
+    per_line = SimulatedProvider(args.latency, args.segment_latency)
+    for lines in narrations:
+        for line in lines:
+            if line.strip():
+                per_line([line], args.language)
+
+    memory = SimulatedProvider(args.latency, args.segment_latency)
+    translations = TranslationMemory(path="")
+    translations.register_glossary(glossary())
+    start = time.perf_counter()
+    for lines in narrations:
+        for _ in translations.translate(lines, args.language, memory):
+            pass
+    local_ms = (time.perf_counter() - start) * 1000
+
+    runs = []
+    for name, provider in (("per-line", per_line), ("memory", memory)):
+        runs.append({
+            "path": name,
+            "requests": provider.requests,
+            "segments": provider.segments,
+            "provider_s_per_result": round(provider.seconds / args.evaluations, 3),
+        })
+    runs[-1]["local_ms_per_result"] = round(local_ms / args.evaluations, 3)
+    runs[-1]["memory"] = dict(translations.stats)
+
+    for run in runs:
+        print(
+            f"{run['path']:<9} {run['requests']:>6} requests  {run['segments']:>6} segments  "
+            f"{run['provider_s_per_result']:>8} s provider time per result"
+        )
+    path = save_results("translation", {"config": vars(args), "runs": runs}, *([args.out] if args.out else []))
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
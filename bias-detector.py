@@ -1,13 +1,27 @@
-import groq
+import os, re, sys, csv, json, time, groq, argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Shared utilities (semantic cache, rate limiting) live in the API package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
 
 try:
     from configs import GROQ_API_KEY
 except:
     print("Could not import configs, retrying with relative import.")
-    import sys
     sys.path.append("..")
     from configs import GROQ_API_KEY
 
+from utils.semantic_cache import semantic_cache
+from utils.scheduler import ProviderScheduler, estimate_tokens
+
+# Columnar output is optional, the audit falls back to CSV without pyarrow
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
 
 def detect_gender_bias(text, model="llama-3.1-70b-versatile", temperature=0.1, max_tokens=10):
     client = groq.Groq(api_key=GROQ_API_KEY)
@@ -42,4 +56,316 @@ def detect_gender_bias(text, model="llama-3.1-70b-versatile", temperature=0.1, m
             bias_detected = 1
             break  # Exit early if bias is detected
     
-    return bias_detected
\ No newline at end of file
+    return bias_detected
+
+
+# Bulk audit
+#
+#   python bias-detector.py postings.jsonl -o audit.parquet --summary summary.parquet --concurrency 8
+#   python bias-detector.py postings.csv --department-field team --date-field posted_at -o audit.csv
+#
+# Records are read lazily and audited on a bounded thread pool. Each record gets
+# one model call that answers every dimension at once, plus a local scan for
+# gender-coded and exclusionary phrases. Per-record results are written in
+# batches; only the per (department, period) aggregates are kept in memory.
+
+# The questions asked by detect_gender_bias, answered together in one JSON reply
+DIMENSIONS = {
+    "gender_bias": "Does the text show gender bias?",
+    "stereotypes": "Does the text reinforce any gender stereotypes?",
+    "discrimination": "Are there any examples of gender discrimination in the text?",
+    "negative_tone": "Is the overall tone of the text regarding gender negative?",
+}
+
+AUDIT_PROMPT = """You are an expert in detecting gender bias in text. Analyze the text you are given
+for signs of gender bias, stereotypes, or discrimination and answer each question with 1 for yes or 0 for no:
+""" + "\n".join(f'- "{key}": {question}' for key, question in DIMENSIONS.items()) + """
+Only return a JSON object with exactly these keys and 0 or 1 values."""
+
+# Word stems from the gender-coded word lists of Gaucher, Friesen & Kay (2011),
+# plus common exclusionary phrases from job ads
+CODED_PHRASES = {
+    "masculine": [
+        "active", "adventurous", "aggress", "ambitio", "analy", "assert", "athlet", "autonom", "boast",
+        "challeng", "compet", "confident", "courag", "decisive", "determin", "domina", "force", "greedy",
+        "headstrong", "hierarch", "hostil", "impulsive", "independen", "individual", "intellect", "lead",
+        "logic", "masculine", "objective", "opinion", "outspoken", "persist", "principle", "reckless",
+        "stubborn", "superior", "self-confiden", "self-relian", "self-sufficien",
+    ],
+    "feminine": [
+        "affectionate", "cheer", "communal", "compassion", "connect", "considerate", "cooperat",
+        "emotiona", "empath", "feminine", "gentle", "interpersonal", "interdependen", "kind", "kinship",
+        "loyal", "modest", "nurtur", "pleasant", "polite", "quiet", "sensitiv", "submissive", "sympath",
+        "tender", "warm", "whin", "yield",
+    ],
+    "exclusionary": [
+        "rockstar", "rock star", "ninja", "guru", "digital native", "young", "recent graduate", "energetic",
+        "native english", "culture fit", "manpower", "chairman", "salesman", "he or she", "his or her",
+    ],
+}
+_CODED = {
+    category: re.compile(r"\b(?:" + "|".join(re.escape(stem) for stem in stems) + r")[\w-]*", re.IGNORECASE)
+    for category, stems in CODED_PHRASES.items()
+}
+
+# Audit verdicts only need to be reused for near-identical postings
+AUDITS = semantic_cache("bias_audit", threshold=0.97)
+
+RECORD_COLUMNS = [
+    ("id", "string"), ("department", "string"), ("period", "string"),
+    *[(key, "int") for key in DIMENSIONS], ("biased", "int"),
+    ("masculine", "int"), ("feminine", "int"), ("exclusionary", "int"),
+    ("phrases", "string"), ("cached", "bool"), ("error", "string"),
+]
+SUMMARY_COLUMNS = [
+    ("department", "string"), ("period", "string"), ("documents", "int"), ("failed", "int"),
+    *[(f"{key}_rate", "float") for key in DIMENSIONS], ("biased_rate", "float"),
+    ("masculine_per_doc", "float"), ("feminine_per_doc", "float"), ("exclusionary_per_doc", "float"),
+    ("top_phrases", "string"),
+]
+
+_client = None
+
+def _groq():
+    global _client
+    if _client is None:
+        _client = groq.Groq(api_key=GROQ_API_KEY)
+    return _client
+
+def coded_phrases(text):
+    """Gender-coded and exclusionary words in `text`, as {category: [phrase, ...]}."""
+    return {category: [m.group(0).lower() for m in pattern.finditer(text)] for category, pattern in _CODED.items()}
+
+def _ask_dimensions(text, model="llama-3.1-70b-versatile", temperature=0.1, max_tokens=64, sketch=None):
+    response = _groq().chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": AUDIT_PROMPT},
+            {"role": "user", "content": text},
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens,
+        response_format={"type": "json_object"},
+    )
+    reply = json.loads(response.choices[0].message.content)
+    verdicts = {key: int(str(reply.get(key, 0)).strip() in ("1", "True", "true")) for key in DIMENSIONS}
+    AUDITS.put(text, verdicts, sketch=sketch)
+    return verdicts, getattr(response, "usage", None)
+
+def detect_bias_dimensions(text):
+    """0/1 per entry of DIMENSIONS from a single, cached call."""
+    sketch = AUDITS.sketch(text)
+    hit = AUDITS.get(text, sketch=sketch)
+    if hit is not None:
+        return hit.value
+    return _ask_dimensions(text, sketch=sketch)[0]
+
+def read_records(path, id_field="id", text_field="text", department_field="department", date_field="date"):
+    """Yield dicts with id, text, department and date from a JSONL or CSV file."""
+    if path.endswith(".csv"):
+        f = open(path, newline="", encoding="utf-8")
+        rows = csv.DictReader(f)
+    else:
+        f = open(path, encoding="utf-8")
+        rows = (json.loads(line) for line in f if line.strip())
+    with f:
+        for n, row in enumerate(rows):
+            text = row.get(text_field) or ""
+            if text.strip():
+                yield {
+                    "id": str(row.get(id_field) or n),
+                    "text": text,
+                    "department": str(row.get(department_field) or "unknown"),
+                    "date": str(row.get(date_field) or ""),
+                }
+
+def period_of(date, granularity="month"):
+    match = re.match(r"(\d{4})-(\d{2})", date)
+    if not match:
+        return "unknown"
+    return match.group(1) if granularity == "year" else f"{match.group(1)}-{match.group(2)}"
+
+class ColumnarWriter:
+    """Writes rows in batches: Parquet for .parquet, Arrow IPC for .arrow/.feather
+    when pyarrow is installed, CSV otherwise."""
+
+    def __init__(self, path, columns, batch_size=1000):
+        self.columns = columns
+        self.batch_size = batch_size
+        self.rows = []
+        self.format = "csv"
+        if pa is not None and path.endswith(".parquet"):
+            self.format = "parquet"
+        elif pa is not None and path.endswith((".arrow", ".feather")):
+            self.format = "arrow"
+        elif not path.endswith(".csv"):
+            path = os.path.splitext(path)[0] + ".csv"
+            print(f"pyarrow is not installed, writing CSV to {path}", file=sys.stderr)
+        self.path = path
+        self._writer = self._file = None
+
+    def _schema(self):
+        types = {"string": pa.string(), "int": pa.int64(), "float": pa.float64(), "bool": pa.bool_()}
+        return pa.schema([(name, types[kind]) for name, kind in self.columns])
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows and self._writer is not None:
+            return
+        names = [name for name, _ in self.columns]
+        if self.format == "csv":
+            if self._writer is None:
+                self._file = open(self.path, "w", newline="", encoding="utf-8")
+                self._writer = csv.DictWriter(self._file, names)
+                self._writer.writeheader()
+            self._writer.writerows(self.rows)
+            self._file.flush()
+        else:
+            schema = self._schema()
+            if self._writer is None:
+                if self.format == "parquet":
+                    self._writer = pq.ParquetWriter(self.path, schema)
+                else:
+                    self._file = pa.OSFile(self.path, "wb")
+                    self._writer = pa.ipc.new_file(self._file, schema)
+            self._writer.write_table(pa.Table.from_pylist(self.rows, schema=schema))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.format != "csv" and self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+class AuditAggregate:
+    __slots__ = ("documents", "failed", "positives", "coded", "phrases")
+
+    def __init__(self):
+        self.documents = self.failed = 0
+        self.positives = Counter()
+        self.coded = Counter()
+        self.phrases = Counter()
+
+    def add(self, row, phrases):
+        if row["error"]:
+            self.failed += 1
+            return
+        self.documents += 1
+        for key in (*DIMENSIONS, "biased"):
+            self.positives[key] += row[key]
+        for category in CODED_PHRASES:
+            self.coded[category] += row[category]
+        self.phrases.update(phrases)
+
+    def row(self, department, period, top=10):
+        n = self.documents or 1
+        return {
+            "department": department,
+            "period": period,
+            "documents": self.documents,
+            "failed": self.failed,
+            **{f"{key}_rate": round(self.positives[key] / n, 4) for key in (*DIMENSIONS, "biased")},
+            **{f"{category}_per_doc": round(self.coded[category] / n, 3) for category in CODED_PHRASES},
+            "top_phrases": "; ".join(f"{phrase}:{count}" for phrase, count in self.phrases.most_common(top)),
+        }
+
+def audit_corpus(records, output, summary=None, concurrency=4, rpm=30, tpm=20000, granularity="month",
+                 report_every=30.0):
+    """Audit `records` (see read_records), writing one row per record to `output`
+    and per (department, period) aggregates to `summary`. Returns the aggregates."""
+    writer = ColumnarWriter(output, RECORD_COLUMNS)
+    groups = {}
+    budget = ProviderScheduler(rpm, tpm)
+    started, audited, next_report = time.monotonic(), 0, time.monotonic() + report_every
+
+    def work(record):
+        found = coded_phrases(record["text"])
+        row = {
+            "id": record["id"], "department": record["department"], "period": period_of(record["date"], granularity),
+            **{category: len(phrases) for category, phrases in found.items()}, "cached": False, "error": "",
+        }
+        try:
+            sketch = AUDITS.sketch(record["text"])
+            hit = AUDITS.get(record["text"], sketch=sketch)
+            if hit is not None:
+                verdicts, cached = hit.value, True
+            else:
+                # Cache hits do not spend the rate budget
+                estimated = estimate_tokens(AUDIT_PROMPT, record["text"]) + 64
+                budget.acquire(estimated)
+                verdicts, usage = _ask_dimensions(record["text"], sketch=sketch)
+                cached = False
+                if usage is not None:
+                    budget.settle(estimated, getattr(usage, "total_tokens", estimated) or estimated)
+            row.update(verdicts, biased=int(any(verdicts.values())), cached=cached)
+        except Exception as e:
+            row.update({key: 0 for key in DIMENSIONS}, biased=0, error=str(e))
+        return row, [phrase for phrases in found.values() for phrase in phrases]
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        pending = set()
+
+        def collect(block):
+            nonlocal audited
+            finished, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pending.discard(future)
+                row, phrases = future.result()
+                for key in ((row["department"], row["period"]), ("*", "*")):
+                    groups.setdefault(key, AuditAggregate()).add(row, phrases)
+                row["phrases"] = "; ".join(sorted(set(phrases)))
+                writer.write(row)
+                audited += 1
+
+        for record in records:
+            # Bounded look-ahead keeps memory flat however large the corpus is
+            while len(pending) >= concurrency * 2:
+                collect(block=True)
+            pending.add(pool.submit(work, record))
+            collect(block=False)
+            if time.monotonic() >= next_report:
+                print(f"{audited} audited, {audited / (time.monotonic() - started):.2f} docs/s", file=sys.stderr)
+                next_report = time.monotonic() + report_every
+        while pending:
+            collect(block=True)
+    writer.close()
+
+    if summary:
+        summary_writer = ColumnarWriter(summary, SUMMARY_COLUMNS)
+        for (department, period), aggregate in sorted(groups.items()):
+            summary_writer.write(aggregate.row(department, period))
+        summary_writer.close()
+
+    overall = groups.get(("*", "*"), AuditAggregate())
+    print(
+        f"{audited} audited in {time.monotonic() - started:.1f}s, {overall.failed} failed, "
+        f"biased rate {overall.row('*', '*')['biased_rate']}, cache {AUDITS.stats()['hit_rate']}",
+        file=sys.stderr,
+    )
+    return groups
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit a corpus of job postings for gender bias")
+    parser.add_argument("input", help="JSONL or CSV file")
+    parser.add_argument("-o", "--output", required=True, help="Per-record results (.parquet, .arrow or .csv)")
+    parser.add_argument("--summary", default=None, help="Per department and period aggregates")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--department-field", default="department")
+    parser.add_argument("--date-field", default="date")
+    parser.add_argument("--granularity", choices=("month", "year"), default="month")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=30, help="Requests per minute budget")
+    parser.add_argument("--tpm", type=float, default=20000, help="Tokens per minute budget")
+    args = parser.parse_args()
+
+    records = read_records(args.input, args.id_field, args.text_field, args.department_field, args.date_field)
+    audit_corpus(records, args.output, args.summary, args.concurrency, args.rpm, args.tpm, args.granularity)
+
+if __name__ == "__main__":
+    main()
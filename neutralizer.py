@@ -1,56 +1,246 @@
-import groq
+import os, sys, csv, json, time, random, hashlib, argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Shared utilities (Groq client, retry helpers, semantic cache) live in the API package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
 
 try:
     from configs import GROQ_API_KEY
 except:
     print("Could not import configs, retrying with relative import.")
-    import sys
     sys.path.append("..")
     from configs import GROQ_API_KEY
 
-def init_groq(sys_prompt, message, model="llama-3.1-70b-versatile", temperature=0.1, max_tokens=1024, stream=False, response_fotmat=None):
-    
-    # Initialize the Groq client with the API key
-    client = groq.Groq(api_key=GROQ_API_KEY)
-    
-    # Send the system and user messages to the model for inference
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": sys_prompt},
-            {"role": "user", "content": message}
-        ],
-        stream=stream,
-        temperature=temperature,
-        max_tokens=max_tokens,
-        response_format=response_fotmat
-    )
-    
-    return response
+from utils.models import init_groq
+from utils.gateway import is_retryable, retry_after
+from utils.semantic_cache import semantic_cache
+from utils.scheduler import ProviderScheduler, estimate_tokens
 
-def neutralize_text(paragraph):
-    
-    # Define the system prompt to instruct the model on neutralizing gender bias
-    sys_prompt = """
-        You are a skilled language model tasked with rewriting job descriptions and other textual content to remove all forms of bias, including gender, age, ethnicity, and personality-related biases. Your goal is to identify and neutralize masculine-coded, feminine-coded, and exclusionary words, phrases, and expressions that may discourage certain groups from applying. 
+# Rewrites depend on every detail of the input, so only near-exact repeats are reused
+NEUTRALIZED = semantic_cache("neutralize", threshold=0.97)
+
+NEUTRALIZE_PROMPT = """
+You are a skilled language model tasked with rewriting job descriptions and other textual content to remove all forms of bias, including gender, age, ethnicity, and personality-related biases. Your goal is to identify and neutralize masculine-coded, feminine-coded, and exclusionary words, phrases, and expressions that may discourage certain groups from applying. 
 
-        Specifically, be sure to neutralize gender-coded words commonly associated with certain genders, such as:
-        - Masculine-coded words (e.g., assertive, competitive, decisive, independent).
-        - Feminine-coded words (e.g., collaborative, nurturing, compassionate, emotional).
+Specifically, be sure to neutralize gender-coded words commonly associated with certain genders, such as:
+- Masculine-coded words (e.g., assertive, competitive, decisive, independent).
+- Feminine-coded words (e.g., collaborative, nurturing, compassionate, emotional).
 
-        Ensure that the revised text maintains the original meaning and intent while promoting inclusivity. Be especially attentive to:
-        - Language that implies gender stereotypes or suggests certain roles are more suitable for one gender.
-        - Words or phrases that suggest age, personality, or cultural preferences.
-        - Any references to ethnicity, race, religion, or other personal characteristics unless essential for the role.
+Ensure that the revised text maintains the original meaning and intent while promoting inclusivity. Be especially attentive to:
+- Language that implies gender stereotypes or suggests certain roles are more suitable for one gender.
+- Words or phrases that suggest age, personality, or cultural preferences.
+- Any references to ethnicity, race, religion, or other personal characteristics unless essential for the role.
 
-        The output should be free of bias, neutralizing both masculine-coded and feminine-coded language to foster an inclusive, welcoming, and unbiased tone. The goal is to clearly convey the skills, qualifications, and responsibilities required for the position, ensuring the description appeals to a diverse range of candidates.
-        """
+The output should be free of bias, neutralizing both masculine-coded and feminine-coded language to foster an inclusive, welcoming, and unbiased tone. The goal is to clearly convey the skills, qualifications, and responsibilities required for the position, ensuring the description appeals to a diverse range of candidates.
+"""
 
-    # Call the Groq inference function with the system prompt and user message
-    response = init_groq(sys_prompt, paragraph)
+def _complete(paragraph, sketch=None):
+    """Neutralize with the model and cache the result. Returns (output_text, usage).
+    `sketch` is NEUTRALIZED.sketch(paragraph) when the caller already has it."""
+    # Shared Groq client, so connections are reused across paragraphs and threads
+    response = init_groq(NEUTRALIZE_PROMPT, paragraph, max_tokens=1024)
 
     # Extract the output text from the response
     output_text = response.choices[0].message.content
-    
+    NEUTRALIZED.put(paragraph, output_text, sketch=sketch)
+
+    return output_text, getattr(response, "usage", None)
+
+def neutralize_text(paragraph):
+    sketch = NEUTRALIZED.sketch(paragraph)
+    hit = NEUTRALIZED.get(paragraph, sketch=sketch)
+    if hit is not None:
+        return hit.value
+
+    return _complete(paragraph, sketch)[0]
+
+
+# Bulk mode
+#
+#   python neutralizer.py postings.jsonl -o neutralized.jsonl --concurrency 8 --rpm 30 --tpm 20000
+#   python neutralizer.py postings.csv --text-field description -o neutralized.jsonl
+#   python neutralizer.py archive/ -o neutralized.jsonl
+#
+# Items are streamed from the input and results are appended to the output
+# JSONL as they finish, which doubles as the checkpoint: running the same
+# command again skips every id already written with status "ok".
+
+TEXT_EXTENSIONS = (".txt", ".md")
+# Attempts per item on 429s, 5xx and timeouts before it is written as an error
+MAX_ATTEMPTS = 5
+
+def _item_id(record, id_field, text):
+    if record.get(id_field) not in (None, ""):
+        return str(record[id_field])
+    # Stable across runs, so resuming works without an id column
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def read_items(path, id_field="id", text_field="text"):
+    """Yield (id, text) from a JSONL or CSV file, or .txt/.md files under a directory."""
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(TEXT_EXTENSIONS):
+                    file_path = os.path.join(root, name)
+                    with open(file_path, encoding="utf-8") as f:
+                        yield os.path.relpath(file_path, path), f.read()
+    elif path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for record in csv.DictReader(f):
+                text = record.get(text_field) or ""
+                if text.strip():
+                    yield _item_id(record, id_field, text), text
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    text = record.get(text_field) or ""
+                    if text.strip():
+                        yield _item_id(record, id_field, text), text
+
+def load_checkpoint(output):
+    """Ids already neutralized in `output`. A partly written last line from a
+    crash is cut off so new results start on a fresh line."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "rb+") as f:
+        valid = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+        f.truncate(valid)
+    return done
+
+class BulkStats:
+    def __init__(self, input_price, output_price):
+        self.started = time.monotonic()
+        self.input_price = input_price
+        self.output_price = output_price
+        self.done = self.skipped = self.failed = self.cached = 0
+        self.prompt_tokens = self.completion_tokens = 0
+
+    def record(self, usage, cached):
+        self.done += 1
+        self.cached += int(cached)
+        if usage is not None:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    @property
+    def cost(self):
+        # Prices are USD per million tokens
+        return (self.prompt_tokens * self.input_price + self.completion_tokens * self.output_price) / 1e6
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        return (
+            f"{self.done} neutralized ({self.cached} from cache), {self.skipped} skipped, {self.failed} failed "
+            f"in {elapsed:.1f}s | {self.done / elapsed if elapsed else 0:.2f} items/s | "
+            f"{self.prompt_tokens} prompt + {self.completion_tokens} completion tokens | ${self.cost:.4f}"
+        )
+
+def neutralize_bulk(items, output, concurrency=4, rpm=30, tpm=20000, input_price=0.59, output_price=0.79,
+                    report_every=30.0):
+    """Neutralize (id, text) items into `output` (JSONL), resuming from earlier runs."""
+    done = load_checkpoint(output)
+    stats = BulkStats(input_price, output_price)
+    # Same token buckets as the API's provider scheduler, sized to this job's budget
+    budget = ProviderScheduler(rpm, tpm)
+
+    def work(item_id, text):
+        estimated = estimate_tokens(NEUTRALIZE_PROMPT, text) + 1024
+        # Cache hits do not spend the rate budget
+        sketch = NEUTRALIZED.sketch(text)
+        hit = NEUTRALIZED.get(text, sketch=sketch)
+        if hit is not None:
+            return item_id, hit.value, None, True
+        for attempt in range(MAX_ATTEMPTS):
+            budget.acquire(estimated)
+            try:
+                output_text, usage = _complete(text, sketch)
+            except Exception as e:
+                # A refused or failed call spent no tokens
+                budget.settle(estimated, 0)
+                if attempt + 1 == MAX_ATTEMPTS or not is_retryable(e):
+                    raise
+                if getattr(e, "status_code", None) == 429:
+                    # Holds back every worker thread, not just this one, for as long as Groq asks
+                    budget.pause(retry_after(e) or 2 ** attempt)
+                else:
+                    time.sleep(random.uniform(0, 2 ** attempt))
+                continue
+            if usage is not None:
+                budget.settle(estimated, getattr(usage, "total_tokens", estimated) or estimated)
+            return item_id, output_text, usage, False
+
+    next_report = time.monotonic() + report_every
+    with open(output, "a", encoding="utf-8") as out, ThreadPoolExecutor(concurrency) as pool:
+        pending = {}
+
+        def collect(block):
+            finished, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in finished:
+                item_id = pending.pop(future)
+                try:
+                    item_id, output_text, usage, cached = future.result()
+                except Exception as e:
+                    stats.failed += 1
+                    out.write(json.dumps({"id": item_id, "status": "error", "error": str(e)}) + "\n")
+                    continue
+                stats.record(usage, cached)
+                out.write(json.dumps({"id": item_id, "status": "ok", "text": output_text, "cached": cached}) + "\n")
+            if finished:
+                out.flush()
+
+        for item_id, text in items:
+            if item_id in done:
+                stats.skipped += 1
+                continue
+            done.add(item_id)
+            # Bounded look-ahead keeps memory flat however large the input is
+            while len(pending) >= concurrency * 2:
+                collect(block=True)
+            pending[pool.submit(work, item_id, text)] = item_id
+            collect(block=False)
+            if time.monotonic() >= next_report:
+                print(stats.summary(), file=sys.stderr)
+                next_report = time.monotonic() + report_every
+
+        while pending:
+            collect(block=True)
+
+    print(stats.summary(), file=sys.stderr)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Neutralize biased language in bulk")
+    parser.add_argument("input", help="JSONL or CSV file, or a directory of .txt/.md files")
+    parser.add_argument("-o", "--output", required=True, help="Output JSONL, also used to resume")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=30, help="Requests per minute budget")
+    parser.add_argument("--tpm", type=float, default=20000, help="Tokens per minute budget")
+    parser.add_argument("--input-price", type=float, default=0.59, help="USD per million prompt tokens")
+    parser.add_argument("--output-price", type=float, default=0.79, help="USD per million completion tokens")
+    parser.add_argument("--report-every", type=float, default=30.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    stats = neutralize_bulk(
+        read_items(args.input, args.id_field, args.text_field), args.output, args.concurrency,
+        args.rpm, args.tpm, args.input_price, args.output_price, args.report_every,
+    )
+    sys.exit(1 if stats.failed else 0)
 
-    return output_text
\ No newline at end of file
+if __name__ == "__main__":
+    main()
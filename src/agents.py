@@ -17,9 +17,9 @@ class DevilsAdvocateSystem:
             Reviewer(name="Reviewer C", bias_level="unbiased", specialization="general")
         ]
 
-    def _get_reviewer_prompt(self, reviewer: Reviewer, opportunity: str, application: str) -> str:
-        template = BIASED_REVIEWER_TEMPLATE if reviewer.bias_level == "biased" else UNBIASED_REVIEWER_TEMPLATE
-        return template.format(name=reviewer.name, opportunity=opportunity, application=application)
+    def _get_reviewer_prompt(self, reviewer: Reviewer, opportunity: str, application: str) -> Tuple[str, str]:
+        layout = REVIEWER_LAYOUTS["biased" if reviewer.bias_level == "biased" else "unbiased"]
+        return layout.render(name=reviewer.name, opportunity=opportunity, application=application)
 
     async def _parse_reviewer_response(self, response_text: str, reviewer_type: BiasLevel=None):
         response_format = { "type": "json_object" }
@@ -33,8 +33,8 @@ class DevilsAdvocateSystem:
             raise ValueError(f"Failed to parse reviewer response: {e}")
 
     async def _get_reviewer_feedback(self, reviewer: Reviewer, opportunity:str, application: str) -> ReviewerFeedback:
-        prompt = self._get_reviewer_prompt(reviewer, opportunity, application)
-        response = self.client(prompt, "").choices[0].message.content
+        sys_prompt, message = self._get_reviewer_prompt(reviewer, opportunity, application)
+        response = self.client(sys_prompt, message).choices[0].message.content
 
         # Parse LLM response into structured feedback
         parsed_feedback = await self._parse_reviewer_response(response, reviewer_type=reviewer.bias_level)
@@ -107,8 +107,8 @@ class BiasDetector:
     
     async def analyze_reviews(self, reviews: List[Dict], opportunity: str, application: str) -> Dict:
 
-        prompt = BIAS_DETECTOR_TEMPLATE.format(reviews=reviews, opportunity=opportunity, application=application)
-        response = self.client(prompt, "").choices[0].message.content
+        sys_prompt, message = BIAS_DETECTOR_LAYOUT.render(reviews=reviews, opportunity=opportunity, application=application)
+        response = self.client(sys_prompt, message).choices[0].message.content
         
         return {
             "analysis_summary": response,
@@ -131,11 +131,11 @@ class ProfileHelper:
 
     async def _generate_improvements(self, opportunity, application, reviews: List[Dict] , bias_analysis: Dict):
         # Improvement suggestion generation based on reviews and bias analysis
-        prompt = APPLICATION_ENHANCEMENT_PROMPT_TEMPLATE.format(
+        sys_prompt, message = APPLICATION_ENHANCEMENT_LAYOUT.render(
             opportunity=opportunity, application=application, reviews=reviews, bias_analysis=bias_analysis
         )
         response_format = { "type": "json_object" }
-        response = self.client(prompt, "", response_format=response_format).choices[0].message.content
+        response = self.client(sys_prompt, message, response_format=response_format).choices[0].message.content
 
         try:
             json_response = json.loads(response)
@@ -151,9 +151,9 @@ class ProfileHelper:
 
     async def _generate_improvements_independent(self, opportunity, application):
         # Improvement suggestion generation based on reviews and bias analysis
-        prompt = APPLICATION_ENHANCEMENT_PROMPT_TEMPLATE_INDEPENDENT.format(opportunity=opportunity, application=application)
+        sys_prompt, message = APPLICATION_ENHANCEMENT_INDEPENDENT_LAYOUT.render(opportunity=opportunity, application=application)
         response_format = { "type": "json_object" }
-        response = self.client(prompt, "", response_format=response_format).choices[0].message.content
+        response = self.client(sys_prompt, message, response_format=response_format).choices[0].message.content
 
         try:
             json_response = json.loads(response)
@@ -1,10 +1,26 @@
-import os, tempfile, traceback
+import os, time, tempfile, traceback, asyncio, logging
 from typing import List, Literal, Any
 from fastapi import FastAPI, Request, Form, UploadFile, Depends
 from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
 from core.agents import ProfileEvaluationSystem, ProfileHelper
-from utils.models import groq, init_groq, GROQ_API_KEY
-from utils.web import BeautifulSoupWebReader
+from core.batch import BatchEvaluator, rank_candidates
+from core.compact import CompactEvaluation, CompactImprovements
+from core.serialization import serialize
+from core.narration import narrate_evaluation, narrate_improvements, glossary, HEADINGS
+from utils.models import init_groq, GROQ_API_KEY
+from utils.routing import chat, route_stats, GATEWAY, FLIGHTS
+from utils.scheduler import SCHEDULER, application_id_var, queue_key_var
+from utils.usage import LEDGER, QuotaExceeded, api_key_var, current_tenant
+from utils.store import state_mapping, load, save
+from utils.translation_memory import TRANSLATIONS
+from utils.tracing import traced, trace_stream, render_prometheus
+from utils.logs import setup_logging, log_token
+from utils.sse import SSEEvent, EventSourceResponse
+from utils.cancellation import DetachedTasks
+from utils.semantic_cache import semantic_cache_stats
+from utils.sections import DocumentSet, PROMPT_EXCLUDED_SECTIONS, dump_upload, load_upload
+from utils.startup import WARMUP as warm_up
+from configs import FINISH_ON_DISCONNECT, WARMUP, LLM_NARRATION
 from utils.helpers import *
 
 class TempState:
@@ -22,18 +38,120 @@ class TempState:
                 }
             ]
         """
-        self.text = {}
-        self.files = {}
-        self.webpages = {}
-        self.evaluations = {}
-        self.enhancements = {}
+        # Shared by all workers through STATE_DB_PATH when it is set, else per process
+        self.text = state_mapping("text")
+        # Uploads keep their DocumentSet layout in the store rather than a pickle of it
+        self.files = state_mapping("files", dump_upload, load_upload)
+        self.webpages = state_mapping("webpages")
+        # CompactEvaluation / CompactImprovements, materialized when a handler needs them
+        self.evaluations = state_mapping("evaluations")
+        self.enhancements = state_mapping("enhancements")
+        # Evaluations and improvements keep running after a client disconnect
+        self.detached = DetachedTasks()
 
     def get_state():
         return state
 
+def describe_upload(upload):
+    if upload is None:
+        return None
+    return {"files": upload["files"], "data": upload["documents"].items(), "previous": upload.get("previous")}
+
+async def localized(lines, language):
+    """`lines` as they are, or translated through the translation memory into one of OTHER_LANGUAGES."""
+    if language not in OTHER_LANGUAGES:
+        for line in lines:
+            yield line
+        return
+    translated = TRANSLATIONS.translate(lines, language, translate_output, scope=current_tenant())
+    async for line in iterate_in_thread(translated):
+        log_token(line)
+        yield line
+
+async def narrative_tokens(json_output, language):
+    """The LLM-written narrative, translated sentence by sentence into OTHER_LANGUAGES."""
+    sentence = ""
+    async for token in iterate_in_thread(structured_output_chat(json_output)):
+        if language not in OTHER_LANGUAGES:
+            log_token(token)
+            yield token
+        else:
+            sentence += token
+            if sentence.endswith(".") or sentence.endswith(". "):
+                sentence, finished = "", sentence
+                async for line in localized([finished], language):
+                    yield line
+    if sentence:
+        async for line in localized([sentence], language):
+            yield line
+
+async def narrate(lines, json_output, language):
+    """
+    Stream the templated narration of a result, then the LLM narrative when
+    LLM_NARRATION is "append". The narrative is generated while the template
+    lines are still being sent, e.g. translated.
+    """
+    narrative, task = asyncio.Queue(), None
+    if LLM_NARRATION == "append":
+        async def prefetch():
+            try:
+                async for token in narrative_tokens(json_output, language):
+                    narrative.put_nowait(token)
+            finally:
+                narrative.put_nowait(None)
+        task = asyncio.create_task(prefetch())
+    try:
+        async for line in localized(lines, language):
+            yield line
+        if task is None:
+            return
+        yield format_sse("Writing a detailed narrative...")
+        async for line in localized([f"\n{HEADINGS['narrative']}\n"], language):
+            yield line
+        while (token := await narrative.get()) is not None:
+            yield token
+        # Surfaces a failed narrative the same way an inline one would have
+        await task
+    finally:
+        if task is not None and not task.done():
+            task.cancel()
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Headings, labels and enum strings of the narration, translated once per language
+TRANSLATIONS.register_glossary(glossary())
+
 app = FastAPI()
 state = TempState()
+started_at = time.monotonic()
+
+@app.on_event("startup")
+async def startup():
+    # Heavy dependencies are imported on first use; preload them without delaying readiness
+    if WARMUP:
+        warm_up.start()
+    LEDGER.start()
 
+@app.on_event("shutdown")
+async def shutdown():
+    LEDGER.stop()
+
+@app.middleware("http")
+async def identify_tenant(request: Request, call_next):
+    # LLM usage and quotas are accounted per API key, "anonymous" without one
+    token = api_key_var.set(request.headers.get("x-api-key"))
+    try:
+        return await call_next(request)
+    finally:
+        api_key_var.reset(token)
+
+@app.exception_handler(QuotaExceeded)
+async def quota_exceeded(request: Request, error: QuotaExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"statusCode": 429, "detail": str(error), "scope": error.scope, "limit": error.limit},
+    )
 
 @app.get('/healthz')
 async def health():
@@ -42,22 +160,58 @@ async def health():
         "message": "running succesfully"
     }
 
+@app.get('/readyz')
+async def ready():
+    return {
+        "ready": True,
+        "uptime": round(time.monotonic() - started_at, 3),
+        "warm_up": warm_up.status(),
+    }
+
+@app.get('/routes/stats')
+async def routes():
+    return {
+        "routes": route_stats(),
+        "providers": GATEWAY.status(),
+        "scheduler": SCHEDULER.status(),
+        "single_flight": FLIGHTS.stats(),
+        "detached": state.detached.status(),
+        "semantic_cache": semantic_cache_stats(),
+        "translation_memory": TRANSLATIONS.stats,
+    }
+
+@app.get('/usage')
+async def usage(application_id: str = None, days: int = 7):
+    return await asyncio.to_thread(LEDGER.summary, current_tenant(), application_id, days)
+
+@app.get('/metrics')
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.post('/upload')
+@traced("http.upload")
 async def process(
     files: List[UploadFile] = None,
     urls: List[str] = None,
+    # Revised version of an earlier upload, evaluated incrementally from its evaluation
+    previous_application_id: str = Form(None),
     # state: TempState = Depends(TempState.get_state),
 ):
     application_id = str(uuid.uuid4())
-    loader = BeautifulSoupWebReader()
+    application_id_var.set(application_id)
+    upload = pages = None
     if urls:
+        # Pulls in bs4, only needed for URL sources
+        from utils.web import BeautifulSoupWebReader
+        loader = BeautifulSoupWebReader()
         try:
             webpages = await loader.multi_load_data(urls, timeout=1)
             content = [clean_page_content(webpage.get_text()) for webpage in webpages]
-            state.webpages[application_id] = {
+            pages = {
                 "urls": urls,
                 "data": content,
             }
+            await save(state.webpages, application_id, pages)
         except Exception as e:
             pass
 
@@ -74,15 +228,10 @@ async def process(
                 file_object = await file.read()
                 if file.filename.endswith("txt"):
                     text = file_object.decode(encoding = "utf-8")
-                    metadata = classify_input_file(text)
+                    metadata = await asyncio.to_thread(classify_input_file, text)
                 elif file.filename.endswith("pdf"):
                     text, metadata = await pdf_reader(file_object)
-                content.append(
-                    {
-                        "type": metadata["doc_type"],
-                        "content": text,
-                    }
-                )
+                content.append((metadata["doc_type"], file.filename, text))
 
             else:
                 return JSONResponse(
@@ -93,10 +242,13 @@ async def process(
                     },
                 )
 
-        state.files[application_id] = {
+        # Parsed into sections once here, handlers only slice the shared buffer
+        upload = {
                 "files": [file.filename for file in files],
-                "data": content,
+                "documents": DocumentSet.build(content),
+                "previous": previous_application_id,
             }
+        await save(state.files, application_id, upload)
 
     return JSONResponse(
         status_code=200,
@@ -105,120 +257,180 @@ async def process(
             "status": "Uploaded data sources succesfully",
             "output": {
                 "application_id": application_id,
-                "sources": [state.files.get(application_id), state.webpages.get(application_id)],
+                "sources": [describe_upload(upload), pages],
             },
         },
     )
 
 @app.post('/evaluate-profile')
 async def process(
+    request: Request,
     application_id: str = Form(...),
     language: str = Form(None),
     # state: TempState = Depends(TempState.get_state),
 ):
     
-    groq_client = init_groq
+    # Refuse before the stream starts rather than failing halfway through it; the
+    # check may read the usage database, so it runs off the event loop like the store
+    await asyncio.to_thread(LEDGER.check, application_id=application_id)
+    groq_client = chat
     profile_evaluator = ProfileEvaluationSystem(groq_client, application_id=application_id)
     
-    docs = state.files.get(application_id)
+    docs = await load(state.files, application_id)
 
     async def run_with_steps():
+        application_id_var.set(application_id)
 
-        print(f"\n\n\n")
         yield format_sse(f"Analysing content for potential bias...")
-        time.sleep(0.5)
+        await asyncio.sleep(0.5)
 
         yield format_sse(f"Analysing application...")
-        time.sleep(0.5)
+        await asyncio.sleep(0.5)
 
-        application = "\n\n".join([item["content"] for item in docs["data"] if item["type"]=="application"])
-        opportunity = "\n\n".join([item["content"] for item in docs["data"] if item["type"]=="opportunity"])
+        documents = docs["documents"]
+        application = documents.text("application")
+        opportunity = documents.text("opportunity", exclude=PROMPT_EXCLUDED_SECTIONS)
+
+        previous_id = docs.get("previous")
+        previous_docs = await load(state.files, previous_id)
+        previous_evaluation = await load(state.evaluations, previous_id)
+
+        async def evaluate():
+            if previous_docs and previous_evaluation:
+                evaluation_results = await profile_evaluator.reevaluate_application(
+                    documents, previous_docs["documents"], previous_evaluation.model(),
+                )
+            else:
+                evaluation_results = await profile_evaluator.evaluate_application(opportunity, application)
+            await save(state.evaluations, application_id, CompactEvaluation.pack(evaluation_results))
+            return evaluation_results
 
         yield format_sse(f"Intiating Devil's advocate...")
-        evaluation_results = await profile_evaluator.evaluate_application(opportunity, application)
+        evaluation_results = await state.detached.run(
+            ("evaluation", application_id), evaluate, detach=FINISH_ON_DISCONNECT
+        )
 
         yield format_sse(f"Debiasing Devil's advocate...")
-        time.sleep(0.5)
+        await asyncio.sleep(0.5)
 
-        dict_output = export_results(evaluation_results, format='dict')
-        json_output = export_results(evaluation_results, format='json')
+        # Built once, sent to the client and to the narration prompt as compact JSON
+        json_output = serialize(evaluation_results).text()
         yield format_sse(f"Generating final evaluation...")
-        yield f"data: {json_output}"
-        yield r"\n\t\t\n"
-
-        state.evaluations[application_id] = dict_output
-        
-        sentence = ""
-        for token in structured_output_chat(json_output):
-            if language not in OTHER_LANGUAGES:
-                print(token, end="")
-                yield f"""{token}"""
-            else:
-                sentence += token
-                if sentence.endswith(".") or sentence.endswith(". "):
-                    response_2 = translate_output(sentence, language)
-                    sentence = ""
-                    for message in response_2:
-                        token = message.choices[0].delta.content # get streamed tokens as they arrive
-                        if token:
-                            # output += token
-                            print(token, end="")
-                            yield f"""{token}"""
+        yield SSEEvent(json_output, event="evaluation")
+
+        async for token in narrate(narrate_evaluation(evaluation_results), json_output, language):
+            yield token
     
-    return StreamingResponse(run_with_steps()) # , media_type="text/event-stream"
+    return EventSourceResponse(
+        trace_stream("http.evaluate_profile", run_with_steps(), application_id=application_id, language=language),
+        request,
+    )
 
 
 @app.post('/profile-helper')
 async def helper(
+    request: Request,
     application_id: str = Form(...),
     language: str = Form(None),
     # state: TempState = Depends(TempState.get_state),
 ):
 
-    groq_client = init_groq
+    await asyncio.to_thread(LEDGER.check, application_id=application_id)
+    groq_client = chat
 
     async def run_with_steps():
-        print(f"\n\n\n")
+        application_id_var.set(application_id)
         yield format_sse(f"Intiating Profile Helper...")
         profile_helper = ProfileHelper(groq_client, application_id=application_id)
 
-        docs = state.files.get(application_id)
-        application = "\n\n".join([item["content"] for item in docs["data"] if item["type"]=="application"])
-        opportunity = "\n\n".join([item["content"] for item in docs["data"] if item["type"]=="opportunity"])
+        docs = await load(state.files, application_id)
+        application = docs["documents"].text("application")
+        opportunity = docs["documents"].text("opportunity", exclude=PROMPT_EXCLUDED_SECTIONS)
 
         yield format_sse(f"Reviewing application feedbacks...")
-        evaluation_results = state.evaluations.get(application_id)
+        evaluation_results = (await load(state.evaluations, application_id)).dump()
+        async def improve():
+            enhancement_results = await profile_helper._generate_improvements(
+                opportunity, application,
+                evaluation_results["reviews"],
+                evaluation_results["bias_analysis"],
+            )
+            await save(state.enhancements, application_id, CompactImprovements.pack(enhancement_results))
+            return enhancement_results
+
         yield format_sse(f"Generating profile enhancements. Please wait a moment...")
-        enhancement_results = await profile_helper._generate_improvements(
-            opportunity, application,
-            evaluation_results["reviews"],
-            evaluation_results["bias_analysis"],
+        enhancement_results = await state.detached.run(
+            ("enhancements", application_id, str(evaluation_results["evaluation_timestamp"])),
+            improve, detach=FINISH_ON_DISCONNECT,
         )
-        state.enhancements[application_id] = export_results(enhancement_results, format="dict")
-
-        json_output = export_results(enhancement_results, format='json')
-        
-        sentence = ""
-        for token in structured_output_chat(json_output):
-            if language not in OTHER_LANGUAGES:
-                print(token, end="")
-                yield f"""{token}"""
-            else:
-                sentence += token
-                if sentence.endswith(".") or sentence.endswith(". "):
-                    response_2 = translate_output(sentence, language)
-                    sentence = ""
-                    for message in response_2:
-                        token = message.choices[0].delta.content # get streamed tokens as they arrive
-                        if token:
-                            # output += token
-                            print(token, end="")
-                            yield f"""{token}"""
 
-    return StreamingResponse(run_with_steps()) # , media_type="text/event-stream"
+        json_output = serialize(enhancement_results).text()
+
+        async for token in narrate(narrate_improvements(enhancement_results), json_output, language):
+            yield token
+
+    return EventSourceResponse(
+        trace_stream("http.profile_helper", run_with_steps(), application_id=application_id, language=language),
+        request,
+    )
+
+
+@app.post('/batch-evaluate')
+async def batch_evaluate(
+    request: Request,
+    opportunity: UploadFile,
+    applications: List[UploadFile],
+):
+    for file in [opportunity, *applications]:
+        if not file or file.filename == '' or not allowed_file(file.filename):
+            return JSONResponse(
+                status_code=415,
+                content={
+                    "statusCode": 415,
+                    "detail": f"File format not supported. Use any of {ALLOWED_EXTENSIONS} formats",
+                },
+            )
+
+    await asyncio.to_thread(LEDGER.check)
+    opportunity_text = await read_document(opportunity.filename, await opportunity.read())
+    candidates = [
+        (file.filename, await read_document(file.filename, await file.read())) for file in applications
+    ]
+    engine = BatchEvaluator(chat)
+
+    async def run_batch():
+        application_id_var.set(engine.batch_id)
+        queue_key_var.set(engine.batch_id)
+        yield format_sse(f"Preparing opportunity...")
+        prepared = await engine.prepare_opportunity(opportunity_text)
+
+        yield format_sse(f"Evaluating {len(candidates)} applications...")
+        results = []
+        async for result in engine.evaluate(prepared, candidates, prepared=True):
+            results.append(result)
+            if result.error is None:
+                # Each candidate can be opened with /profile-helper like a single upload
+                await save(state.files, result.candidate_id, {
+                    "files": [opportunity.filename, result.name],
+                    "documents": DocumentSet.build([
+                        ("opportunity", opportunity.filename, prepared),
+                        ("application", result.name, candidates[result.index][1]),
+                    ]),
+                })
+                await save(state.evaluations, result.candidate_id, CompactEvaluation.pack(result.evaluation))
+            yield SSEEvent(result.model_dump_json(), event="candidate")
+
+        ranking = [result.model_dump(exclude={"evaluation"}) for result in rank_candidates(results)]
+        yield SSEEvent(json.dumps({"batch_id": engine.batch_id, "ranking": ranking}), event="ranking")
+
+    return EventSourceResponse(
+        trace_stream("http.batch_evaluate", run_batch(), batch_id=engine.batch_id, candidates=len(candidates)),
+        request,
+    )
 
 
 if __name__ == "__main__":
+    # Single-process development server; launcher.py runs the multi-process deployment
     import uvicorn
-    print("Starting LVLR API")
+    logger.info("Starting LVLR API")
     uvicorn.run(app, host="0.0.0.0", reload=True)
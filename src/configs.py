@@ -4,3 +4,107 @@ load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 OPENAI_API_KEY = os.getenv('OPEN_AI_KEY')
+
+# JSON mapping (or path to a JSON file) of route name -> ["provider:model", ...]
+# e.g. {"classify": ["groq:llama-3.1-8b-instant", "openai:gpt-4o-mini"]}
+LLM_ROUTES = os.getenv("LLM_ROUTES")
+
+# LLM gateway: per-attempt socket timeout, overall per-call deadline (seconds),
+# retries per provider and hedged requests (off unless LLM_HEDGING=1)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", 90))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+
+# Point the SDKs at a different endpoint, e.g. the offline fake provider
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+
+# Client-side provider rate limits (requests/min and tokens/min), JSON
+LLM_RATE_LIMITS = os.getenv(
+    "LLM_RATE_LIMITS",
+    '{"groq": {"rpm": 30, "tpm": 20000}, "openai": {"rpm": 500, "tpm": 30000}}',
+)
+
+# Write finished trace spans as JSON lines to this file (disabled when unset)
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+# Logging: default level, per-module overrides ("utils.web=DEBUG,utils.gateway=WARNING")
+# and the fraction of streamed tokens logged when lvlr.tokens is at DEBUG
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_TOKEN_SAMPLE_RATE = float(os.getenv("LOG_TOKEN_SAMPLE_RATE", 0.01))
+
+# SSE writer: streamed tokens are coalesced into one frame until it reaches
+# SSE_MAX_FRAME_BYTES or SSE_FLUSH_INTERVAL seconds pass; idle connections get
+# a heartbeat comment every SSE_HEARTBEAT seconds
+SSE_FLUSH_INTERVAL = float(os.getenv("SSE_FLUSH_INTERVAL", 0.05))
+SSE_MAX_FRAME_BYTES = int(os.getenv("SSE_MAX_FRAME_BYTES", 1024))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+
+# How often streaming endpoints poll for a client disconnect (seconds), and
+# whether expensive stages (evaluation, improvements) finish in the background
+# after a disconnect so a retried request can reuse their result
+SSE_DISCONNECT_POLL = float(os.getenv("SSE_DISCONNECT_POLL", 0.5))
+FINISH_ON_DISCONNECT = os.getenv("FINISH_ON_DISCONNECT", "1") == "1"
+
+# Batch evaluation: candidates evaluated at once across all batches, and the
+# token budget the shared opportunity text is trimmed to
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_OPPORTUNITY_TOKENS = int(os.getenv("BATCH_OPPORTUNITY_TOKENS", 5000))
+
+# Near-duplicate cache (MinHash + LSH) in front of classification, evaluation
+# and neutralization; similarity is the estimated Jaccard index of word shingles
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.9))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 2048))
+# An evaluation is about one applicant, so it is only reused for (nearly) the same application
+EVALUATION_CACHE_THRESHOLD = float(os.getenv("EVALUATION_CACHE_THRESHOLD", 0.98))
+
+# Incremental re-evaluation of a revised application: above this share of changed
+# text the application is evaluated from scratch instead
+INCREMENTAL_MAX_CHANGE = float(os.getenv("INCREMENTAL_MAX_CHANGE", 0.5))
+
+# Section kinds left out of the opportunity in review prompts, comma separated (e.g.
+# "benefits"); only sections under an exact, recognised heading are dropped (see
+# utils.sections.EXCLUDABLE_HEADINGS). Nothing is left out by default
+PROMPT_EXCLUDED_SECTIONS = tuple(
+    kind.strip() for kind in os.getenv("PROMPT_EXCLUDED_SECTIONS", "").split(",") if kind.strip()
+)
+
+# Import the provider SDKs and document parsers in the background after start-up
+# instead of on the first request that needs them
+WARMUP = os.getenv("WARMUP", "1") == "1"
+
+# LLM usage accounting: SQLite file per-tenant token and cost totals are added to
+# every USAGE_FLUSH_INTERVAL seconds (empty to keep them in memory only, for the
+# last USAGE_MEMORY_DAYS days), model prices as JSON
+# {"model": [usd_per_million_prompt, usd_per_million_completion]} and per-tenant /
+# per-application quotas as JSON (see utils.usage)
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", "usage.db")
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", 10))
+USAGE_MEMORY_DAYS = int(os.getenv("USAGE_MEMORY_DAYS", 31))
+LLM_PRICES = os.getenv("LLM_PRICES")
+USAGE_QUOTAS = os.getenv("USAGE_QUOTAS")
+
+# Results on the SSE endpoints are narrated from templates as soon as they exist;
+# "append" streams the LLM-written narrative after that, "off" leaves it out
+LLM_NARRATION = os.getenv("LLM_NARRATION", "append")
+
+# Translation memory for OTHER_LANGUAGES: SQLite file of translated glossary segments
+# (empty keeps them in memory only), free-text segments kept in memory per tenant and
+# language and for how long (seconds), similarity from which a known segment is reused
+# for a new one (1 turns fuzzy matches off), novel segments per provider request, and
+# an optional JSON file of curated translations {"Yoruba": {"Strengths": "..."}}
+TRANSLATION_MEMORY_PATH = os.getenv("TRANSLATION_MEMORY_PATH", "translations.db")
+TRANSLATION_MEMORY_SIZE = int(os.getenv("TRANSLATION_MEMORY_SIZE", 2000))
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", 3600))
+TRANSLATION_FUZZY_THRESHOLD = float(os.getenv("TRANSLATION_FUZZY_THRESHOLD", 0.95))
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", 24))
+TRANSLATION_GLOSSARY = os.getenv("TRANSLATION_GLOSSARY")
+
+# Multi-process deployments (launcher.py): SQLite file the workers share uploads,
+# evaluations and exact LLM cache entries through (empty keeps them per process),
+# and how long those entries live (seconds)
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "")
+STATE_TTL = float(os.getenv("STATE_TTL", 86400))
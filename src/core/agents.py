@@ -1,8 +1,33 @@
-import math, json, asyncio
+from __future__ import annotations
+import math, json, asyncio, logging
 from collections import Counter
-from utils.models import groq, init_groq, GROQ_API_KEY
+from typing import TYPE_CHECKING
+from utils.models import init_groq, GROQ_API_KEY
+from utils.routing import chat
+from utils.tracing import traced, set_attributes, increment
+from utils.semantic_cache import semantic_cache
+from utils.sections import DocumentSet, PROMPT_EXCLUDED_SECTIONS, diff_sections, changed_fraction, render_changes
 from utils.prompts import *
+from utils.usage import current_tenant
+from configs import INCREMENTAL_MAX_CHANGE, EVALUATION_CACHE_THRESHOLD
 from core.base import *
+from core.serialization import REVIEWS
+
+if TYPE_CHECKING:
+    import groq
+
+logger = logging.getLogger(__name__)
+
+# Near-identical applications to near-identical opportunities of the same tenant share an evaluation
+OPPORTUNITIES = semantic_cache("opportunity")
+EVALUATIONS = semantic_cache("evaluation", threshold=EVALUATION_CACHE_THRESHOLD)
+
+# Application sections each reviewer specialization reads when re-evaluating a
+# revised application; other specializations read every section
+REVIEWER_SECTIONS = {
+    "technical": {"header", "experience", "skills", "projects", "education", "certifications"},
+    "leadership": {"header", "summary", "experience", "projects", "other"},
+}
 
 class DevilsAdvocateSystem:
     def __init__(self, groq_client: groq.Groq):
@@ -17,14 +42,17 @@ class DevilsAdvocateSystem:
             Reviewer(name="Reviewer C", bias_level="unbiased", specialization="general")
         ]
 
-    def _get_reviewer_prompt(self, reviewer: Reviewer, opportunity: str, application: str) -> str:
-        template = BIASED_REVIEWER_TEMPLATE if reviewer.bias_level == "biased" else UNBIASED_REVIEWER_TEMPLATE
-        return template.format(name=reviewer.name, opportunity=opportunity, application=application)
+    def _get_reviewer_prompt(self, reviewer: Reviewer, opportunity: str, application: str) -> Tuple[str, str]:
+        # The documents form the system message shared by every reviewer; only the persona differs
+        layout = REVIEWER_LAYOUTS["biased" if reviewer.bias_level == "biased" else "unbiased"]
+        return layout.render(name=reviewer.name, opportunity=opportunity, application=application)
 
+    @traced("reviewer.parse")
     async def _parse_reviewer_response(self, response_text: str, reviewer_type: BiasLevel=None):
         response_format = { "type": "json_object" }
-        formatted_prompt = REVIEWER_FEEDBACK_OUTPUT_PROMPT_TEMPLATE.format(review_text=response_text)
-        response = self.client(formatted_prompt, "", response_format=response_format).choices[0].message.content
+        formatted_prompt = REVIEWER_FEEDBACK_OUTPUT.render(review_text=response_text)
+        response = await asyncio.to_thread(self.client, formatted_prompt, "", route="parse", response_format=response_format)
+        response = response.choices[0].message.content
         # Parse the JSON response into your Pydantic model
         try:
             response = ReviewerFeedback.model_validate_json(response)
@@ -32,24 +60,45 @@ class DevilsAdvocateSystem:
         except Exception as e:
             raise ValueError(f"Failed to parse reviewer response: {e}")
 
+    @traced("reviewer.feedback")
     async def _get_reviewer_feedback(self, reviewer: Reviewer, opportunity:str, application: str) -> ReviewerFeedback:
-        prompt = self._get_reviewer_prompt(reviewer, opportunity, application)
-        response = self.client(prompt, "").choices[0].message.content
+        set_attributes(reviewer=reviewer.name, bias_level=reviewer.bias_level)
+        sys_prompt, message = self._get_reviewer_prompt(reviewer, opportunity, application)
+        response = await asyncio.to_thread(self.client, sys_prompt, message, route="review")
+        response = response.choices[0].message.content
 
         # Parse LLM response into structured feedback
         parsed_feedback = await self._parse_reviewer_response(response, reviewer_type=reviewer.bias_level)
 
-        return ReviewerFeedback(
-            reviewer=reviewer,
-            review_scores=parsed_feedback.review_scores,
-            strengths=parsed_feedback.strengths,
-            weaknesses=parsed_feedback.weaknesses,
-            areas_of_concern=parsed_feedback.areas_of_concern,
-            areas_of_potential=parsed_feedback.areas_of_potential,
-            recommendation=parsed_feedback.recommendation,
-            justification=parsed_feedback.justification,
-            timestamp=datetime.now()
+        # Already validated, copying avoids validating every nested score again
+        return parsed_feedback.model_copy(update={"reviewer": reviewer, "timestamp": datetime.now()})
+
+    def _is_affected(self, reviewer: Reviewer, kinds: set) -> bool:
+        relevant = REVIEWER_SECTIONS.get(reviewer.specialization)
+        return relevant is None or bool(kinds & relevant)
+
+    @traced("reviewer.update")
+    async def _update_reviewer_feedback(self, reviewer: Reviewer, previous: ReviewerFeedback, changes: str,
+                                        opportunity: str, application: str) -> ReviewerFeedback:
+        set_attributes(reviewer=reviewer.name, bias_level=reviewer.bias_level)
+        layout = REVIEWER_LAYOUTS["biased" if reviewer.bias_level == "biased" else "unbiased"]
+        sys_prompt, message = REVIEWER_UPDATE_LAYOUT.render(
+            brief=layout.instructions.render(name=reviewer.name),
+            feedback=previous.model_dump_json(exclude={"reviewer", "timestamp"}),
+            changes=changes,
         )
+        response_format = { "type": "json_object" }
+        response = await asyncio.to_thread(
+            self.client, sys_prompt, message, route="review", response_format=response_format
+        )
+        response = response.choices[0].message.content
+        try:
+            parsed_feedback = ReviewerFeedback.model_validate_json(response)
+        except Exception as e:
+            # Fall back to a full review rather than keeping stale feedback
+            logger.warning(f"Could not parse updated feedback from {reviewer.name}, reviewing again: {e}")
+            return await self._get_reviewer_feedback(reviewer, opportunity, application)
+        return parsed_feedback.model_copy(update={"reviewer": reviewer, "timestamp": datetime.now()})
 
 class ProfileEvaluationSystem(DevilsAdvocateSystem):
     def __init__(self, groq_client: groq.Groq, application_id=str(uuid.uuid4())):
@@ -63,14 +112,25 @@ class ProfileEvaluationSystem(DevilsAdvocateSystem):
     def _initialize_bias_detector(self):
         return BiasDetector(self.client)
 
+    @traced("evaluation.evaluate_application")
     async def evaluate_application(self, opportunity, application: str) -> EvaluationResult:
-        # Collect reviews from all reviewers
-        reviews = []
-        for reviewer in self.reviewers:
-            # prompt = self._get_reviewer_prompt(reviewer, application)
-            # response = self.client(prompt, "")
-            feedback = await self._get_reviewer_feedback(reviewer, opportunity, application)
-            reviews.append(feedback.model_dump())
+        set_attributes(application_id=self.application_id)
+        namespace, sketch = await self._evaluation_key(opportunity, application)
+        hit = await asyncio.to_thread(EVALUATIONS.get, application, namespace, sketch=sketch)
+        if hit is not None:
+            increment("semantic_cache_hits")
+            set_attributes(semantic_similarity=round(hit.similarity, 4))
+            return hit.value.model_copy(update={"application_id": self.application_id})
+
+        # The reviewers share the documents as their prompt prefix. Concurrent requests cannot
+        # read each other's prefix cache, so the first reviewer goes alone to populate it
+        first, *others = self.reviewers
+        feedbacks = [await self._get_reviewer_feedback(first, opportunity, application)]
+        feedbacks += await asyncio.gather(*[
+            self._get_reviewer_feedback(reviewer, opportunity, application) for reviewer in others
+        ])
+        # Dicts for the prompts; the result keeps the models, which are not validated again
+        reviews = REVIEWS.dump_python(feedbacks)
 
         overall_decision = await self._get_overall_decision(reviews)
 
@@ -80,14 +140,82 @@ class ProfileEvaluationSystem(DevilsAdvocateSystem):
         # Generate improvement suggestions
         # suggestions = self._generate_improvements(reviews, bias_analysis)
 
-        return EvaluationResult(
+        result = EvaluationResult(
             application_id=self.application_id,
-            reviews=reviews,
+            reviews=feedbacks,
             bias_analysis=bias_analysis,
             overall_decision=overall_decision,
             # improvements=suggestions,
             evaluation_timestamp=datetime.now(),
         )
+        await asyncio.to_thread(EVALUATIONS.put, application, result, namespace, sketch=sketch)
+        return result
+
+    async def _evaluation_key(self, opportunity: str, application: str):
+        """Namespace and sketch of `application` in EVALUATIONS: the tenant and the opportunity's cluster."""
+        cluster = await asyncio.to_thread(OPPORTUNITIES.cluster, opportunity)
+        sketch = await asyncio.to_thread(EVALUATIONS.sketch, application)
+        return f"{current_tenant()}:{cluster}", sketch
+
+    @traced("evaluation.reevaluate_application")
+    async def reevaluate_application(self, documents: DocumentSet, previous_documents: DocumentSet,
+                                     previous: EvaluationResult) -> EvaluationResult:
+        """Evaluate a revised upload starting from the evaluation of an earlier version.
+
+        Reviewers whose sections did not change keep their feedback, the others update
+        it from a diff of the changed sections. Falls back to `evaluate_application`
+        when the opportunity changed or most of the application was rewritten."""
+        set_attributes(application_id=self.application_id, incremental=True)
+        opportunity = documents.text("opportunity", exclude=PROMPT_EXCLUDED_SECTIONS)
+        application = documents.text("application")
+        changes = diff_sections(previous_documents.sections("application"), documents.sections("application"))
+        fraction = changed_fraction(changes, application)
+        set_attributes(changed_sections=len(changes), changed_fraction=round(fraction, 3))
+        opportunity_changes = diff_sections(
+            previous_documents.sections("opportunity"), documents.sections("opportunity")
+        )
+        if opportunity_changes or fraction > INCREMENTAL_MAX_CHANGE:
+            return await self.evaluate_application(opportunity, application)
+
+        if not changes:
+            increment("incremental_reviews_reused", len(previous.reviews))
+            return previous.model_copy(update={
+                "application_id": self.application_id, "evaluation_timestamp": datetime.now(),
+            })
+
+        kinds = {change.kind for change in changes}
+        rendered = render_changes(changes)
+        previous_reviews = {feedback.reviewer.name: feedback for feedback in previous.reviews if feedback.reviewer}
+
+        async def review(reviewer: Reviewer) -> ReviewerFeedback:
+            feedback = previous_reviews.get(reviewer.name)
+            if feedback is None:
+                return await self._get_reviewer_feedback(reviewer, opportunity, application)
+            if not self._is_affected(reviewer, kinds):
+                increment("incremental_reviews_reused")
+                return feedback
+            return await self._update_reviewer_feedback(reviewer, feedback, rendered, opportunity, application)
+
+        # Updates share no document prefix (each carries its own brief, feedback and diff), so they run together
+        feedbacks = await asyncio.gather(*[review(reviewer) for reviewer in self.reviewers])
+        # Dicts for the prompts; the result keeps the models, which are not validated again
+        reviews = REVIEWS.dump_python(feedbacks)
+
+        overall_decision = await self._get_overall_decision(reviews)
+        bias_analysis = await self.bias_detector.update_analysis(
+            previous.bias_analysis.analysis_summary, reviews, rendered
+        )
+
+        result = EvaluationResult(
+            application_id=self.application_id,
+            reviews=feedbacks,
+            bias_analysis=bias_analysis,
+            overall_decision=overall_decision,
+            evaluation_timestamp=datetime.now(),
+        )
+        namespace, sketch = await self._evaluation_key(opportunity, application)
+        await asyncio.to_thread(EVALUATIONS.put, application, result, namespace, sketch=sketch)
+        return result
 
     async def _get_overall_decision(self, reviews: List[ReviewerFeedback]):
         decision_count = Counter([item["recommendation"] for item in reviews])
@@ -105,15 +233,29 @@ class BiasDetector:
     def __init__(self, groq_client):
         self.client = groq_client
     
+    @traced("bias.analyze_reviews")
     async def analyze_reviews(self, reviews: List[Dict], opportunity: str, application: str) -> Dict:
 
-        prompt = BIAS_DETECTOR_TEMPLATE.format(reviews=reviews, opportunity=opportunity, application=application)
-        response = self.client(prompt, "").choices[0].message.content
+        sys_prompt, message = BIAS_DETECTOR_LAYOUT.render(reviews=reviews, opportunity=opportunity, application=application)
+        response = await asyncio.to_thread(self.client, sys_prompt, message, route="bias")
+        response = response.choices[0].message.content
         
         return {
             "analysis_summary": response,
             "bias_score": self._calculate_bias_score(reviews)
         }
+
+    @traced("bias.update_analysis")
+    async def update_analysis(self, analysis: str, reviews: List[Dict], changes: str) -> Dict:
+        # Only the previous analysis, the current reviews and the diff, not the documents
+        sys_prompt = BIAS_UPDATE.render(analysis=analysis, reviews=reviews, changes=changes)
+        response = await asyncio.to_thread(self.client, sys_prompt, "", route="bias")
+        response = response.choices[0].message.content
+
+        return {
+            "analysis_summary": response,
+            "bias_score": self._calculate_bias_score(reviews)
+        }
     
     def _calculate_bias_score(self, reviews: List[Dict]) -> float:
         # Implement bias scoring logic
@@ -129,13 +271,17 @@ class ProfileHelper:
         self.client = groq_client
         self.application_id = application_id
 
+    @traced("helper.generate_improvements")
     async def _generate_improvements(self, opportunity, application, reviews: List[Dict] , bias_analysis: Dict):
         # Improvement suggestion generation based on reviews and bias analysis
-        prompt = APPLICATION_ENHANCEMENT_PROMPT_TEMPLATE.format(
+        sys_prompt, message = APPLICATION_ENHANCEMENT_LAYOUT.render(
             opportunity=opportunity, application=application, reviews=reviews, bias_analysis=bias_analysis
         )
         response_format = { "type": "json_object" }
-        response = self.client(prompt, "", response_format=response_format).choices[0].message.content
+        response = await asyncio.to_thread(
+            self.client, sys_prompt, message, route="improve", response_format=response_format
+        )
+        response = response.choices[0].message.content
 
         try:
             json_response = json.loads(response)
@@ -149,11 +295,17 @@ class ProfileHelper:
         except Exception as e:
             raise ValueError(f"Failed to parse reviewer response: {e}")
 
+    @traced("helper.generate_improvements_independent")
     async def _generate_improvements_independent(self, opportunity, application):
         # Improvement suggestion generation based on reviews and bias analysis
-        prompt = APPLICATION_ENHANCEMENT_PROMPT_TEMPLATE_INDEPENDENT.format(opportunity=opportunity, application=application)
+        sys_prompt, message = APPLICATION_ENHANCEMENT_INDEPENDENT_LAYOUT.render(
+            opportunity=opportunity, application=application
+        )
         response_format = { "type": "json_object" }
-        response = self.client(prompt, "", response_format=response_format).choices[0].message.content
+        response = await asyncio.to_thread(
+            self.client, sys_prompt, message, route="improve", response_format=response_format
+        )
+        response = response.choices[0].message.content
 
         try:
             json_response = json.loads(response)
@@ -230,7 +382,7 @@ def export_results(evaluation_result: EvaluationResult,
     return result
 
 async def main():
-    groq_client = init_groq
+    groq_client = chat
 
     # devils_advocate = DevilsAdvocateSystem(groq_client)
     profile_evaluator = ProfileEvaluationSystem(groq_client)
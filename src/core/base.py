@@ -2,7 +2,7 @@ import uuid, json
 from enum import Enum
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Dict, List, Union, Optional
+from typing import Dict, List, Tuple, Union, Optional
 
 # Enums for standardization
 class BiasLevel(str, Enum):
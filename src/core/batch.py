@@ -0,0 +1,127 @@
+"""Evaluate many applications against a single opportunity.
+
+The opportunity is cleaned and trimmed to its token budget once per batch,
+leaving out the PROMPT_EXCLUDED_SECTIONS reviewers do not need, and the
+applications are not classified at all, since the caller already says which
+document is which. Candidates are evaluated concurrently, bounded by a
+process-wide semaphore, at BACKGROUND priority and under one scheduler queue
+per batch, so a large batch is limited by the provider rate limits rather than
+by HTTP round-trips and cannot starve interactive users. Usage and quotas are
+still charged per candidate.
+
+    engine = BatchEvaluator(chat)
+    async for candidate in engine.evaluate(opportunity, [("cv-1.pdf", text), ...]):
+        ...
+    ranking = rank_candidates(results)
+"""
+import uuid, asyncio, logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from core.agents import ProfileEvaluationSystem
+from utils.helpers import clean_page_content
+from utils.sections import DocumentSet, PROMPT_EXCLUDED_SECTIONS
+from utils.scheduler import BACKGROUND, application_id_var, queue_key_var, priority_var
+from utils.tracing import traced, set_attributes
+from configs import BATCH_CONCURRENCY, BATCH_OPPORTUNITY_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Shared by every batch in the process
+BATCH_SLOTS = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+DECISION_ORDER = {"accept": 0, "pending": 1, "reject": 2}
+
+
+class CandidateResult(BaseModel):
+    candidate_id: str
+    index: int
+    name: str
+    decision: Optional[str] = None
+    score: Optional[float] = None
+    accept_votes: int = 0
+    evaluation: Optional[Dict] = None
+    error: Optional[str] = None
+    rank: Optional[int] = None
+
+
+def average_score(evaluation: Dict) -> Optional[float]:
+    scores = [
+        item["score"]
+        for review in evaluation["reviews"]
+        for item in review["review_scores"]
+        if item.get("score") is not None
+    ]
+    return round(sum(scores) / len(scores), 3) if scores else None
+
+
+def rank_candidates(results: List[CandidateResult]) -> List[CandidateResult]:
+    """Order by overall decision, then accept votes, then mean review score.
+    Failed candidates go last and are not ranked."""
+    evaluated = [result for result in results if result.error is None]
+    evaluated.sort(key=lambda result: (
+        DECISION_ORDER.get(result.decision, len(DECISION_ORDER)),
+        -result.accept_votes,
+        -(result.score if result.score is not None else float("-inf")),
+    ))
+    for rank, result in enumerate(evaluated, start=1):
+        result.rank = rank
+    return evaluated + [result for result in results if result.error is not None]
+
+
+class BatchEvaluator:
+    def __init__(self, client, batch_id: str = None, slots: asyncio.Semaphore = BATCH_SLOTS):
+        self.client = client
+        self.batch_id = batch_id or str(uuid.uuid4())
+        self.slots = slots
+
+    @traced("batch.prepare_opportunity")
+    async def prepare_opportunity(self, opportunity: str) -> str:
+        # Spend the token budget on the sections reviewers use
+        opportunity = DocumentSet.build([("opportunity", "", opportunity)]).text(
+            "opportunity", exclude=PROMPT_EXCLUDED_SECTIONS
+        )
+        return await asyncio.to_thread(clean_page_content, opportunity, BATCH_OPPORTUNITY_TOKENS)
+
+    @traced("batch.evaluate_candidate")
+    async def _evaluate_candidate(self, candidate_id: str, index: int, name: str, opportunity: str,
+                                  application: str) -> CandidateResult:
+        set_attributes(batch_id=self.batch_id, candidate_id=candidate_id)
+        async with self.slots:
+            # Usage and quotas are per candidate; fair queuing is per batch, below interactive traffic
+            application_id_var.set(candidate_id)
+            queue_key_var.set(self.batch_id)
+            priority_var.set(BACKGROUND)
+            try:
+                evaluator = ProfileEvaluationSystem(self.client, application_id=candidate_id)
+                result = await evaluator.evaluate_application(opportunity, application)
+            except Exception as e:
+                logger.warning(f"Batch {self.batch_id}: evaluating {name} failed: {e}")
+                return CandidateResult(candidate_id=candidate_id, index=index, name=name, error=str(e))
+
+        evaluation = result.model_dump(mode="json")
+        return CandidateResult(
+            candidate_id=candidate_id,
+            index=index,
+            name=name,
+            decision=evaluation["overall_decision"],
+            score=average_score(evaluation),
+            accept_votes=sum(review["recommendation"] == "accept" for review in evaluation["reviews"]),
+            evaluation=evaluation,
+        )
+
+    async def evaluate(self, opportunity: str, applications: List[Tuple[str, str]],
+                       prepared: bool = False) -> AsyncIterator[CandidateResult]:
+        """Yield a `CandidateResult` per `(name, text)` application as each one finishes."""
+        if not prepared:
+            opportunity = await self.prepare_opportunity(opportunity)
+
+        tasks = [
+            asyncio.create_task(self._evaluate_candidate(str(uuid.uuid4()), idx, name, opportunity, application))
+            for idx, (name, application) in enumerate(applications)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,236 @@
+"""Compact in-memory form of stored evaluation and improvement results.
+
+A `model_dump()` of an `EvaluationResult` holds a dict per review, per score
+and per reviewer, an enum per decision and a datetime per timestamp. The
+compact records keep the same data in a few flat fields instead:
+
+    - enum values as one byte each, indexes into the enum's members
+    - scores and timestamps in `array`s of doubles and microseconds
+    - categories, impact areas and reviewer names interned, and one shared
+      `(name, bias_level, specialization)` tuple per distinct reviewer
+    - the strings of every review in one tuple, with counts to split it back
+
+Records are materialized only when an endpoint needs them: `dump()` returns
+the exact `model_dump()` of the original and `model()` validates it back into
+the Pydantic model.
+
+    state.evaluations[application_id] = CompactEvaluation.pack(result)
+    reviews = state.evaluations[application_id].dump()["reviews"]
+
+Timestamps are naive local times, as `datetime.now()` produces them; aware
+ones are stored converted to local time. A confidence or bias score of NaN reads back as None.
+"""
+import sys, math
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple, Union
+
+from core.base import (
+    DecisionStatus, PriorityLevel, EvaluationResult, ImprovementSuggestions,
+)
+
+DECISIONS = tuple(DecisionStatus)
+PRIORITIES = tuple(PriorityLevel)
+# str enums hash and compare like their values, so both "accept" and DecisionStatus.ACCEPT find their code
+DECISION_CODES = {member: code for code, member in enumerate(DECISIONS)}
+PRIORITY_CODES = {member: code for code, member in enumerate(PRIORITIES)}
+IMPROVEMENT_GROUPS = (
+    "technical_improvements",
+    "language_improvements",
+    "experience_improvements",
+    "presentation_improvements",
+    "bias_mitigation_improvements",
+)
+# Free-text lists of a review, in model field order
+REVIEW_LISTS = ("strengths", "weaknesses", "areas_of_concern", "areas_of_potential")
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_NONE = float("nan")
+
+# One tuple per distinct reviewer, shared by every stored evaluation
+_REVIEWERS: Dict[Tuple[str, str, str], Tuple[str, str, str]] = {}
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if type(value) is str else value
+
+
+def _reviewer(reviewer: Optional[Dict]) -> Optional[Tuple[str, str, str]]:
+    if reviewer is None:
+        return None
+    key = (reviewer["name"], reviewer["bias_level"], reviewer["specialization"])
+    return _REVIEWERS.setdefault(key, tuple(map(_intern, key)))
+
+
+def _pack_time(value: Union[datetime, str]) -> int:
+    if isinstance(value, str):
+        # From a model_dump(mode="json"), as batch results hold
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _unpack_time(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _pack_number(value: Optional[float]) -> float:
+    return _NONE if value is None else value
+
+
+def _unpack_number(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+class CompactImprovements:
+    """An `ImprovementSuggestions`, one entry per improvement across the five groups."""
+    __slots__ = ("group_counts", "codes", "labels", "texts", "summary")
+
+    @classmethod
+    def pack(cls, suggestions: Union[ImprovementSuggestions, Dict]) -> "CompactImprovements":
+        data = suggestions if isinstance(suggestions, dict) else suggestions.model_dump()
+        record = cls()
+        record.group_counts = array("H")
+        # priority, implementation_difficulty per improvement
+        codes, labels, texts = bytearray(), [], []
+        for group in IMPROVEMENT_GROUPS:
+            items = data[group]
+            record.group_counts.append(len(items))
+            for item in items:
+                codes += bytes((PRIORITY_CODES[item["priority"]], PRIORITY_CODES[item["implementation_difficulty"]]))
+                labels += (_intern(item["category"]), _intern(item["impact_area"]))
+                texts += (item["issue"], item["suggestion"], item["example"])
+        record.codes = bytes(codes)
+        record.labels = tuple(labels)
+        record.texts = tuple(texts)
+        # (priority, count) pairs, in the original key order
+        record.summary = array("I")
+        for priority, count in data["priority_summary"].items():
+            record.summary.extend((PRIORITY_CODES[priority], count))
+        return record
+
+    def dump(self) -> Dict:
+        data, index = {}, 0
+        for group, count in zip(IMPROVEMENT_GROUPS, self.group_counts):
+            items = []
+            for i in range(index, index + count):
+                items.append({
+                    "category": self.labels[2 * i],
+                    "priority": PRIORITIES[self.codes[2 * i]],
+                    "issue": self.texts[3 * i],
+                    "suggestion": self.texts[3 * i + 1],
+                    "example": self.texts[3 * i + 2],
+                    "impact_area": self.labels[2 * i + 1],
+                    "implementation_difficulty": PRIORITIES[self.codes[2 * i + 1]],
+                })
+            data[group] = items
+            index += count
+        summary = self.summary
+        data["priority_summary"] = {PRIORITIES[code]: count for code, count in zip(summary[::2], summary[1::2])}
+        return data
+
+    def model(self) -> ImprovementSuggestions:
+        return ImprovementSuggestions.model_validate(self.dump())
+
+
+class CompactEvaluation:
+    """An `EvaluationResult`. Per review: a shared reviewer tuple, its scores, the
+    four free-text lists and the justification; then the bias analysis."""
+    __slots__ = (
+        "application_id", "reviewers", "codes", "scores", "score_labels", "list_counts", "texts",
+        "times", "numbers", "improvements",
+    )
+
+    @classmethod
+    def pack(cls, result: Union[EvaluationResult, Dict]) -> "CompactEvaluation":
+        """From a result or its `model_dump()`, in python or json mode."""
+        data = result if isinstance(result, dict) else result.model_dump()
+        record = cls()
+        record.application_id = data["application_id"]
+        reviews = data["reviews"]
+        record.reviewers = tuple(_reviewer(review["reviewer"]) for review in reviews)
+        # recommendation per review, then the overall decision
+        record.codes = bytes(
+            [DECISION_CODES[review["recommendation"]] for review in reviews]
+            + [DECISION_CODES[data["overall_decision"]]]
+        )
+        record.scores, record.list_counts, record.times = array("d"), array("H"), array("q")
+        # list_counts: the four list lengths of every review, then the score count of every review
+        score_labels, texts, score_counts = [], [], []
+        for review in reviews:
+            scores = review["review_scores"]
+            score_counts.append(len(scores))
+            for score in scores:
+                record.scores.append(score["score"])
+                score_labels += (_intern(score["category"]), score["comments"])
+            for name in REVIEW_LISTS:
+                record.list_counts.append(len(review[name]))
+                texts += review[name]
+            texts.append(review["justification"])
+            record.times.append(_pack_time(review["timestamp"]))
+        record.list_counts.extend(score_counts)
+        record.score_labels = tuple(score_labels)
+
+        bias = data["bias_analysis"]
+        texts.append(bias["analysis_summary"])
+        record.texts = tuple(texts)
+        record.times.extend((_pack_time(bias["timestamp"]), _pack_time(data["evaluation_timestamp"])))
+        record.numbers = array("d", (_pack_number(data["confidence_score"]), _pack_number(bias["bias_score"])))
+        record.improvements = (
+            CompactImprovements.pack(data["improvements"]) if data["improvements"] is not None else None
+        )
+        return record
+
+    def dump(self) -> Dict:
+        reviews, count = [], len(self.reviewers)
+        lists_per_review = len(REVIEW_LISTS)
+        score_index = text_index = 0
+        for i, reviewer in enumerate(self.reviewers):
+            scores = []
+            for j in range(score_index, score_index + self.list_counts[lists_per_review * count + i]):
+                scores.append({
+                    "category": self.score_labels[2 * j],
+                    "score": self.scores[j],
+                    "comments": self.score_labels[2 * j + 1],
+                })
+                score_index += 1
+            review = {
+                "reviewer": None if reviewer is None else {
+                    "name": reviewer[0], "bias_level": reviewer[1], "specialization": reviewer[2],
+                },
+                "review_scores": scores,
+            }
+            for k, name in enumerate(REVIEW_LISTS):
+                size = self.list_counts[lists_per_review * i + k]
+                review[name] = list(self.texts[text_index:text_index + size])
+                text_index += size
+            review["recommendation"] = DECISIONS[self.codes[i]]
+            review["justification"] = self.texts[text_index]
+            review["timestamp"] = _unpack_time(self.times[i])
+            text_index += 1
+            reviews.append(review)
+
+        return {
+            "application_id": self.application_id,
+            "reviews": reviews,
+            "bias_analysis": {
+                "analysis_summary": self.texts[text_index],
+                "bias_score": _unpack_number(self.numbers[1]),
+                "timestamp": _unpack_time(self.times[count]),
+            },
+            "overall_decision": DECISIONS[self.codes[count]],
+            "confidence_score": _unpack_number(self.numbers[0]),
+            "improvements": None if self.improvements is None else self.improvements.dump(),
+            "evaluation_timestamp": _unpack_time(self.times[count + 1]),
+        }
+
+    def model(self) -> EvaluationResult:
+        # confidence_score and improvements default to None but do not accept it as a value
+        data = {key: value for key, value in self.dump().items() if value is not None}
+        return EvaluationResult.model_validate(data)
+
+    @property
+    def evaluation_timestamp(self) -> datetime:
+        return _unpack_time(self.times[-1])
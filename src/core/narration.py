@@ -0,0 +1,167 @@
+"""Templated markdown narration of evaluation and improvement results.
+
+`structured_output_chat` turns a result back into prose with one more LLM
+generation after the evaluation itself is done. The narrators here render the
+same result locally, so the SSE endpoints start streaming the moment the
+result exists:
+
+    for line in narrate_evaluation(evaluation_result):
+        yield line
+
+Each piece yielded is one markdown line ending in a newline. For
+OTHER_LANGUAGES, a line is the unit translated. Fixed strings (headings,
+labels, decisions and priorities) are in `HEADINGS` and `LABELS`, separate
+from the free text of the result, and `glossary()` lists them for the
+translation memory. The LLM-written narrative is still
+available: with LLM_NARRATION=append it streams after the templated text.
+"""
+from itertools import combinations
+from typing import Iterator, List
+
+from core.base import (
+    EvaluationResult, ImprovementSuggestions, ReviewerFeedback, Improvement, DecisionStatus, PriorityLevel,
+)
+from core.compact import IMPROVEMENT_GROUPS, REVIEW_LISTS
+
+HEADINGS = {
+    "evaluation": "## Evaluation summary",
+    "bias": "### Bias analysis",
+    "improvements": "## Profile improvements",
+    "technical_improvements": "### Technical improvements",
+    "language_improvements": "### Language improvements",
+    "experience_improvements": "### Experience improvements",
+    "presentation_improvements": "### Presentation improvements",
+    "bias_mitigation_improvements": "### Bias mitigation improvements",
+    "narrative": "## Detailed narrative",
+}
+
+LABELS = {
+    "strengths": "Strengths",
+    "weaknesses": "Weaknesses",
+    "areas_of_concern": "Areas of concern",
+    "areas_of_potential": "Areas of potential",
+    "justification": "Justification",
+    "example": "Example",
+    "impact_area": "Impact area",
+    "biased": "devil's advocate",
+    "unbiased": "impartial reviewer",
+}
+
+RECOMMENDATION = "Recommendation: {decision}"
+CONFIDENCE = "Confidence: {confidence:.2f}"
+BIAS_SCORE = "Bias score: {score:.2f}"
+REVIEWER = "### {name} ({specialization}, {role})"
+AVERAGE_SCORE = "Average score: {average:.1f}/10"
+SCORE = "- {category}: {score:g}/10"
+IMPROVEMENT = "{index}. **{issue}** ({details})"
+IMPROVEMENT_DETAILS = "{priority} priority, {difficulty} effort"
+PRIORITY_SUMMARY = "{count} {priority} priority"
+# The categories REVIEWER_FEEDBACK_OUTPUT_PROMPT_TEMPLATE asks the reviewers to score
+SCORE_CATEGORIES = ("initial_impression", "technical_assessment", "experience_evaluation")
+
+# Highest priority first within each group
+_PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+def glossary() -> List[str]:
+    """The fixed strings of the narration, as a translation memory segments its lines."""
+    priorities = [member.value for member in PriorityLevel]
+    texts = [heading.lstrip("# ") for heading in HEADINGS.values()]
+    texts += LABELS.values()
+    texts += [RECOMMENDATION.format(decision=member.value) for member in DecisionStatus]
+    texts += [CONFIDENCE.format(confidence=0), BIAS_SCORE.format(score=0), AVERAGE_SCORE.format(average=0)]
+    texts += [SCORE.format(category=label(category), score=0)[2:] for category in SCORE_CATEGORIES]
+    texts += [
+        IMPROVEMENT_DETAILS.format(priority=priority, difficulty=difficulty)
+        for priority in priorities for difficulty in priorities
+    ]
+    # Every priority summary, e.g. "1 high priority, 2 low priority"
+    texts += [
+        ", ".join(PRIORITY_SUMMARY.format(count=0, priority=priority) for priority in subset)
+        for size in range(1, len(priorities) + 1) for subset in combinations(priorities, size)
+    ]
+    return texts
+
+
+def label(name: str) -> str:
+    """`initial_impression` -> `Initial impression`."""
+    return name.replace("_", " ").strip().capitalize()
+
+
+def _line(text: str = "") -> str:
+    return f"{text}\n"
+
+
+def _bullets(title: str, items) -> Iterator[str]:
+    if items:
+        yield _line(f"**{title}**")
+        for item in items:
+            yield _line(f"- {item}")
+        yield _line()
+
+
+def _review(review: ReviewerFeedback) -> Iterator[str]:
+    reviewer = review.reviewer
+    if reviewer is not None:
+        yield _line(REVIEWER.format(
+            name=reviewer.name, specialization=reviewer.specialization,
+            role=LABELS.get(reviewer.bias_level, reviewer.bias_level),
+        ))
+    yield _line(RECOMMENDATION.format(decision=review.recommendation.value))
+    if review.review_scores:
+        average = sum(score.score for score in review.review_scores) / len(review.review_scores)
+        yield _line(AVERAGE_SCORE.format(average=average))
+        for score in review.review_scores:
+            line = SCORE.format(category=label(score.category), score=score.score)
+            yield _line(f"{line} — {score.comments}" if score.comments else line)
+    yield _line()
+    for name in REVIEW_LISTS:
+        yield from _bullets(LABELS[name], getattr(review, name))
+    yield _line(f"*{LABELS['justification']}:* {review.justification}")
+    yield _line()
+
+
+def narrate_evaluation(result: EvaluationResult) -> Iterator[str]:
+    yield _line(HEADINGS["evaluation"])
+    yield _line(f"**{RECOMMENDATION.format(decision=result.overall_decision.value)}**")
+    if result.confidence_score is not None:
+        yield _line(CONFIDENCE.format(confidence=result.confidence_score))
+    yield _line()
+    yield _line(HEADINGS["bias"])
+    if result.bias_analysis.bias_score is not None:
+        yield _line(BIAS_SCORE.format(score=result.bias_analysis.bias_score))
+    yield _line(result.bias_analysis.analysis_summary)
+    yield _line()
+    for review in result.reviews:
+        yield from _review(review)
+    if result.improvements is not None:
+        yield from narrate_improvements(result.improvements)
+
+
+def _improvement(index: int, improvement: Improvement) -> Iterator[str]:
+    details = IMPROVEMENT_DETAILS.format(
+        priority=improvement.priority.value, difficulty=improvement.implementation_difficulty.value,
+    )
+    yield _line(IMPROVEMENT.format(index=index, issue=improvement.issue, details=details))
+    yield _line(f"   {improvement.suggestion}")
+    if improvement.example:
+        yield _line(f"   *{LABELS['example']}:* {improvement.example}")
+    yield _line(f"   *{LABELS['impact_area']}:* {improvement.impact_area}")
+
+
+def narrate_improvements(suggestions: ImprovementSuggestions) -> Iterator[str]:
+    yield _line(HEADINGS["improvements"])
+    summary = sorted(suggestions.priority_summary.items(), key=lambda item: _PRIORITY_ORDER[item[0].value])
+    if summary:
+        yield _line(", ".join(
+            PRIORITY_SUMMARY.format(count=count, priority=priority.value) for priority, count in summary
+        ))
+    yield _line()
+    for group in IMPROVEMENT_GROUPS:
+        improvements = sorted(getattr(suggestions, group), key=lambda item: _PRIORITY_ORDER[item.priority.value])
+        if not improvements:
+            continue
+        yield _line(HEADINGS[group])
+        for index, improvement in enumerate(improvements, 1):
+            yield from _improvement(index, improvement)
+        yield _line()
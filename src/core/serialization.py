@@ -0,0 +1,60 @@
+"""Serialization of evaluation results for the wire and for storage.
+
+A result is built once and serialized at most once per form: `Serialized`
+keeps the compact JSON bytes sent to the client and the narration prompt, and
+derives the python dict only if something asks for it. The JSON is not
+pretty-printed; indentation only cost bytes on the wire and prompt tokens.
+
+    exported = serialize(evaluation_result)
+    yield SSEEvent(exported.text(), event="evaluation")
+    narration = structured_output_chat(exported.text())
+
+The `TypeAdapter`s are built once at import. `REVIEWS` validates and dumps a
+whole list of feedback in one call instead of one model at a time.
+"""
+from typing import Any, Dict, List, Optional
+from pydantic import TypeAdapter
+
+from core.base import ReviewerFeedback, BiasAnalysis, EvaluationResult, ImprovementSuggestions
+
+REVIEWS = TypeAdapter(List[ReviewerFeedback])
+BIAS_ANALYSIS = TypeAdapter(BiasAnalysis)
+EVALUATION = TypeAdapter(EvaluationResult)
+IMPROVEMENTS = TypeAdapter(ImprovementSuggestions)
+
+ADAPTERS = {
+    EvaluationResult: EVALUATION,
+    ImprovementSuggestions: IMPROVEMENTS,
+    BiasAnalysis: BIAS_ANALYSIS,
+}
+
+
+class Serialized:
+    __slots__ = ("value", "adapter", "_json", "_dict")
+
+    def __init__(self, value: Any, adapter: TypeAdapter):
+        self.value = value
+        self.adapter = adapter
+        self._json: Optional[bytes] = None
+        self._dict: Optional[Dict] = None
+
+    def json(self) -> bytes:
+        if self._json is None:
+            self._json = self.adapter.dump_json(self.value)
+        return self._json
+
+    def text(self) -> str:
+        return self.json().decode()
+
+    def dict(self) -> Dict:
+        """Same as the model's `model_dump()`."""
+        if self._dict is None:
+            self._dict = self.adapter.dump_python(self.value)
+        return self._dict
+
+
+def serialize(value: Any) -> Serialized:
+    adapter = ADAPTERS.get(type(value))
+    if adapter is None:
+        raise TypeError(f"No serializer for {type(value).__name__}")
+    return Serialized(value, adapter)
@@ -0,0 +1,402 @@
+"""Production launcher: N API workers behind an application_id affinity proxy.
+
+    python launcher.py --workers 4 --port 8000
+
+Starts `--workers` uvicorn processes (one per core by default) on local ports
+and a small asyncio proxy on `--port` in front of them. The workers share
+uploads, evaluations, exact LLM cache entries and usage totals through SQLite
+files (STATE_DB_PATH, USAGE_DB_PATH), so any worker can serve any request.
+Quotas are checked against the usage of all workers, which each worker
+re-reads every USAGE_FLUSH_INTERVAL seconds.
+
+The proxy still sends every request that names an `application_id`
+(X-Application-Id header, query parameter, or form field within the first
+AFFINITY_PEEK_BYTES of a form body) to the same worker. That worker holds the
+in-flight evaluation a reconnecting client joins, the near-duplicate caches and
+the single-flight calls for that application. Requests without one, like
+uploads, are spread round-robin. Request and response bodies stream through
+without being held in memory, chunked ones included, and client connections
+are kept alive between requests.
+
+The client-side provider rate limits (LLM_RATE_LIMITS) are for the whole
+deployment and are split evenly between the workers.
+
+On SIGTERM or SIGINT the proxy stops accepting connections and closes idle
+ones, and the workers get SIGTERM, so uvicorn finishes in-flight requests,
+including open SSE streams, for up to `--drain-timeout` seconds before the
+processes exit.
+Workers that die are restarted.
+"""
+import os, re, sys, json, time, zlib, signal, asyncio, logging, argparse, subprocess
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+from urllib.request import urlopen
+
+logger = logging.getLogger("launcher")
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+MAX_HEADER_BYTES = 64 * 1024
+# Seconds a client connection may sit between requests before the proxy closes it
+KEEPALIVE_TIMEOUT = 5.0
+# Form fields and query parameters that pin a request to a worker, in order of preference
+AFFINITY_FIELDS = ("application_id", "previous_application_id")
+# Form bodies are searched for those fields in their first bytes only; the rest streams through
+AFFINITY_PEEK_BYTES = 16 * 1024
+FORM_TYPES = (b"application/x-www-form-urlencoded", b"multipart/form-data")
+_MULTIPART_FIELD = re.compile(rb'name="(application_id|previous_application_id)"\r\n\r\n([^\r\n]*)\r\n')
+# Not forwarded: the proxy opens one upstream connection per request
+_HOP_BY_HOP = {b"connection", b"keep-alive", b"proxy-connection", b"te", b"trailer", b"upgrade"}
+
+
+def split_rate_limits(limits: str, workers: int) -> str:
+    """LLM_RATE_LIMITS for one of `workers` processes sharing the deployment's limits."""
+    return json.dumps({
+        provider: {name: value / workers for name, value in limit.items()}
+        for provider, limit in json.loads(limits).items()
+    })
+
+
+def parse_head(head: bytes) -> Tuple[bytes, Dict[bytes, bytes], List[Tuple[bytes, bytes]]]:
+    """Start line, lower-cased headers and raw header pairs of an HTTP message head."""
+    start_line, *lines = head[:-4].split(b"\r\n")
+    raw, headers = [], {}
+    for line in lines:
+        name, _, value = line.partition(b":")
+        raw.append((name, value.strip()))
+        headers[name.strip().lower()] = value.strip()
+    return start_line, headers, raw
+
+
+def affinity_key(target: str, headers: Dict[bytes, bytes]) -> Optional[str]:
+    header = headers.get(b"x-application-id")
+    if header:
+        return header.decode("latin-1")
+    query = parse_qs(urlsplit(target).query)
+    for field in AFFINITY_FIELDS:
+        if query.get(field):
+            return query[field][0]
+    return None
+
+
+def form_affinity_key(headers: Dict[bytes, bytes], prefix: bytes, complete: bool) -> Optional[str]:
+    """Affinity field of a form body from its first bytes; `complete` when that is the whole body."""
+    if headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+        found = dict(_MULTIPART_FIELD.findall(prefix))
+        for field in AFFINITY_FIELDS:
+            if found.get(field.encode()):
+                return found[field.encode()].decode("utf-8", "replace")
+    elif complete:
+        # A cut-off urlencoded body could end in the middle of a value
+        fields = parse_qs(prefix.decode("latin-1"))
+        for field in AFFINITY_FIELDS:
+            if fields.get(field):
+                return fields[field][0]
+    return None
+
+
+async def relay_exactly(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, length: int):
+    while length > 0:
+        chunk = await reader.read(min(length, 65536))
+        if not chunk:
+            raise asyncio.IncompleteReadError(b"", length)
+        writer.write(chunk)
+        await writer.drain()
+        length -= len(chunk)
+
+
+async def relay_chunked(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Copy a chunked body as it is, up to and including its trailers."""
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        writer.write(line)
+        size = int(line.split(b";")[0].strip() or b"0", 16)
+        if not size:
+            break
+        await relay_exactly(reader, writer, size + 2)
+    while (line := await reader.readuntil(b"\r\n")) != b"\r\n":
+        writer.write(line)
+    writer.write(line)
+    await writer.drain()
+
+
+class Worker:
+    def __init__(self, index: int, port: int, env: Dict[str, str], drain_timeout: float):
+        self.index = index
+        self.port = port
+        self.env = env
+        self.drain_timeout = drain_timeout
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app:app",
+                "--host", "127.0.0.1", "--port", str(self.port),
+                "--timeout-graceful-shutdown", str(int(self.drain_timeout)),
+                "--no-access-log",
+            ],
+            cwd=SRC, env={**self.env, "WORKER_INDEX": str(self.index)},
+        )
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def ready(self) -> bool:
+        try:
+            with urlopen(f"http://127.0.0.1:{self.port}/healthz", timeout=0.5) as response:
+                return response.status == 200
+        except OSError:
+            return False
+
+    def terminate(self):
+        if self.alive:
+            self.process.send_signal(signal.SIGTERM)
+
+
+class AffinityProxy:
+    def __init__(self, workers: List[Worker]):
+        self.workers = workers
+        self.active = 0
+        self.requests = 0
+        self.closing = False
+        self._round_robin = count()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._waiting = set()
+
+    def candidates(self, key: Optional[str]) -> List[Worker]:
+        """Workers to try in order: the key's own worker first, then the others."""
+        start = zlib.crc32(key.encode()) if key is not None else next(self._round_robin)
+        ordered = [self.workers[(start + i) % len(self.workers)] for i in range(len(self.workers))]
+        return [worker for worker in ordered if worker.alive]
+
+    async def _read_head(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[bytes]:
+        # Between requests a kept-alive connection counts as idle, so a drain does not wait on it
+        self._waiting.add(writer)
+        try:
+            return await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            return None
+        finally:
+            self._waiting.discard(writer)
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: str, detail: str):
+        payload = json.dumps({"detail": detail}).encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + payload
+        )
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while not self.closing:
+                head = await self._read_head(reader, writer)
+                if head is None:
+                    break
+                self.active += 1
+                self._idle.clear()
+                try:
+                    if not await self._forward(head, reader, writer):
+                        break
+                finally:
+                    self.active -= 1
+                    if not self.active:
+                        self._idle.set()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            # Includes malformed chunk sizes and status lines; the connection cannot be reused
+            pass
+        finally:
+            writer.close()
+
+    async def _forward(self, head: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """Send one request to a worker and its response back; whether the connection can be reused."""
+        request_line, headers, raw = parse_head(head)
+        method, target, version = (request_line.split(b" ") + [b"/", b"HTTP/1.0"])[:3]
+        chunked = b"chunked" in headers.get(b"transfer-encoding", b"").lower()
+        try:
+            length = 0 if chunked else int(headers.get(b"content-length", 0) or 0)
+        except ValueError:
+            await self._respond(writer, "400 Bad Request", "Invalid Content-Length")
+            return False
+        self.requests += 1
+        keep_alive = version == b"HTTP/1.1" and b"close" not in headers.get(b"connection", b"").lower()
+
+        target = target.decode("latin-1")
+        key, prefix = affinity_key(target, headers), b""
+        if key is None and length and headers.get(b"content-type", b"").startswith(FORM_TYPES):
+            if headers.get(b"expect", b"").lower() == b"100-continue":
+                # The client holds the body back until told to go on; the worker then never sees the Expect
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                raw = [(name, value) for name, value in raw if name.strip().lower() != b"expect"]
+            prefix = await reader.readexactly(min(length, AFFINITY_PEEK_BYTES))
+            key = form_affinity_key(headers, prefix, complete=len(prefix) == length)
+
+        upstream = None
+        for worker in self.candidates(key):
+            try:
+                upstream = await asyncio.open_connection("127.0.0.1", worker.port)
+                break
+            except OSError:
+                continue
+        else:
+            await self._respond(writer, "502 Bad Gateway", "No worker available")
+            return False
+
+        upstream_reader, upstream_writer = upstream
+        body = None
+        try:
+            peer = writer.get_extra_info("peername")
+            forwarded = [(name, value) for name, value in raw if name.strip().lower() not in _HOP_BY_HOP]
+            forwarded += [(b"Connection", b"close"), (b"X-Forwarded-For", str(peer[0] if peer else "").encode())]
+            upstream_writer.write(
+                request_line + b"\r\n" + b"".join(name + b": " + value + b"\r\n" for name, value in forwarded)
+                + b"\r\n" + prefix
+            )
+            # The body streams to the worker while its response streams back, so a worker may
+            # answer early (100 Continue, 413, 422) and no body is held in memory
+            body = asyncio.create_task(
+                relay_chunked(reader, upstream_writer) if chunked
+                else relay_exactly(reader, upstream_writer, length - len(prefix))
+            )
+            body.add_done_callback(lambda task: task.cancelled() or task.exception())
+            keep_alive &= await self._relay_response(upstream_reader, writer, method == b"HEAD", keep_alive)
+            try:
+                await body
+            except (ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                # The worker stopped reading; the rest of the request was never consumed
+                return False
+            return keep_alive and not self.closing
+        finally:
+            if body is not None and not body.done():
+                body.cancel()
+            upstream_writer.close()
+
+    @staticmethod
+    async def _relay_response(upstream: asyncio.StreamReader, writer: asyncio.StreamWriter, head_only: bool, keep_alive: bool) -> bool:
+        """Stream the worker's response to the client, SSE included; whether it ended on a known boundary."""
+        while True:
+            status_line, headers, raw = parse_head(await upstream.readuntil(b"\r\n\r\n"))
+            status = int(status_line.split(b" ")[1])
+            if 100 <= status < 200:
+                writer.write(status_line + b"\r\n" + b"".join(name + b": " + value + b"\r\n" for name, value in raw) + b"\r\n")
+                await writer.drain()
+                continue
+            break
+
+        chunked = b"chunked" in headers.get(b"transfer-encoding", b"").lower()
+        delimited = head_only or status in (204, 304) or chunked or b"content-length" in headers
+        keep_alive &= delimited
+        forwarded = [(name, value) for name, value in raw if name.strip().lower() not in _HOP_BY_HOP]
+        if not keep_alive:
+            forwarded.append((b"Connection", b"close"))
+        writer.write(status_line + b"\r\n" + b"".join(name + b": " + value + b"\r\n" for name, value in forwarded) + b"\r\n")
+        await writer.drain()
+
+        if head_only or status in (204, 304):
+            pass
+        elif chunked:
+            await relay_chunked(upstream, writer)
+        elif b"content-length" in headers:
+            await relay_exactly(upstream, writer, int(headers[b"content-length"]))
+        else:
+            # Ends when the worker closes, so the client connection has to close too
+            while chunk := await upstream.read(65536):
+                writer.write(chunk)
+                await writer.drain()
+        return keep_alive
+
+    def close_idle(self):
+        """Stop reusing connections and close the ones waiting for their next request."""
+        self.closing = True
+        for writer in list(self._waiting):
+            writer.close()
+
+    async def wait_idle(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain timed out with {self.active} requests still in flight")
+
+
+async def supervise(workers: List[Worker], stopping: asyncio.Event):
+    while not stopping.is_set():
+        for worker in workers:
+            if not worker.alive and not stopping.is_set():
+                logger.warning(f"Worker {worker.index} exited with {worker.process.returncode}, restarting")
+                worker.restarts += 1
+                worker.start()
+        try:
+            await asyncio.wait_for(stopping.wait(), 1.0)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def serve(args):
+    env = dict(os.environ)
+    env.setdefault("STATE_DB_PATH", os.path.abspath(args.state_db))
+    env.setdefault("USAGE_DB_PATH", os.path.abspath(args.usage_db))
+    if args.rate_limits or env.get("LLM_RATE_LIMITS"):
+        env["LLM_RATE_LIMITS"] = split_rate_limits(args.rate_limits or env["LLM_RATE_LIMITS"], args.workers)
+    else:
+        from configs import LLM_RATE_LIMITS
+        env["LLM_RATE_LIMITS"] = split_rate_limits(LLM_RATE_LIMITS, args.workers)
+
+    workers = [Worker(i, args.worker_port + i, env, args.drain_timeout) for i in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    deadline = time.monotonic() + args.startup_timeout
+    while not all(worker.ready() for worker in workers):
+        if time.monotonic() > deadline:
+            raise RuntimeError("Workers did not start in time")
+        await asyncio.sleep(0.1)
+
+    proxy = AffinityProxy(workers)
+    server = await asyncio.start_server(proxy.handle, args.host, args.port, limit=MAX_HEADER_BYTES, backlog=1024)
+    logger.info(f"Serving on http://{args.host}:{args.port} with {len(workers)} workers")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+    supervisor = asyncio.create_task(supervise(workers, stopping))
+    await stopping.wait()
+
+    logger.info(f"Draining {proxy.active} in-flight requests")
+    server.close()
+    proxy.close_idle()
+    for worker in workers:
+        worker.terminate()
+    await proxy.wait_idle(args.drain_timeout)
+    await supervisor
+    for worker in workers:
+        try:
+            await asyncio.to_thread(worker.process.wait, args.drain_timeout + 5)
+        except subprocess.TimeoutExpired:
+            worker.process.kill()
+    logger.info(f"Stopped after {proxy.requests} requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--worker-port", type=int, default=8100, help="First local port of the workers")
+    parser.add_argument("--state-db", default="state.db", help="Shared state, unless STATE_DB_PATH is set")
+    parser.add_argument("--usage-db", default="usage.db", help="Usage totals, unless USAGE_DB_PATH is set")
+    parser.add_argument("--rate-limits", help="LLM_RATE_LIMITS for the whole deployment, split between workers")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="Seconds to finish in-flight requests")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Request cancellation that reaches into worker threads.
+
+Cancelling an asyncio task stops the awaiting coroutine, but the
+`asyncio.to_thread` calls it started keep running, and so do their LLM calls. A
+`CancelScope` is a flag shared through a context variable (inherited by
+`asyncio.to_thread`), so the gateway and scheduler can check it before every
+attempt, backoff and rate-limit wait:
+
+    scope = CancelScope()
+    cancel_scope_var.set(scope)
+    ...
+    scope.cancel()          # e.g. when the client disconnects
+
+`DetachedTasks` is for expensive stages whose results are still useful after
+the client has gone: they finish in the background and the next request for
+the same key picks up the result instead of paying for it again.
+"""
+import asyncio, logging, threading, contextvars
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class CancelScope:
+    __slots__ = ("_event",)
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def sleep(self, seconds: float):
+        """`time.sleep` that returns early and raises once the scope is cancelled."""
+        if self._event.wait(seconds):
+            raise RequestCancelled("Request was cancelled")
+
+
+cancel_scope_var = contextvars.ContextVar("cancel_scope", default=None)
+
+
+def cancel_requested() -> bool:
+    scope = cancel_scope_var.get()
+    return scope is not None and scope.cancelled
+
+
+def check_cancelled():
+    if cancel_requested():
+        raise RequestCancelled("Request was cancelled")
+
+
+def cancellable_sleep(seconds: float):
+    scope = cancel_scope_var.get()
+    if scope is None:
+        threading.Event().wait(seconds)
+    else:
+        scope.sleep(seconds)
+
+
+class DetachedTasks:
+    """Run expensive coroutines so that they survive the request that started them.
+
+    Concurrent calls with the same key share one task. With `detach=True` a
+    cancelled caller leaves the task running under its own, never-cancelled
+    scope; if nobody is waiting when it finishes, the result is kept (up to
+    `max_results`) for the next `run` with that key.
+    """
+
+    def __init__(self, max_results: int = 256):
+        self.max_results = max_results
+        self.tasks: Dict[Hashable, asyncio.Task] = {}
+        self.waiters: Dict[Hashable, int] = {}
+        self.results: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.reused = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable], detach: bool = True):
+        if key in self.results:
+            self.reused += 1
+            logger.info(f"Reusing result finished after a client disconnect ({key})")
+            return self.results.pop(key)
+
+        task = self.tasks.get(key)
+        if task is None:
+            async def detached():
+                cancel_scope_var.set(CancelScope())
+                return await factory()
+
+            task = self.tasks[key] = asyncio.create_task(detached() if detach else factory())
+            task.add_done_callback(lambda t: self._done(key, t))
+
+        self.waiters[key] = self.waiters.get(key, 0) + 1
+        try:
+            if detach:
+                return await asyncio.shield(task)
+            return await task
+        finally:
+            self.waiters[key] -= 1
+            if not self.waiters[key]:
+                del self.waiters[key]
+                if not detach and not task.done():
+                    task.cancel()
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.warning(f"Detached task {key} failed: {task.exception()!r}")
+            return
+        if not self.waiters.get(key):
+            self.results[key] = task.result()
+            while len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+
+    def status(self) -> Dict[str, int]:
+        return {"running": len(self.tasks), "finished_unclaimed": len(self.results), "reused": self.reused}
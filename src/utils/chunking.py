@@ -0,0 +1,114 @@
+"""Token-bounded text chunking.
+
+Text is split on paragraphs first, then sentences, then clauses, then words,
+and the pieces are merged back into chunks of at most `chunk_size` tokens. A
+level is only split further when one of its pieces is still too large. Chunks
+are produced lazily, so truncating a long page to its first chunk only
+tokenizes the start of it.
+
+    splitter = TextSplitter(chunk_size=512, chunk_overlap=64)
+    chunks = splitter.split_text(page)
+    head = TextSplitter(chunk_size=5000).truncate(page)
+
+The tokenizer is any callable returning a sequence of tokens. The default
+counts words and punctuation marks, which is close to what the BPE tokenizers
+of the hosted models count for English text. Use `tiktoken_tokenizer()` for
+exact counts when tiktoken is installed.
+"""
+import re
+from collections import deque
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+Tokenizer = Callable[[str], Sequence]
+
+_WORD_TOKENS = re.compile(r"\w+|[^\w\s]")
+
+# (pattern, separator used to join the pieces back), coarsest first
+_LEVELS = (
+    (re.compile(r"\n\s*\n"), "\n\n"),
+    (re.compile(r"(?<=[.!?。？！])\s+"), " "),
+    (re.compile(r"(?<=[,;:])\s+"), " "),
+    (re.compile(r"\s+"), " "),
+)
+
+
+def word_tokenizer(text: str) -> List[str]:
+    return _WORD_TOKENS.findall(text)
+
+
+def tiktoken_tokenizer(encoding: str = "cl100k_base") -> Tokenizer:
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding).encode
+
+
+class TextSplitter:
+    __slots__ = ("chunk_size", "chunk_overlap", "tokenizer")
+
+    def __init__(self, chunk_size: int = 1024, chunk_overlap: int = 0, tokenizer: Tokenizer = None):
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError(f"chunk_overlap must be between 0 and chunk_size ({chunk_size}), got {chunk_overlap}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.tokenizer = tokenizer or word_tokenizer
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer(text))
+
+    def _pieces(self, text: str, level: int, joiner: str) -> Iterator[Tuple[str, int, str]]:
+        """`(text, tokens, joiner)` per piece no larger than chunk_size, where
+        `joiner` is the separator that goes before the piece."""
+        pattern, separator = _LEVELS[level]
+        for part in pattern.split(text):
+            part = part.strip()
+            if not part:
+                continue
+            tokens = self.count(part)
+            if tokens <= self.chunk_size:
+                yield part, tokens, joiner
+            elif level + 1 < len(_LEVELS):
+                yield from self._pieces(part, level + 1, joiner)
+            else:
+                yield from self._cut(part, tokens, joiner)
+            joiner = separator
+
+    def _cut(self, text: str, tokens: int, joiner: str) -> Iterator[Tuple[str, int, str]]:
+        # A single "word" over the limit (a long URL, base64): cut by characters
+        step = max(1, len(text) * self.chunk_size // tokens)
+        for start in range(0, len(text), step):
+            part = text[start:start + step]
+            yield part, min(self.count(part), self.chunk_size), joiner
+            joiner = ""
+
+    @staticmethod
+    def _join(window) -> str:
+        parts = []
+        for i, (part, _, joiner) in enumerate(window):
+            if i:
+                parts.append(joiner)
+            parts.append(part)
+        return "".join(parts)
+
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        window, size = deque(), 0
+        for piece in self._pieces(text, 0, ""):
+            if window and size + piece[1] > self.chunk_size:
+                yield self._join(window)
+                # The tail of this chunk, up to chunk_overlap tokens, starts the next one
+                while window and (size > self.chunk_overlap or size + piece[1] > self.chunk_size):
+                    size -= window.popleft()[1]
+            window.append(piece)
+            size += piece[1]
+        if window:
+            yield self._join(window)
+
+    def split_text(self, text: str) -> List[str]:
+        return list(self.iter_chunks(text))
+
+    def truncate(self, text: str) -> str:
+        """`text` unchanged if it fits in one chunk, else its first chunk."""
+        chunks = self.iter_chunks(text)
+        first = next(chunks, "")
+        return text if next(chunks, None) is None else first
@@ -0,0 +1,269 @@
+"""Local fake OpenAI/Groq-compatible chat completions server.
+
+Used to exercise the gateway (retries, hedging, circuit breaking, failover)
+and to load test the API offline. Latency (constant, normal, lognormal or
+uniform), streaming token rate, canned responses and failures are injectable
+at start-up or at runtime through `POST /_control`. Repeated system prompts of
+at least 1024 tokens are reported as cached, like OpenAI's prompt caching.
+
+    python -m utils.fake_provider --port 8900 --latency 0.3 --error-rate 0.1
+    GROQ_BASE_URL=http://127.0.0.1:8900 OPENAI_BASE_URL=http://127.0.0.1:8900/v1 python app.py
+
+    curl -X POST localhost:8900/_control -d '{"error_rate": 1.0, "error_status": 429}'
+"""
+import json, math, time, random, hashlib, argparse, threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+LATENCY_DISTRIBUTIONS = ("constant", "normal", "lognormal", "uniform")
+
+
+class FakeProviderConfig:
+    """
+    `responses` is a list of canned replies, the first match wins:
+        {"system": "substring of the system prompt", "message": "optional substring
+         of the user message", "content": "reply text" | {JSON object}}
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.05,
+        distribution: str = "normal",
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        stall_rate: float = 0.0,
+        stall_seconds: float = 120.0,
+        token_delay: float = 0.01,
+        content: str = "This is a response from the fake provider.",
+        responses: List[Dict] = None,
+        prompt_cache: bool = True,
+    ):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {LATENCY_DISTRIBUTIONS}")
+        self.latency = latency
+        self.jitter = jitter
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.token_delay = token_delay
+        self.content = content
+        self.responses = responses or []
+        self.prompt_cache = prompt_cache
+        self.requests = 0
+
+    def sample_latency(self) -> float:
+        """Seconds to wait before answering. For lognormal, `latency` is the
+        median and `jitter` the sigma of the underlying normal."""
+        if self.distribution == "constant":
+            return self.latency
+        if self.distribution == "uniform":
+            return random.uniform(max(0.0, self.latency - self.jitter), self.latency + self.jitter)
+        if self.distribution == "lognormal":
+            return random.lognormvariate(math.log(max(self.latency, 1e-6)), self.jitter)
+        return max(0.0, random.gauss(self.latency, self.jitter))
+
+    def update(self, **kwargs):
+        for key, value in kwargs.items():
+            if key not in vars(self):
+                raise KeyError(key)
+            setattr(self, key, value)
+
+
+class PromptCache:
+    """Remembers recent system prompts per model. A repeated prefix counts as
+    cached in 128-token steps once it reaches 1024 tokens."""
+
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self.seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, model: str, prefix: str) -> int:
+        tokens = len(prefix) // 4
+        if tokens < 1024:
+            return 0
+        key = hashlib.sha1(f"{model}\0{prefix}".encode()).hexdigest()
+        with self._lock:
+            hit = key in self.seen
+            self.seen[key] = True
+            self.seen.move_to_end(key)
+            while len(self.seen) > self.size:
+                self.seen.popitem(last=False)
+        return tokens // 128 * 128 if hit else 0
+
+
+PROMPT_CACHE = PromptCache()
+
+
+def _usage(prompt: str, completion: str, cached: int = 0):
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(completion) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    config: FakeProviderConfig = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        self._send_json(200, {**vars(self.config)})
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path.rstrip("/").endswith("/_control"):
+            self.config.update(**payload)
+            return self._send_json(200, {**vars(self.config)})
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        config = self.config
+        config.requests += 1
+        time.sleep(config.sample_latency())
+
+        if random.random() < config.stall_rate:
+            time.sleep(config.stall_seconds)
+        if random.random() < config.error_rate:
+            headers = {"retry-after": "1"} if config.error_status == 429 else None
+            return self._send_json(
+                config.error_status,
+                {"error": {"message": "Injected failure", "type": "fake_provider_error"}},
+                headers,
+            )
+
+        content = self.completion(payload)
+        messages = payload.get("messages", [])
+        prompt = "".join(str(m.get("content", "")) for m in messages)
+        cached = 0
+        if config.prompt_cache and messages and messages[0].get("role") == "system":
+            cached = PROMPT_CACHE.lookup(payload.get("model", ""), str(messages[0].get("content", "")))
+        usage = _usage(prompt, content, cached)
+        if payload.get("stream"):
+            return self._stream(payload, content, usage)
+
+        self._send_json(200, {
+            "id": f"chatcmpl-fake-{config.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def completion(self, payload: dict) -> str:
+        messages = payload.get("messages", [])
+        system = "".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        message = "".join(str(m.get("content", "")) for m in messages if m.get("role") != "system")
+        for response in self.config.responses:
+            if response.get("system", "") in system and response.get("message", "") in message:
+                content = response["content"]
+                return content if isinstance(content, str) else json.dumps(content)
+
+        if (payload.get("response_format") or {}).get("type") == "json_object":
+            return json.dumps({"content": self.config.content})
+        return self.config.content
+
+    def _stream(self, payload: dict, content: str, usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(data: str):
+            frame = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(frame):X}\r\n".encode() + frame + b"\r\n")
+            self.wfile.flush()
+
+        words = content.split(" ")
+        for idx, word in enumerate(words):
+            chunk = {
+                "id": f"chatcmpl-fake-{self.config.requests}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if idx == 0 else f" {word}"},
+                    "finish_reason": "stop" if idx == len(words) - 1 else None,
+                }],
+            }
+            if idx == len(words) - 1:
+                chunk["x_groq"] = {"usage": usage}
+            write(json.dumps(chunk))
+            time.sleep(self.config.token_delay)
+        write("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve(host: str = "127.0.0.1", port: int = 8900, config: FakeProviderConfig = None, background: bool = False):
+    """Start the fake provider. With `background=True` the server runs in a
+    daemon thread and is returned so tests can call `shutdown()` on it."""
+    handler = type("Handler", (FakeProviderHandler,), {"config": config or FakeProviderConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"Fake LLM provider listening on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="normal")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-seconds", type=float, default=120.0)
+    parser.add_argument("--token-rate", type=float, default=100.0, help="Streamed tokens per second")
+    parser.add_argument("--responses", help="JSON file with a list of canned responses")
+    args = parser.parse_args()
+
+    responses = None
+    if args.responses:
+        with open(args.responses) as f:
+            responses = json.load(f)
+
+    serve(args.host, args.port, FakeProviderConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        distribution=args.distribution,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        token_delay=1.0 / args.token_rate if args.token_rate > 0 else 0.0,
+        responses=responses,
+    ))
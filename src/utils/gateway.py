@@ -0,0 +1,267 @@
+"""Provider-agnostic LLM gateway.
+
+Wraps the provider functions in `utils.models` with:
+    - a per-call deadline shared by all attempts and fallbacks
+    - jittered exponential retry on retryable errors (429, 5xx, timeouts)
+    - optional hedged requests once a call outlives the provider's p95 latency
+    - a circuit breaker per provider
+    - failover to the next target (e.g. Groq -> OpenAI) when a provider is down
+    - client-side rate limiting through `utils.scheduler`
+    - early exit once the calling request is cancelled (`utils.cancellation`)
+
+Run `python -m utils.fake_provider` and set GROQ_BASE_URL / OPENAI_BASE_URL to
+exercise all of the above offline.
+"""
+import time, random, logging, threading, contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+from utils.scheduler import SCHEDULER, STANDARD, RateLimitTimeout, estimate_tokens
+from utils.cancellation import RequestCancelled, check_cancelled, cancellable_sleep
+from utils.tracing import increment
+from configs import LLM_TIMEOUT, LLM_DEADLINE, LLM_MAX_RETRIES, LLM_HEDGING
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError"}
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class ProviderUnavailable(RuntimeError):
+    pass
+
+
+def is_retryable(error: Exception) -> bool:
+    if getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES:
+        return True
+    if any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__):
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and lets a single probe
+    through once `reset_timeout` seconds have passed. The probe ends with
+    `record_success`, `record_failure` or, when it never got an answer from
+    the provider, `release`."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._prober = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._prober = threading.get_ident()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._prober = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._prober = None
+
+    def release(self):
+        """End this thread's probe without a verdict, e.g. when the call was cancelled;
+        the next caller probes again straight away."""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._prober == threading.get_ident():
+                self.state = self.OPEN
+                self.opened_at = time.monotonic() - self.reset_timeout
+                self._prober = None
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 256, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, latency: float):
+        self.samples.append(latency)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        providers: Dict[str, Callable],
+        timeout: float = LLM_TIMEOUT,
+        deadline: float = LLM_DEADLINE,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        hedge: bool = LLM_HEDGING,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30.0,
+    ):
+        self.providers = providers
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.breakers = {name: CircuitBreaker(breaker_threshold, breaker_reset) for name in providers}
+        self.latency = {name: LatencyWindow() for name in providers}
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+
+    def _sleep(self, attempt: int, error: Exception, deadline_at: float):
+        # Full jitter, but never sleep past the deadline
+        delay = retry_after(error) or random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        remaining = deadline_at - time.monotonic()
+        if delay >= remaining:
+            raise DeadlineExceeded(f"Deadline exceeded while backing off: {error}") from error
+        cancellable_sleep(delay)
+
+    def _invoke(self, target, sys_prompt, message, timeout, hedge, priority, **kwargs):
+        estimate = estimate_tokens(sys_prompt, message) + min(kwargs.get("max_tokens", 4096), 1024)
+
+        def call():
+            queued = time.monotonic()
+            with SCHEDULER.slot(target.provider, estimate, priority, timeout) as slot:
+                increment("rate_limit_wait_seconds", round(time.monotonic() - queued, 4))
+                response = self.providers[target.provider](
+                    sys_prompt, message, model=target.model, timeout=timeout, **kwargs
+                )
+            usage = getattr(response, "usage", None)
+            if slot and usage is not None:
+                slot.settle(estimate, getattr(usage, "total_tokens", estimate))
+            return response
+
+        delay = self.latency[target.provider].p95() if hedge and not kwargs.get("stream") else None
+        if delay is None or delay >= timeout:
+            return call()
+
+        # Copy the context so the scheduler still sees the caller's application_id
+        futures = {self._executor.submit(contextvars.copy_context().run, call)}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            logger.info(f"Hedging {target.provider}:{target.model} after {delay:.2f}s")
+            increment("hedged")
+            futures.add(self._executor.submit(contextvars.copy_context().run, call))
+
+        error = None
+        while futures:
+            done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"{target.provider}:{target.model} did not answer within {timeout:.1f}s")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def complete(
+        self, targets: List, sys_prompt, message,
+        deadline: float = None, hedge: bool = None, priority: int = STANDARD, **kwargs
+    ):
+        """Run a chat completion against `targets` in order.
+
+        Returns a `(response, target, index)` tuple, where `index` is the
+        position of the target that answered.
+        """
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        hedge = self.hedge if hedge is None else hedge
+        error = None
+
+        for idx, target in enumerate(targets):
+            breaker = self.breakers[target.provider]
+            if idx > 0:
+                increment("failovers")
+            if not breaker.allow():
+                error = ProviderUnavailable(f"Circuit open for provider '{target.provider}'")
+                continue
+
+            try:
+                for attempt in range(self.max_retries + 1):
+                    check_cancelled()
+                    remaining = deadline_at - time.monotonic()
+                    if remaining <= 0:
+                        raise DeadlineExceeded("LLM call deadline exceeded") from error
+
+                    start = time.monotonic()
+                    try:
+                        response = self._invoke(
+                            target, sys_prompt, message, min(self.timeout, remaining), hedge, priority, **kwargs
+                        )
+                    except RateLimitTimeout as e:
+                        raise DeadlineExceeded(f"LLM call deadline exceeded while rate limited: {e}") from e
+                    except RequestCancelled:
+                        raise
+                    except Exception as e:
+                        error = e
+                        if not is_retryable(e):
+                            logger.warning(f"{target.provider}:{target.model} failed with a non-retryable error: {e}")
+                            if getattr(e, "status_code", None) is not None:
+                                # The provider answered; it is the request that was rejected
+                                breaker.record_success()
+                            break
+                        breaker.record_failure()
+                        if getattr(e, "status_code", None) == 429 and target.provider in SCHEDULER.providers:
+                            SCHEDULER.providers[target.provider].pause(retry_after(e) or 1.0)
+                        logger.warning(f"{target.provider}:{target.model} attempt {attempt + 1} failed: {e}")
+                        if attempt == self.max_retries or breaker.is_open:
+                            break
+                        self._sleep(attempt, e, deadline_at)
+                        increment("retries")
+                        continue
+
+                    breaker.record_success()
+                    if not kwargs.get("stream"):
+                        self.latency[target.provider].add(time.monotonic() - start)
+                    return response, target, idx
+            finally:
+                # A probe that ended without an answer either way must not keep the circuit half open
+                breaker.release()
+
+        raise error or ProviderUnavailable("No LLM targets configured")
+
+    def status(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                "circuit": breaker.state,
+                "consecutive_failures": breaker.failures,
+                "latency_p95": self.latency[name].p95(),
+            }
+            for name, breaker in self.breakers.items()
+        }
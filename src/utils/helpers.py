@@ -1,6 +1,14 @@
-import io, uuid, json, pypdf, time
-from llama_index.core.node_parser import SentenceSplitter
+import io, uuid, json, time, asyncio, logging, threading
 from utils.models import *
+from utils.routing import chat
+from utils.tracing import traced, set_attributes, increment
+from utils.sse import status_event
+from utils.semantic_cache import semantic_cache
+from utils.chunking import TextSplitter
+
+logger = logging.getLogger(__name__)
+
+CLASSIFICATIONS = semantic_cache("classify")
 
 ALLOWED_EXTENSIONS = {'txt', 'htm', 'html', 'pdf', 'doc', 'docx', 'ppt', 'pptx'}
 OTHER_LANGUAGES = ["Igbo", "Hausa", "Yoruba", "Nigerian Pidgin", "Swahili", "Kinyarwanda"]
@@ -9,21 +17,34 @@ OTHER_LANGUAGES = ["Igbo", "Hausa", "Yoruba", "Nigerian Pidgin", "Swahili", "Kin
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-async def pdf_reader(stream):
+def pdf_text(stream):
+    import pypdf
     pdf = pypdf.PdfReader(io.BytesIO(stream))
     num_pages = len(pdf.pages)
-    
+    set_attributes(pages=num_pages, bytes=len(stream))
+
     # Join text extracted from each page
-    text = "\n".join(
+    return "\n".join(
         pdf.pages[page].extract_text() for page in range(num_pages)
     )
 
-    metadata = classify_input_file(text)
-    print(metadata)
+async def read_document(filename, stream):
+    """Extract the text of an uploaded .txt or .pdf file without classifying it."""
+    if filename.endswith("pdf"):
+        return await asyncio.to_thread(pdf_text, stream)
+    return stream.decode(encoding = "utf-8")
+
+@traced("helpers.pdf_reader")
+async def pdf_reader(stream):
+    text = await asyncio.to_thread(pdf_text, stream)
+
+    metadata = await asyncio.to_thread(classify_input_file, text)
+    logger.debug(f"Classified PDF as {metadata}")
 
     return text, metadata
 
 
+@traced("helpers.classify_input_file")
 def classify_input_file(content):
     prompt = """
     A document from a career/business opportunity is provided below and your objective is to determine if it's an opportunity or an application.
@@ -31,8 +52,17 @@ def classify_input_file(content):
 
     Document:
     """
-    response = init_groq(prompt, content, response_format={ "type": "json_object" }).choices[0].message.content
-    return json.loads(response)
+    sketch = CLASSIFICATIONS.sketch(content)
+    hit = CLASSIFICATIONS.get(content, sketch=sketch)
+    if hit is not None:
+        increment("semantic_cache_hits")
+        set_attributes(semantic_similarity=round(hit.similarity, 4))
+        return dict(hit.value)
+
+    response = chat(prompt, content, route="classify", response_format={ "type": "json_object" }).choices[0].message.content
+    metadata = json.loads(response)
+    CLASSIFICATIONS.put(content, metadata, sketch=sketch)
+    return metadata
 
 def structured_output_chat(input):
     prompt = """
@@ -41,31 +71,77 @@ def structured_output_chat(input):
 
     JSON:
     """
-    response = init_groq(prompt, input, stream=True)
-    for message in response:
-        token = message.choices[0].delta.content
-        if token:
-            yield f"""{token}"""
-
+    response = chat(prompt, input, route="narrate", stream=True)
+    try:
+        for message in response:
+            token = message.choices[0].delta.content
+            if token:
+                yield f"""{token}"""
+    finally:
+        close = getattr(response, "close", None)
+        if close:
+            close()
+
+@traced("helpers.clean_page_content")
 def clean_page_content(content, threshold=5000):
     _content = content.replace("\n\n","\n").replace("\n\n\n","\n") # To DO: add more cleaning regex
-    splitter = SentenceSplitter()
-    if len(splitter._tokenizer(_content))>threshold:
-        _content = splitter._split_text(_content, chunk_size=threshold)[0]
-    return _content
+    # Only tokenizes as far as needed to find the first chunk
+    return TextSplitter(chunk_size=threshold).truncate(_content)
 
-def format_sse(message: str):
-    step = f"data: {json.dumps({'status': message})}\n"
-    print(step)
-    return step
+async def iterate_in_thread(iterator):
+    """
+    Consume a blocking iterator (e.g. a provider stream) from async code without
+    stalling the event loop while it waits on the network or the rate limiter.
+    """
+    iterator, done, lock = iter(iterator), object(), threading.Lock()
+
+    def step():
+        with lock:
+            return next(iterator, done)
+
+    def close():
+        # Waits for an in-flight next() so a generator is never closed while it runs
+        with lock:
+            getattr(iterator, "close", lambda: None)()
+
+    finished = False
+    try:
+        while (item := await asyncio.to_thread(step)) is not done:
+            yield item
+        finished = True
+    finally:
+        if finished:
+            close()
+        else:
+            threading.Thread(target=close, daemon=True, name="stream-close").start()
 
+def format_sse(message: str):
+    logger.debug(f"SSE status: {message}")
+    return status_event(message)
 
-def translate_output(text, language):
 
+@traced("helpers.translate_output")
+def translate_output(segments, language):
+    """Translate a batch of text segments, the ones the translation memory does not have yet."""
     prompt = f"""
-    As an expert in {language}, translate the provided message into {language}
+    As an expert in {language}, translate each string of the JSON array provided below into {language}.
+    Keep markdown, names and placeholders such as {{0}} exactly as they are.
+    Return your answer in JSON format in the schema {{"translations": ["array of strings"]}}, with one translation per string, in the same order.
+
+    Strings:
     """
-    return init_openai(prompt, text, stream=True)
+    set_attributes(language=language, segments=len(segments))
+    response = chat(
+        prompt, json.dumps(segments, ensure_ascii=False), route="translate", response_format={ "type": "json_object" }
+    ).choices[0].message.content
+    translations = json.loads(response).get("translations", [])
+    if isinstance(translations, str):
+        translations = [translations]
+    if len(translations) != len(segments):
+        logger.warning(f"Got {len(translations)} translations for {len(segments)} segments")
+        # None rather than misaligned; the translation memory retries those as they are
+        return [None] * len(segments)
+    return translations
 
 
 def export_results(evaluation_result, format:str = 'json', file_path: str = None):
@@ -0,0 +1,81 @@
+"""Queue-based, async-safe logging.
+
+Handlers on the request path only put records on an in-memory queue; a
+listener thread formats and writes them. Per-module levels come from
+LOG_LEVELS, and streamed tokens go to the `lvlr.tokens` logger, which is
+sampled and off unless set to DEBUG:
+
+    LOG_LEVELS="lvlr.tokens=DEBUG,utils.web=DEBUG" LOG_TOKEN_SAMPLE_RATE=0.05 python app.py
+"""
+import sys, queue, atexit, random, logging, logging.handlers
+from typing import Dict
+from configs import LOG_LEVEL, LOG_LEVELS, LOG_TOKEN_SAMPLE_RATE
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+token_logger = logging.getLogger("lvlr.tokens")
+
+_listener = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: records are dropped when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record) -> bool:
+        return self.rate >= 1 or random.random() < self.rate
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: str = LOG_LEVEL, module_levels: str = LOG_LEVELS,
+                  token_sample_rate: float = LOG_TOKEN_SAMPLE_RATE, max_queue: int = 10000):
+    """Route all logging through a queue drained by a background thread. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_queue = queue.Queue(maxsize=max_queue)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [DroppingQueueHandler(log_queue)]
+    root.setLevel(level.upper())
+
+    # Token logging is opt-in: even when enabled only a sample gets through
+    token_logger.setLevel(logging.WARNING)
+    token_logger.addFilter(SamplingFilter(token_sample_rate))
+    for name, module_level in parse_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+    return _listener
+
+
+def log_token(token: str):
+    # The level check is a cached int comparison, so disabled token logging costs nothing per token
+    if token_logger.isEnabledFor(logging.DEBUG):
+        token_logger.debug("%r", token)
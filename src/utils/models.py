@@ -1,16 +1,39 @@
-import groq, openai
+import importlib
+from functools import lru_cache
 
 try:
-    from configs import GROQ_API_KEY, OPENAI_API_KEY
+    from configs import GROQ_API_KEY, OPENAI_API_KEY, GROQ_BASE_URL, OPENAI_BASE_URL
 except:
     print(f"Could not import configs, retrying with relative import.")
     import sys
     sys.path.append("..")
-    from configs import GROQ_API_KEY, OPENAI_API_KEY
+    from configs import GROQ_API_KEY, OPENAI_API_KEY, GROQ_BASE_URL, OPENAI_BASE_URL
 
 
-def init_groq(sys_prompt, message, model="llama-3.1-70b-versatile", temperature=0.1, max_tokens=4096, stream=False, response_format=None):
-    client = groq.Groq(api_key=GROQ_API_KEY)
+def __getattr__(name):
+    # `from utils.models import groq` still works, but only imports the SDK when asked for
+    if name in ("groq", "openai"):
+        return importlib.import_module(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# The SDKs are slow to import, so they are loaded on the first call. There is one
+# client per provider, shared across threads so connections are reused; the timeout
+# is given per request, since the gateway shortens it to the time left before the deadline
+@lru_cache(maxsize=None)
+def groq_client():
+    import groq
+    # Retries are handled by utils.gateway, so the SDK's own retry loop is disabled
+    return groq.Groq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, max_retries=0)
+
+@lru_cache(maxsize=None)
+def openai_client():
+    import openai
+    return openai.OpenAI(base_url=OPENAI_BASE_URL, max_retries=0)
+
+
+def init_groq(sys_prompt, message, model="llama-3.1-70b-versatile", temperature=0.1, max_tokens=4096, stream=False, response_format=None, timeout=60):
+    client = groq_client()
     response = client.chat.completions.create(
         model=model,
         messages=[
@@ -21,13 +44,14 @@ def init_groq(sys_prompt, message, model="llama-3.1-70b-versatile", temperature=
         response_format=response_format,
         temperature=temperature,
         max_tokens=max_tokens,
+        timeout=timeout,
         # top_p=1
     )
 
     return response
 
-def init_openai(sys_prompt, message, model="gpt-4o", temperature=0.1, max_tokens=4096, stream=False, response_format=None):
-    client = openai.OpenAI()
+def init_openai(sys_prompt, message, model="gpt-4o", temperature=0.1, max_tokens=4096, stream=False, response_format=None, timeout=60):
+    client = openai_client()
     response = client.chat.completions.create(
         model=model,
         messages=[
@@ -44,6 +68,7 @@ def init_openai(sys_prompt, message, model="gpt-4o", temperature=0.1, max_tokens
         response_format=response_format,
         temperature=temperature,
         max_tokens=max_tokens,
+        timeout=timeout,
     )
 
     return response
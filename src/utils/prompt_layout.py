@@ -0,0 +1,83 @@
+"""Cache-friendly prompt layout.
+
+Providers that cache prompts (OpenAI, and Groq on supported models) match on
+the longest identical prefix of the request. A `PromptLayout` therefore splits
+a prompt in two:
+
+    - `context`: long documents shared by many calls, rendered as the system
+      message. Put the most widely shared document first, e.g. the opportunity
+      (shared by a whole batch) before the application (shared by every
+      reviewer of one candidate).
+    - `instructions`: the persona and task, which differ per call, rendered as
+      the user message.
+
+    layout = PromptLayout(REVIEW_CONTEXT, BIASED_REVIEWER)
+    sys_prompt, message = layout.render(name=..., opportunity=..., application=...)
+
+Both parts are precompiled `Template`s (see utils/templates.py). The rendered
+context is memoized for the last few document pairs, so the reviewers, the bias
+detector and the profile helper of one evaluation share a single copy of the
+documents instead of building one each.
+
+Cached prompt tokens reported by the provider are recorded per route in
+`/routes/stats` and in the `lvlr_llm_tokens_total{kind="cached"}` counter.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple, Union
+from utils.templates import Template
+
+
+def _compiled(part: Union[str, Template]) -> Template:
+    return part if isinstance(part, Template) else Template(part)
+
+
+class _ContextMemo:
+    """Recently rendered contexts of one template, shared by every layout using it."""
+
+    def __init__(self, size: int = 16):
+        self.size = size
+        self.rendered = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            rendered = self.rendered.get(key)
+            if rendered is not None:
+                self.rendered.move_to_end(key)
+            return rendered
+
+    def put(self, key, rendered: str):
+        with self.lock:
+            self.rendered[key] = rendered
+            while len(self.rendered) > self.size:
+                self.rendered.popitem(last=False)
+
+
+_MEMOS: Dict[str, _ContextMemo] = {}
+
+
+class PromptLayout:
+    __slots__ = ("context", "instructions", "context_fields", "_memo")
+
+    def __init__(self, context: Union[str, Template], instructions: Union[str, Template]):
+        self.context = _compiled(context)
+        self.instructions = _compiled(instructions)
+        self.context_fields = tuple(sorted(self.context.slots))
+        self._memo = _MEMOS.setdefault(self.context.digest, _ContextMemo())
+
+    def render_context(self, **values) -> str:
+        # Strings cache their hash, so keying on the documents is cheap after the first call
+        key = tuple(values.get(field) for field in self.context_fields)
+        try:
+            rendered = self._memo.get(key)
+        except TypeError:
+            return self.context.render(**values)
+        if rendered is None:
+            rendered = self.context.render(**values)
+            self._memo.put(key, rendered)
+        return rendered
+
+    def render(self, **values) -> Tuple[str, str]:
+        """Return `(sys_prompt, message)` for `chat`."""
+        return self.render_context(**values), self.instructions.render(**values)
@@ -0,0 +1,223 @@
+"""Per-stage model routing.
+
+Every LLM call site is tagged with a route name (classify, review, parse, bias,
+improve, narrate, translate). A route maps to an ordered list of provider/model
+targets; the first target is tried first and the rest are fallbacks.
+"""
+import os, json, time, logging, threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from utils.models import init_groq, init_openai
+from utils.gateway import LLMGateway
+from utils.scheduler import ROUTE_PRIORITIES, STANDARD, priority_var
+from utils.singleflight import SingleFlight, fingerprint
+from utils.cancellation import RequestCancelled, cancel_requested, check_cancelled
+from utils.tracing import Span, start_span, current_span, increment, record_usage, cached_tokens
+from utils.usage import LEDGER, current_tenant
+from configs import LLM_ROUTES
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = {
+    "groq": init_groq,
+    "openai": init_openai,
+}
+
+DEFAULT_ROUTES = {
+    "classify": ["groq:llama-3.1-8b-instant", "groq:llama-3.1-70b-versatile", "openai:gpt-4o-mini"],
+    "review": ["groq:llama-3.1-70b-versatile", "openai:gpt-4o"],
+    "parse": ["groq:llama-3.1-8b-instant", "groq:llama-3.1-70b-versatile", "openai:gpt-4o-mini"],
+    "bias": ["groq:llama-3.1-70b-versatile", "openai:gpt-4o"],
+    "improve": ["groq:llama-3.1-70b-versatile", "openai:gpt-4o"],
+    "narrate": ["groq:llama-3.1-70b-versatile", "openai:gpt-4o-mini"],
+    "translate": ["openai:gpt-4o", "groq:llama-3.1-70b-versatile"],
+    "default": ["groq:llama-3.1-70b-versatile", "openai:gpt-4o"],
+}
+
+
+@dataclass(frozen=True)
+class Target:
+    provider: str
+    model: str
+
+    @classmethod
+    def parse(cls, spec: str) -> "Target":
+        provider, _, model = spec.partition(":")
+        if provider not in PROVIDERS or not model:
+            raise ValueError(f"Invalid route target '{spec}', expected '<provider>:<model>'")
+        return cls(provider, model)
+
+
+class RouteStats:
+    """Rolling latency and token counters for a single route."""
+
+    def __init__(self, window: int = 512):
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.fallbacks = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.coalesced = 0
+        self.models = {}
+
+    def record(self, target: Target, latency: float, usage=None, fallback: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.fallbacks += int(fallback)
+            self.latencies.append(latency)
+            key = f"{target.provider}:{target.model}"
+            self.models[key] = self.models.get(key, 0) + 1
+            if usage is not None:
+                self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+                self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+                self.cached_tokens += cached_tokens(usage)
+
+    def record_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "fallbacks": self.fallbacks,
+                "coalesced": self.coalesced,
+                "models": dict(self.models),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cache_hit_rate": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else None,
+                "latency_p50": _percentile(latencies, 0.50),
+                "latency_p95": _percentile(latencies, 0.95),
+            }
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(q * len(values)))], 4)
+
+
+def load_routes(config: Optional[str] = LLM_ROUTES) -> Dict[str, List[Target]]:
+    """Merge deployment overrides (JSON string or path to a JSON file) over DEFAULT_ROUTES."""
+    routes = dict(DEFAULT_ROUTES)
+    if config:
+        if os.path.isfile(config):
+            with open(config) as f:
+                config = f.read()
+        routes.update(json.loads(config))
+    return {name: [Target.parse(spec) for spec in specs] for name, specs in routes.items()}
+
+
+ROUTES = load_routes()
+STATS = {name: RouteStats() for name in ROUTES}
+GATEWAY = LLMGateway(PROVIDERS)
+FLIGHTS = SingleFlight()
+
+
+def resolve(route: str) -> List[Target]:
+    return ROUTES.get(route) or ROUTES["default"]
+
+
+def route_stats() -> Dict[str, Dict]:
+    return {name: stats.snapshot() for name, stats in STATS.items()}
+
+
+def _usage(obj):
+    # Groq reports stream usage on the final chunk under `x_groq`
+    usage = getattr(obj, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(obj, "x_groq", None), "usage", None)
+    return usage
+
+
+def _track_stream(response, stats: RouteStats, target: Target, start: float, fallback: bool, trace: Span):
+    usage, error, chunks = None, None, 0
+    try:
+        for chunk in response:
+            usage = _usage(chunk) or usage
+            if not chunks:
+                trace.set(time_to_first_token=round(time.perf_counter() - start, 4))
+            chunks += 1
+            yield chunk
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        close = getattr(response, "close", None)
+        if close:
+            close()
+        stats.record(target, time.perf_counter() - start, usage, fallback)
+        record_usage(usage, trace.attributes["route"], trace)
+        LEDGER.record(trace.attributes["route"], target.model, usage)
+        trace.set(chunks=chunks)
+        trace.end(error)
+
+
+def _dispatch(sys_prompt, message, route, stats: RouteStats, **kwargs):
+    priority = priority_var.get()
+    if priority is None:
+        priority = ROUTE_PRIORITIES.get(route, STANDARD)
+
+    trace = start_span(f"llm.{route}", route=route, stream=bool(kwargs.get("stream")))
+    token = current_span.set(trace)
+    start = time.perf_counter()
+    try:
+        response, target, idx = GATEWAY.complete(resolve(route), sys_prompt, message, priority=priority, **kwargs)
+    except RequestCancelled as e:
+        trace.end(e)
+        raise
+    except Exception as e:
+        logger.warning(f"Route '{route}' failed on every target: {e}")
+        stats.record_error()
+        trace.end(e)
+        raise
+    finally:
+        current_span.reset(token)
+
+    trace.set(provider=target.provider, model=target.model, fallback=idx > 0)
+    if kwargs.get("stream"):
+        return _track_stream(response, stats, target, start, idx > 0, trace)
+    stats.record(target, time.perf_counter() - start, _usage(response), fallback=idx > 0)
+    record_usage(_usage(response), route, trace)
+    LEDGER.record(route, target.model, _usage(response))
+    trace.end()
+    return response
+
+
+def chat(sys_prompt, message, route="default", **kwargs):
+    """Send a chat completion through the targets configured for `route`.
+
+    Accepts the same arguments as `init_groq`/`init_openai` except `model`,
+    which is chosen by the route, plus the gateway's `deadline` and `hedge`.
+    Identical calls that overlap in time share a single upstream request.
+    Raises QuotaExceeded when the caller's tenant or application is over quota.
+    """
+    LEDGER.check()
+    stats = STATS.setdefault(route, RouteStats())
+    # Per tenant: the leader's usage is charged to its tenant only, so a call from another
+    # tenant must not ride along for free
+    key = fingerprint(route, sys_prompt, message, kwargs, current_tenant())
+    while True:
+        check_cancelled()
+        try:
+            return FLIGHTS.do(
+                key,
+                lambda: _dispatch(sys_prompt, message, route, stats, **kwargs),
+                stream=bool(kwargs.get("stream")),
+                on_shared=lambda: (stats.record_coalesced(), increment("coalesced")),
+            )
+        except RequestCancelled:
+            # We joined a call whose own client went away; run it again for ourselves
+            if cancel_requested():
+                raise
@@ -0,0 +1,196 @@
+"""Process-wide request scheduler for LLM providers.
+
+Every provider call waits here for a slot before it is sent. Each provider has
+two token buckets, one for requests/min and one for tokens/min (estimated from
+prompt size and corrected from the reported usage afterwards). Waiting calls
+are served by priority class first and then round-robin across
+`application_id`s (or `queue_key`s, when set), so one large upload cannot
+starve everyone else.
+"""
+import json, time, threading, contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+from utils.cancellation import cancel_scope_var, check_cancelled
+from configs import LLM_RATE_LIMITS
+
+INTERACTIVE, STANDARD, BACKGROUND = 0, 1, 2
+
+# Streaming narration/translation is what the user is watching right now
+ROUTE_PRIORITIES = {
+    "narrate": INTERACTIVE,
+    "translate": INTERACTIVE,
+}
+
+# Set by the API for the duration of a request, inherited by asyncio.to_thread
+application_id_var = contextvars.ContextVar("application_id", default=None)
+# Fair-queuing key when it is not the application, e.g. one per batch of candidates
+queue_key_var = contextvars.ContextVar("queue_key", default=None)
+priority_var = contextvars.ContextVar("priority", default=None)
+
+
+class RateLimitTimeout(TimeoutError):
+    pass
+
+
+def estimate_tokens(*texts: str) -> int:
+    # Roughly 4 characters per token for English text
+    return sum(len(text or "") for text in texts) // 4 + 1
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available. Requests bigger than the bucket
+        only wait for a full bucket, otherwise they could never run."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Ticket:
+    __slots__ = ("tokens", "priority", "tenant")
+
+    def __init__(self, tokens: int, priority: int, tenant):
+        self.tokens = tokens
+        self.priority = priority
+        self.tenant = tenant
+
+
+class ProviderScheduler:
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.granted = 0
+        self.queues = {priority: OrderedDict() for priority in (INTERACTIVE, STANDARD, BACKGROUND)}
+        self._cond = threading.Condition()
+
+    def _head(self) -> Optional[_Ticket]:
+        for queue in self.queues.values():
+            if queue:
+                return next(iter(queue.values()))[0]
+        return None
+
+    def _pop(self, ticket: _Ticket):
+        queue = self.queues[ticket.priority]
+        tickets = queue.pop(ticket.tenant)
+        tickets.remove(ticket)
+        if tickets:
+            # Re-append to the back so the next tenant goes first
+            queue[ticket.tenant] = tickets
+
+    def _enqueue(self, ticket: _Ticket):
+        self.queues[ticket.priority].setdefault(ticket.tenant, deque()).append(ticket)
+
+    def acquire(self, tokens: int, priority: int = STANDARD, tenant=None, timeout: float = None,
+                cancel_scope=None) -> bool:
+        ticket = _Ticket(tokens, priority, tenant)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._enqueue(ticket)
+            while True:
+                wait = None
+                if self._head() is ticket:
+                    wait = max(
+                        self.paused_until - time.monotonic(),
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(tokens),
+                    )
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self.granted += 1
+                        self._pop(ticket)
+                        self._cond.notify_all()
+                        return True
+
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._pop(ticket)
+                        self._cond.notify_all()
+                        return False
+                    wait = remaining if wait is None else min(wait, remaining)
+                if cancel_scope is not None:
+                    if cancel_scope.cancelled:
+                        # Give the slot to someone whose client is still listening
+                        self._pop(ticket)
+                        self._cond.notify_all()
+                        return False
+                    wait = 0.25 if wait is None else min(wait, 0.25)
+                self._cond.wait(wait)
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the provider reports real usage."""
+        with self._cond:
+            if actual > estimated:
+                self.tokens.take(actual - estimated)
+            else:
+                self.tokens.give(estimated - actual)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Stop dispatching for a while, e.g. after a 429 with retry-after."""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def status(self) -> Dict:
+        with self._cond:
+            return {
+                "granted": self.granted,
+                "waiting": {
+                    priority: sum(len(tickets) for tickets in queue.values())
+                    for priority, queue in self.queues.items()
+                },
+                "requests_available": round(self.requests.tokens, 2),
+                "tokens_available": round(self.tokens.tokens, 2),
+            }
+
+
+class RequestScheduler:
+    def __init__(self, limits: Dict[str, Dict[str, float]]):
+        self.providers = {
+            name: ProviderScheduler(limit["rpm"], limit["tpm"]) for name, limit in limits.items()
+        }
+
+    @contextmanager
+    def slot(self, provider: str, tokens: int, priority: int = STANDARD, timeout: float = None):
+        """Hold a dispatch slot for one provider call. Yields the provider's
+        scheduler so the caller can `settle` the real token usage."""
+        scheduler = self.providers.get(provider)
+        if scheduler is None:
+            yield None
+            return
+
+        tenant = queue_key_var.get() or application_id_var.get()
+        if not scheduler.acquire(tokens, priority, tenant, timeout, cancel_scope_var.get()):
+            check_cancelled()
+            raise RateLimitTimeout(f"Timed out waiting for a '{provider}' rate limit slot")
+        yield scheduler
+
+    def status(self) -> Dict[str, Dict]:
+        return {name: scheduler.status() for name, scheduler in self.providers.items()}
+
+
+SCHEDULER = RequestScheduler(json.loads(LLM_RATE_LIMITS))
@@ -0,0 +1,334 @@
+"""Sectioned documents: CVs and job descriptions split into sections.
+
+Headings are recognised from a small vocabulary ("Experience", "Skills",
+"Requirements", "About the role", ...), markdown `#` headings and short
+all-caps lines. Text before the first heading (name, contact details, job
+title) becomes the "header" section.
+
+An upload is parsed once into a `DocumentSet`: the text of every document in
+one buffer, grouped by document type, plus integer offsets for each document
+and section. Handlers read a type's text as a single slice and build
+`Section`s only when they ask for them. Stored uploads keep that layout
+instead of a pickle (`dump_upload` / `load_upload`).
+
+    documents = DocumentSet.build([("opportunity", "jd.txt", jd), ("application", "cv.pdf", cv)])
+    application = documents.text("application")
+    opportunity = documents.text("opportunity", exclude=PROMPT_EXCLUDED_SECTIONS)
+    changes = diff_sections(previous.sections("application"), documents.sections("application"))
+    prompt = render_changes(changes)
+"""
+import re, json, struct, difflib
+from array import array
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+from configs import PROMPT_EXCLUDED_SECTIONS as PROMPT_EXCLUDED_SECTION_KINDS
+
+# Checked in order, the first match wins ("About the role" is a summary)
+SECTION_KEYWORDS = [
+    ("summary", ("summary", "profile", "about", "objective", "overview")),
+    ("experience", ("experience", "employment", "work history", "career")),
+    ("education", ("education", "academic")),
+    ("skills", ("skills", "technologies", "tech stack", "competencies", "tools")),
+    ("projects", ("projects", "portfolio")),
+    ("certifications", ("certifications", "certificates", "licenses", "awards")),
+    ("requirements", ("requirements", "qualifications", "what you bring", "who you are", "must have", "nice to have")),
+    ("responsibilities", ("responsibilities", "duties", "what you will do", "what you'll do", "the role")),
+    ("benefits", ("benefits", "offer", "perks", "compensation")),
+    ("other", ("volunteer", "interests", "hobbies", "languages", "publications", "references", "activities")),
+]
+SECTION_KINDS = ("header",) + tuple(kind for kind, _ in SECTION_KEYWORDS)
+
+# Headings a section must have, exactly, to be left out by `DocumentSet.text(exclude=...)`.
+# The keywords above are loose enough to misfile a heading; dropping text on them is not safe
+EXCLUDABLE_HEADINGS = {
+    "benefits": {
+        "benefits", "perks", "perks and benefits", "benefits and perks", "what we offer", "our offer",
+        "compensation and benefits", "salary and benefits",
+    },
+}
+
+# Left out of review prompts when configured: they say nothing about the candidate or what the role needs
+PROMPT_EXCLUDED_SECTIONS = tuple(kind for kind in PROMPT_EXCLUDED_SECTION_KINDS if kind in EXCLUDABLE_HEADINGS)
+
+_HEADING_MAX_WORDS = 5
+
+
+class Section:
+    __slots__ = ("kind", "heading", "text")
+
+    def __init__(self, kind: str, heading: str, text: str):
+        self.kind = kind
+        self.heading = heading
+        self.text = text
+
+    def __repr__(self):
+        return f"Section({self.kind!r}, {self.heading!r}, {len(self.text)} chars)"
+
+
+class SectionChange:
+    __slots__ = ("kind", "heading", "status", "before", "after")
+
+    def __init__(self, kind: str, heading: str, status: str, before: str, after: str):
+        self.kind = kind
+        self.heading = heading
+        # "added", "removed" or "modified"
+        self.status = status
+        self.before = before
+        self.after = after
+
+
+def _title(line: str) -> str:
+    return line.strip().lstrip("#").strip().rstrip(":").strip()
+
+
+def heading_kind(line: str) -> Optional[str]:
+    """Section kind if `line` looks like a heading, else None."""
+    markdown = line.strip().startswith("#")
+    title = _title(line)
+    if not title or title[0] in "-*•" or title.endswith(".") or any(c.isdigit() for c in title):
+        return None
+    if "," in title or len(title.split()) > _HEADING_MAX_WORDS:
+        return None
+    lowered = title.lower()
+    for kind, keywords in SECTION_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return kind
+    if markdown or (title.isupper() and len(title) > 2):
+        return "other"
+    return None
+
+
+def _trim(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def section_spans(text: str, start: int = 0, end: int = None) -> List[Tuple[int, int, int, int, int]]:
+    """`(kind, heading_start, heading_end, body_start, body_end)` per section of
+    `text[start:end]`, with offsets into `text` and `kind` an index into SECTION_KINDS."""
+    end = len(text) if end is None else end
+    spans, kind, heading, body = [], 0, (start, start), start
+
+    def close(body_end):
+        b0, b1 = _trim(text, body, body_end)
+        if b1 > b0 or heading[1] > heading[0]:
+            spans.append((kind, heading[0], heading[1], b0, b1))
+
+    position = start
+    while position < end:
+        line_end = text.find("\n", position, end)
+        line_end = end if line_end == -1 else line_end
+        line = text[position:line_end]
+        found = heading_kind(line)
+        if found is not None:
+            close(position)
+            title = _title(line)
+            offset = position + line.find(title)
+            kind, heading, body = SECTION_KINDS.index(found), (offset, offset + len(title)), line_end
+        position = line_end + 1
+    close(end)
+    return spans
+
+
+def split_sections(text: str) -> List[Section]:
+    return [
+        Section(SECTION_KINDS[kind], text[h0:h1], text[b0:b1])
+        for kind, h0, h1, b0, b1 in section_spans(text)
+    ]
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _keyed(sections: List[Section]) -> List[Tuple[Tuple[str, str, int], Section]]:
+    # Repeated headings (two "Experience" blocks) are matched by occurrence
+    seen, keyed = {}, []
+    for section in sections:
+        name = (section.kind, section.heading.lower())
+        seen[name] = seen.get(name, 0) + 1
+        keyed.append(((*name, seen[name]), section))
+    return keyed
+
+
+def _as_sections(value: Union[str, List[Section]]) -> List[Section]:
+    return split_sections(value) if isinstance(value, str) else value
+
+
+def diff_sections(old: Union[str, List[Section]], new: Union[str, List[Section]]) -> List[SectionChange]:
+    """Sections of `new` that differ from `old`, ignoring whitespace-only edits.
+    Both sides are raw text or already split sections."""
+    before = dict(_keyed(_as_sections(old)))
+    changes = []
+    for key, section in _keyed(_as_sections(new)):
+        previous = before.pop(key, None)
+        if previous is None:
+            changes.append(SectionChange(section.kind, section.heading, "added", "", section.text))
+        elif _normalize(previous.text) != _normalize(section.text):
+            changes.append(SectionChange(section.kind, section.heading, "modified", previous.text, section.text))
+    for section in before.values():
+        changes.append(SectionChange(section.kind, section.heading, "removed", section.text, ""))
+    return changes
+
+
+def changed_fraction(changes: List[SectionChange], text: str) -> float:
+    """Rough share of `text` touched by `changes`, from 0 to 1."""
+    if not text:
+        return 1.0 if changes else 0.0
+    touched = 0
+    for change in changes:
+        before, after = change.before.splitlines(), change.after.splitlines()
+        matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag != "equal":
+                touched += max(sum(map(len, before[i1:i2])), sum(map(len, after[j1:j2])))
+    return min(1.0, touched / len(text))
+
+
+def render_changes(changes: List[SectionChange], context: int = 1) -> str:
+    """Compact, line-based description of `changes` for a prompt."""
+    blocks = []
+    for change in changes:
+        title = change.heading or change.kind.capitalize()
+        if change.status == "modified":
+            body = "\n".join(
+                line for line in difflib.unified_diff(
+                    change.before.splitlines(), change.after.splitlines(), lineterm="", n=context
+                )
+                if not line.startswith(("---", "+++"))
+            )
+        elif change.status == "added":
+            body = "\n".join(f"+{line}" for line in change.after.splitlines())
+        else:
+            body = "\n".join(f"-{line}" for line in change.before.splitlines())
+        blocks.append(f"### {title} ({change.status})\n{body}")
+    return "\n\n".join(blocks)
+
+
+# Documents are stored grouped in this order, other types after them
+DOCUMENT_ORDER = ("opportunity", "application")
+_SEPARATOR = "\n\n"
+_MAGIC = b"LVD1"
+
+
+class DocumentSet:
+    """The documents of one upload, sharing one text buffer.
+
+    `bounds` holds `(start, end, first_section, section_count)` per document and
+    `spans` the `section_spans` tuples of every document, both flattened into
+    unsigned int arrays."""
+    __slots__ = ("buffer", "types", "names", "bounds", "spans")
+
+    def __init__(self, buffer: str, types: Sequence[str], names: Sequence[str], bounds: array, spans: array):
+        self.buffer = buffer
+        self.types = tuple(types)
+        self.names = tuple(names)
+        self.bounds = bounds
+        self.spans = spans
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str, str]]) -> "DocumentSet":
+        """From `(doc_type, name, text)` tuples, e.g. the classified files of an upload."""
+        rank = {doc_type: i for i, doc_type in enumerate(DOCUMENT_ORDER)}
+        documents = sorted(
+            ((doc_type, name, text.strip()) for doc_type, name, text in documents),
+            key=lambda document: rank.get(document[0], len(rank)),
+        )
+        buffer = _SEPARATOR.join(text for _, _, text in documents)
+        bounds, spans, position = array("I"), array("I"), 0
+        for _, _, text in documents:
+            sections = section_spans(buffer, position, position + len(text))
+            bounds.extend((position, position + len(text), len(spans) // 5, len(sections)))
+            for span in sections:
+                spans.extend(span)
+            position += len(text) + len(_SEPARATOR)
+        return cls(
+            buffer, [doc_type for doc_type, _, _ in documents], [name for _, name, _ in documents], bounds, spans
+        )
+
+    def __len__(self):
+        return len(self.types)
+
+    def _indices(self, doc_type: str = None) -> List[int]:
+        return [i for i, t in enumerate(self.types) if doc_type is None or t == doc_type]
+
+    def _spans(self, index: int):
+        _, _, first, count = self.bounds[index * 4:index * 4 + 4]
+        for i in range(first, first + count):
+            yield self.spans[i * 5:i * 5 + 5]
+
+    def text(self, doc_type: str = None, exclude: Sequence[str] = ()) -> str:
+        """Text of every document of `doc_type`, joined by a blank line.
+
+        Without `exclude` this is a slice of the buffer per document, a single one when
+        they are adjacent. Otherwise the sections are joined, each with its heading, less
+        those of `exclude` under an EXCLUDABLE_HEADINGS heading."""
+        indices = self._indices(doc_type)
+        if not indices:
+            return ""
+        if not exclude:
+            if indices[-1] - indices[0] == len(indices) - 1:
+                return self.buffer[self.bounds[indices[0] * 4]:self.bounds[indices[-1] * 4 + 1]]
+            return _SEPARATOR.join(self.buffer[self.bounds[i * 4]:self.bounds[i * 4 + 1]] for i in indices)
+        parts = []
+        for index in indices:
+            for kind, h0, h1, b0, b1 in self._spans(index):
+                name = SECTION_KINDS[kind]
+                excluded = name in exclude and self.buffer[h0:h1].lower() in EXCLUDABLE_HEADINGS.get(name, ())
+                if not excluded:
+                    parts.append("\n".join(filter(None, (self.buffer[h0:h1], self.buffer[b0:b1]))))
+        return _SEPARATOR.join(parts)
+
+    def sections(self, doc_type: str = None) -> List[Section]:
+        return [
+            Section(SECTION_KINDS[kind], self.buffer[h0:h1], self.buffer[b0:b1])
+            for index in self._indices(doc_type)
+            for kind, h0, h1, b0, b1 in self._spans(index)
+        ]
+
+    def items(self) -> List[dict]:
+        """`{"type", "name", "content"}` per document, as returned by /upload."""
+        return [
+            {"type": doc_type, "name": name, "content": self.buffer[self.bounds[i * 4]:self.bounds[i * 4 + 1]]}
+            for i, (doc_type, name) in enumerate(zip(self.types, self.names))
+        ]
+
+    def dumps(self) -> bytes:
+        """Compact binary form: UTF-8 buffer, the offset arrays and a small JSON header."""
+        header = json.dumps([self.types, self.names], separators=(",", ":")).encode()
+        buffer = self.buffer.encode("utf-8")
+        bounds, spans = self.bounds.tobytes(), self.spans.tobytes()
+        return b"".join((
+            _MAGIC, struct.pack("<IIII", len(header), len(buffer), len(bounds), len(spans)),
+            header, buffer, bounds, spans,
+        ))
+
+    @classmethod
+    def loads(cls, data: bytes) -> "DocumentSet":
+        if data[:4] != _MAGIC:
+            raise ValueError("Not a serialized DocumentSet")
+        sizes = struct.unpack_from("<IIII", data, 4)
+        position, parts = 4 + struct.calcsize("<IIII"), []
+        for size in sizes:
+            parts.append(data[position:position + size])
+            position += size
+        types, names = json.loads(parts[0])
+        bounds, spans = array("I"), array("I")
+        bounds.frombytes(parts[2])
+        spans.frombytes(parts[3])
+        return cls(parts[1].decode("utf-8"), types, names, bounds, spans)
+
+
+def dump_upload(upload: dict) -> bytes:
+    """An upload as stored: `files` and `previous` as JSON, then `DocumentSet.dumps`."""
+    meta = json.dumps({"files": upload["files"], "previous": upload.get("previous")}, separators=(",", ":")).encode()
+    return struct.pack("<I", len(meta)) + meta + upload["documents"].dumps()
+
+
+def load_upload(data: bytes) -> dict:
+    (size,) = struct.unpack_from("<I", data)
+    upload = json.loads(data[4:4 + size])
+    upload["documents"] = DocumentSet.loads(data[4 + size:])
+    return upload
@@ -0,0 +1,291 @@
+"""Near-duplicate cache for documents.
+
+Re-published job postings and CVs that differ only by a date or a location
+would miss an exact-match cache. Each document is reduced to a MinHash
+signature over word shingles (computed locally, nothing to download) and
+indexed with LSH banding, so a lookup only compares against documents that
+share at least one band. A candidate counts as a hit when its estimated
+Jaccard similarity reaches the threshold and, if `verify` is on, the exact
+similarity of the stored shingle sets agrees. Rejected candidates are counted
+as false positives.
+
+    CLASSIFICATIONS = semantic_cache("classify")
+    hit = CLASSIFICATIONS.get(text)
+    if hit is None:
+        CLASSIFICATIONS.put(text, result)
+
+Entries can be scoped with `namespace`, e.g. evaluations are only shared
+between near-identical applications of one tenant to the same (near-identical)
+opportunity.
+
+With a shared store (STATE_DB_PATH) exact repeats are also shared between
+worker processes: entries are keyed by a digest of namespace and text, stored
+in the shared store on `put` and looked up there after a local miss.
+Near-duplicate matching stays per process.
+"""
+import re, pickle, hashlib, logging, threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from utils.store import STORE, SharedStore
+from configs import SEMANTIC_CACHE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+MAX_HASH = (1 << 32) - 1
+# Sketches of the most recent documents, shared by every cache: one upload is looked
+# up in several (classification, opportunity cluster, evaluation)
+_SKETCH_CACHE_SIZE = 64
+_TOKEN = re.compile(r"\w+")
+
+
+def shingles(text: str, k: int = 3) -> array:
+    """Sorted, de-duplicated 64-bit hashes of the word k-shingles of `text`."""
+    words = _TOKEN.findall(text.lower())
+    if len(words) < k:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = (" ".join(words[i:i + k]) for i in range(len(words) - k + 1))
+    hashes = {int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), "little") for gram in grams}
+    return array("Q", sorted(hashes))
+
+
+def jaccard(a: array, b: array) -> float:
+    if not a and not b:
+        return 1.0
+    sa = set(a)
+    common = sum(1 for value in b if value in sa)
+    return common / (len(a) + len(b) - common)
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """Pick (bands, rows) whose S-curve midpoint (1/bands)^(1/rows) sits a little
+    below `threshold`. Missed near-duplicates are invisible, while extra
+    candidates are filtered by the similarity check, so err towards recall."""
+    threshold = max(0.0, threshold - 0.15)
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        distance = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or distance < best[0]:
+            best = (distance, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    """One min-hash per permutation; a permutation XORs the 64-bit shingle hashes
+    with a random mask. The shingle hashes are already uniformly distributed, and
+    `min(map(mask.__xor__, hashes))` runs in C, where a universal hash per value
+    took about 0.17 s for a 3,000-word document."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        generator = hashlib.sha256(str(seed).encode()).digest()
+        self.masks = [
+            int.from_bytes(hashlib.sha256(generator + i.to_bytes(4, "little")).digest()[:8], "little")
+            for i in range(num_perm)
+        ]
+        self.num_perm = num_perm
+
+    def signature(self, hashes: array) -> Tuple[int, ...]:
+        if not hashes:
+            return (MAX_HASH,) * self.num_perm
+        return tuple(min(map(mask.__xor__, hashes)) & MAX_HASH for mask in self.masks)
+
+
+_SKETCHES: "OrderedDict[Tuple[int, bytes], Tuple[array, Tuple[int, ...]]]" = OrderedDict()
+_SKETCHES_LOCK = threading.Lock()
+
+
+class Hit:
+    __slots__ = ("key", "value", "similarity")
+
+    def __init__(self, key: str, value: Any, similarity: float):
+        self.key = key
+        self.value = value
+        self.similarity = similarity
+
+
+class _Entry:
+    __slots__ = ("namespace", "signature", "shingles", "value")
+
+    def __init__(self, namespace: str, signature: Tuple[int, ...], shingles: array, value: Any):
+        self.namespace = namespace
+        self.signature = signature
+        self.shingles = shingles
+        self.value = value
+
+
+class SemanticCache:
+    def __init__(self, name: str, threshold: float = SEMANTIC_CACHE_THRESHOLD, num_perm: int = 128,
+                 max_entries: int = SEMANTIC_CACHE_SIZE, verify: bool = True, enabled: bool = SEMANTIC_CACHE,
+                 shared: Optional[SharedStore] = STORE):
+        self.name = name
+        self.shared = shared
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.verify = verify
+        self.enabled = enabled
+        self.hasher = MinHasher(num_perm)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.buckets: List[Dict[Tuple[int, ...], set]] = [{} for _ in range(self.bands)]
+        self._lock = threading.Lock()
+        self.lookups = self.hits = self.exact_hits = self.shared_hits = self.candidates = self.false_positives = 0
+
+    def _band_keys(self, signature: Tuple[int, ...]):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    @staticmethod
+    def _key(text: str, namespace: str) -> str:
+        # The same in every process, so exact repeats can be found in the shared store
+        return hashlib.sha256(f"{namespace}\0{text}".encode()).hexdigest()[:32]
+
+    def _shared_get(self, text: str, namespace: str, sketch) -> Optional[Hit]:
+        key = self._key(text, namespace)
+        try:
+            value = self.shared.get(f"semantic:{self.name}", key)
+            value = pickle.loads(value) if value is not None else None
+        except Exception as e:
+            logger.warning(f"Semantic cache '{self.name}' could not read the shared store: {e}")
+            return None
+        if value is None:
+            return None
+        self._insert(key, namespace, value, *sketch)
+        with self._lock:
+            self.hits += 1
+            self.exact_hits += 1
+            self.shared_hits += 1
+        return Hit(key, value, 1.0)
+
+    def sketch(self, text: str):
+        """Shingles and signature of `text`; pass them to `get` and `put` of the same text to hash it once."""
+        if not self.enabled:
+            return None
+        key = (self.hasher.num_perm, hashlib.blake2b(text.encode(), digest_size=16).digest())
+        with _SKETCHES_LOCK:
+            found = _SKETCHES.get(key)
+            if found is not None:
+                _SKETCHES.move_to_end(key)
+                return found
+        hashes = shingles(text)
+        found = (hashes, self.hasher.signature(hashes))
+        with _SKETCHES_LOCK:
+            _SKETCHES[key] = found
+            while len(_SKETCHES) > _SKETCH_CACHE_SIZE:
+                _SKETCHES.popitem(last=False)
+        return found
+
+    def get(self, text: str, namespace: str = "", threshold: float = None, sketch=None) -> Optional[Hit]:
+        if not self.enabled:
+            return None
+        threshold = self.threshold if threshold is None else threshold
+        hashes, signature = sketch or self.sketch(text)
+        with self._lock:
+            self.lookups += 1
+            keys = set()
+            for band, band_key in self._band_keys(signature):
+                keys |= self.buckets[band].get(band_key, set())
+
+            best = None
+            for key in keys:
+                entry = self.entries[key]
+                if entry.namespace != namespace:
+                    continue
+                self.candidates += 1
+                estimate = sum(x == y for x, y in zip(signature, entry.signature)) / len(signature)
+                # With 128 permutations the estimate is only good to a few points; leave the
+                # final call to the exact check
+                if estimate < (threshold - 0.1 if self.verify else threshold):
+                    continue
+                similarity = jaccard(hashes, entry.shingles) if self.verify else estimate
+                if similarity < threshold:
+                    self.false_positives += 1
+                    continue
+                if best is None or similarity > best.similarity:
+                    best = Hit(key, entry.value, similarity)
+
+            if best is not None:
+                self.hits += 1
+                self.exact_hits += int(best.similarity >= 1.0)
+                self.entries.move_to_end(best.key)
+        if best is not None:
+            logger.debug(f"Semantic cache '{self.name}' hit at similarity {best.similarity:.3f}")
+        elif self.shared is not None:
+            best = self._shared_get(text, namespace, (hashes, signature))
+        return best
+
+    def put(self, text: str, value: Any, namespace: str = "", sketch=None) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = self._key(text, namespace)
+        self._insert(key, namespace, value, *(sketch or self.sketch(text)))
+        if self.shared is not None and value is not None:
+            try:
+                self.shared.put(f"semantic:{self.name}", key, pickle.dumps(value))
+            except Exception as e:
+                logger.warning(f"Semantic cache '{self.name}' could not write the shared store: {e}")
+        return key
+
+    def _insert(self, key: str, namespace: str, value: Any, hashes: array, signature: Tuple[int, ...]):
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self._evict(key, previous)
+            self.entries[key] = _Entry(namespace, signature, hashes if self.verify else array("Q"), value)
+            for band, band_key in self._band_keys(signature):
+                self.buckets[band].setdefault(band_key, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._evict(*self.entries.popitem(last=False))
+
+    def _evict(self, key: str, entry: _Entry):
+        for band, band_key in self._band_keys(entry.signature):
+            bucket = self.buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band][band_key]
+
+    def cluster(self, text: str, namespace: str = "") -> str:
+        """Key of a stored near-duplicate of `text`, storing it first if there is none.
+        Useful as a namespace for caches that depend on this document."""
+        if not self.enabled:
+            return hashlib.sha256(text.encode()).hexdigest()
+        sketch = self.sketch(text)
+        hit = self.get(text, namespace, sketch=sketch)
+        if hit is not None:
+            return hit.key
+        return self.put(text, None, namespace, sketch=sketch)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "shared_hits": self.shared_hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else None,
+                "lsh_candidates": self.candidates,
+                "false_positives": self.false_positives,
+                "false_positive_rate": round(self.false_positives / self.candidates, 4) if self.candidates else None,
+                "threshold": self.threshold,
+                "bands": self.bands,
+                "rows": self.rows,
+            }
+
+
+CACHES: Dict[str, SemanticCache] = {}
+
+
+def semantic_cache(name: str, **kwargs) -> SemanticCache:
+    """Process-wide cache registered under `name`, created on first use."""
+    if name not in CACHES:
+        CACHES[name] = SemanticCache(name, **kwargs)
+    return CACHES[name]
+
+
+def semantic_cache_stats() -> Dict[str, Dict]:
+    return {name: cache.stats() for name, cache in CACHES.items()}
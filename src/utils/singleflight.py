@@ -0,0 +1,187 @@
+"""Single-flight coalescing for identical concurrent LLM calls.
+
+Calls with the same fingerprint that overlap in time share one upstream
+request. The first caller (the leader) dispatches it; everyone who arrives
+while it is in flight waits for the same result. Streams are fanned out: a
+pump thread reads the upstream stream into a buffer and every subscriber
+replays it from the start, so late joiners still see the whole response.
+"""
+import json, hashlib, logging, threading, contextvars
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Arguments that change how a call is dispatched but not what it returns
+IGNORED_KWARGS = {"deadline", "hedge", "timeout"}
+
+
+def fingerprint(route: str, sys_prompt: str, message: str, kwargs: Dict, scope: str = "") -> str:
+    """Key of a call; calls are only shared within `scope`, e.g. the tenant the usage is charged to."""
+    payload = {
+        "scope": scope,
+        "route": route,
+        "system": sys_prompt,
+        "message": message,
+        "kwargs": {k: v for k, v in kwargs.items() if k not in IGNORED_KWARGS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class _StreamBuffer:
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+    def pump(self, upstream):
+        try:
+            for chunk in upstream:
+                with self.cond:
+                    if self.subscribers == 0:
+                        # Everyone went away, stop paying for tokens nobody reads
+                        break
+                    self.chunks.append(chunk)
+                    self.cond.notify_all()
+        except BaseException as e:
+            with self.cond:
+                self.error = e
+        finally:
+            close = getattr(upstream, "close", None)
+            if close:
+                close()
+            with self.cond:
+                self.finished = True
+                self.cond.notify_all()
+
+    def subscribe(self, on_leave: Callable) -> "_Subscription":
+        return _Subscription(self, on_leave)
+
+
+class _Subscription:
+    """One caller's replay of a _StreamBuffer.
+
+    The caller is counted as a subscriber from the moment it joins, not from its
+    first `next()`, and leaves exactly once: when the stream ends, when it is
+    closed, or when it is garbage collected without ever being iterated."""
+
+    def __init__(self, buffer: _StreamBuffer, on_leave: Callable):
+        self._buffer = buffer
+        self._on_leave = on_leave
+        self._index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._on_leave is None:
+            raise StopIteration
+        buffer = self._buffer
+        try:
+            with buffer.cond:
+                while self._index >= len(buffer.chunks) and not buffer.finished:
+                    buffer.cond.wait()
+                if self._index < len(buffer.chunks):
+                    self._index += 1
+                    return buffer.chunks[self._index - 1]
+                error = buffer.error
+        except BaseException:
+            self.close()
+            raise
+        self.close()
+        if error is not None:
+            raise error
+        raise StopIteration
+
+    def close(self):
+        on_leave, self._on_leave = self._on_leave, None
+        if on_leave is not None:
+            on_leave()
+
+    __del__ = close
+
+
+class _Call:
+    def __init__(self, stream: bool):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.shared = 0
+        self.buffer = _StreamBuffer() if stream else None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable, stream: bool = False, on_shared: Callable = None):
+        """Run `fn()` once per concurrent `key`. With `stream=True`, `fn` must
+        return an iterator and each caller gets its own replaying iterator.
+        `on_shared` is called for every caller that joins an existing flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(stream)
+                self.leaders += 1
+            else:
+                call.shared += 1
+                self.coalesced += 1
+            if stream:
+                with call.buffer.cond:
+                    call.buffer.subscribers += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            if not stream or call.error is not None:
+                self._forget(key, call)
+            call.done.set()
+            if stream and call.error is None:
+                ctx = contextvars.copy_context()
+                threading.Thread(
+                    target=ctx.run, args=(self._pump, key, call), daemon=True, name="llm-stream-pump"
+                ).start()
+        else:
+            logger.debug(f"Coalesced LLM call {key[:12]} ({call.shared} waiting)")
+            if on_shared:
+                on_shared()
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        if not stream:
+            return call.result
+        return call.buffer.subscribe(lambda: self._leave(key, call))
+
+    def _pump(self, key: str, call: _Call):
+        try:
+            call.buffer.pump(call.result)
+        finally:
+            self._forget(key, call)
+
+    def _leave(self, key: str, call: _Call):
+        with self._lock, call.buffer.cond:
+            call.buffer.subscribers -= 1
+            if call.buffer.subscribers == 0 and self._calls.get(key) is call:
+                # No late joiner may attach to a stream that is being abandoned
+                del self._calls[key]
+
+    def _forget(self, key: str, call: _Call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
@@ -0,0 +1,161 @@
+"""Server-sent events writer.
+
+Handlers yield `SSEEvent`s for discrete messages (status updates, the JSON
+result) and plain strings for streamed LLM tokens:
+
+    async def events():
+        yield status_event("Analysing application...")
+        async for token in iterate_in_thread(structured_output_chat(json_output)):
+            yield token
+
+    return EventSourceResponse(events())
+
+Consecutive tokens are coalesced into one `data:` frame until SSE_MAX_FRAME_BYTES
+is reached or SSE_FLUSH_INTERVAL has passed since the first buffered token. A
+comment frame is sent every SSE_HEARTBEAT seconds of silence so proxies keep the
+connection open. The upstream generator is read through a small bounded queue,
+so a slow client pauses it instead of growing memory.
+
+The upstream runs under its own `CancelScope`. When the response ends early,
+either because Starlette cancels it or because polling `request.is_disconnected()`
+notices the client has gone, the generator is closed and the scope is
+cancelled so LLM calls still running in worker threads stop at their next
+checkpoint.
+"""
+import json, asyncio, logging
+from typing import AsyncIterator, Optional, Union
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from utils.cancellation import CancelScope, cancel_scope_var
+from configs import SSE_FLUSH_INTERVAL, SSE_MAX_FRAME_BYTES, SSE_HEARTBEAT, SSE_DISCONNECT_POLL
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+class SSEEvent:
+    __slots__ = ("data", "event", "id")
+
+    def __init__(self, data: str, event: Optional[str] = None, id: Optional[str] = None):
+        self.data = data
+        self.event = event
+        self.id = id
+
+    def encode(self) -> bytes:
+        return encode_frame(self.data, self.event, self.id)
+
+
+def encode_frame(data: str, event: Optional[str] = None, id: Optional[str] = None) -> bytes:
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    if id:
+        lines.append(f"id: {id}")
+    # Newlines inside the payload must become separate data lines; clients join them back with "\n"
+    lines.extend(f"data: {line}" for line in data.replace("\r\n", "\n").split("\n"))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def status_event(message: str) -> SSEEvent:
+    return SSEEvent(json.dumps({"status": message}), event="status")
+
+
+async def watch_disconnect(request: Request, interval: float = SSE_DISCONNECT_POLL):
+    """Resolve once the client behind `request` has disconnected."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(interval)
+
+
+async def sse_stream(events: AsyncIterator[Union[str, SSEEvent]], request: Request = None,
+                     max_bytes: int = SSE_MAX_FRAME_BYTES, flush_interval: float = SSE_FLUSH_INTERVAL,
+                     heartbeat: float = SSE_HEARTBEAT, queue_size: int = 64) -> AsyncIterator[bytes]:
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size)
+    done = object()
+    scope = CancelScope()
+
+    async def pump():
+        # Everything the upstream awaits or runs in a thread inherits this scope
+        cancel_scope_var.set(scope)
+        try:
+            async for item in events:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(done)
+
+    task = asyncio.create_task(pump())
+    watcher = asyncio.create_task(watch_disconnect(request)) if request is not None else None
+    pending, size, flush_at = [], 0, 0.0
+
+    def flush() -> bytes:
+        nonlocal pending, size
+        frame = encode_frame("".join(pending))
+        pending, size = [], 0
+        return frame
+
+    try:
+        while True:
+            try:
+                # Drain whatever is ready without paying for a timer per token
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = max(0.0, flush_at - loop.time()) if pending else heartbeat
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, watcher} if watcher else {getter}, timeout=timeout,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    if watcher is not None and watcher.done():
+                        logger.info("Client disconnected, cancelling the stream")
+                        return
+                    yield flush() if pending else HEARTBEAT_FRAME
+                    continue
+                item = getter.result()
+
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if isinstance(item, SSEEvent):
+                if pending:
+                    yield flush()
+                yield item.encode()
+                continue
+            if not item:
+                continue
+            if not pending:
+                flush_at = loop.time() + flush_interval
+            pending.append(item)
+            size += len(item)
+            if size >= max_bytes:
+                yield flush()
+
+        if pending:
+            yield flush()
+    finally:
+        # Stop reading tokens nobody will receive
+        scope.cancel()
+        if watcher is not None:
+            watcher.cancel()
+        task.cancel()
+        try:
+            await task
+        except BaseException:
+            pass
+        try:
+            await events.aclose()
+        except Exception:
+            logger.debug("Error while closing SSE upstream", exc_info=True)
+
+
+class EventSourceResponse(StreamingResponse):
+    def __init__(self, events: AsyncIterator[Union[str, SSEEvent]], request: Request = None, status_code: int = 200,
+                 headers: dict = None, **kwargs):
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})}
+        super().__init__(
+            sse_stream(events, request, **kwargs), status_code=status_code, headers=headers,
+            media_type="text/event-stream",
+        )
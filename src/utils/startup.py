@@ -0,0 +1,59 @@
+"""Background warm-up of lazily imported subsystems.
+
+The provider SDKs and the PDF and HTML parsers are imported on first use, so a
+worker answers `/healthz` and `/readyz` as soon as the app module is loaded.
+With WARMUP=1 the same modules are then imported in a daemon thread, so the
+first real request usually finds them loaded already.
+"""
+import time, logging, importlib, threading
+from typing import Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Heaviest first: the first upload needs the parsers, every evaluation the SDKs
+HEAVY_MODULES = (
+    "groq",
+    "openai",
+    "pypdf",
+    "utils.web",
+)
+
+
+class WarmUp:
+    def __init__(self, modules: Iterable[str] = HEAVY_MODULES):
+        self.modules = tuple(modules)
+        self.loaded: Dict[str, float] = {}
+        self.failed: Dict[str, str] = {}
+        self.started = None
+        self.finished = None
+        self._thread = None
+
+    def _run(self):
+        for name in self.modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                self.failed[name] = repr(e)
+                logger.warning(f"Warm-up could not import {name}: {e}")
+                continue
+            self.loaded[name] = round(time.perf_counter() - start, 4)
+        self.finished = time.monotonic()
+        logger.info(f"Warm-up finished in {self.finished - self.started:.2f}s")
+
+    def start(self):
+        if self._thread is None:
+            self.started = time.monotonic()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="warm-up")
+            self._thread.start()
+
+    def status(self) -> Dict:
+        return {
+            "done": self.finished is not None,
+            "seconds": round(self.finished - self.started, 4) if self.finished else None,
+            "loaded": self.loaded,
+            "failed": self.failed,
+        }
+
+
+WARMUP = WarmUp()
@@ -0,0 +1,154 @@
+"""Key-value store shared by the API workers on one host.
+
+With STATE_DB_PATH set, uploads, evaluations and improvements are kept in a
+SQLite file instead of per-process dicts, so any worker can serve any
+`application_id`, and the semantic caches share exact repeats through it too.
+SQLite in WAL mode lets the workers read concurrently while one writes.
+
+    files = StoredMapping(STORE, "files", dump_upload, load_upload)
+    files[application_id] = {"files": [...], "documents": documents}
+    upload = files.get(application_id)
+
+Async handlers use `load` and `save` instead, which run the SQLite call and
+the (un)pickling in a worker thread rather than on the event loop.
+
+Values are pickled: the store is local to the host and written only by the
+workers of the same deployment. A mapping can be given its own `dumps` and
+`loads` instead, as uploads are. Entries expire STATE_TTL seconds after they
+were written.
+"""
+import time, pickle, asyncio, sqlite3, logging, threading
+from collections.abc import MutableMapping
+from typing import Any, Callable, Iterator, Optional
+from configs import STATE_DB_PATH, STATE_TTL
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires REAL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires);
+"""
+
+# Expired rows are deleted every this many writes
+_PURGE_EVERY = 1000
+
+
+class SharedStore:
+    def __init__(self, path: str, ttl: Optional[float] = STATE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread: handlers run on the event loop and in to_thread workers
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, namespace: str, key: str, value: bytes, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        db = self._connection()
+        db.execute(
+            "INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?)",
+            (namespace, key, value, time.time() + ttl if ttl else None),
+        )
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            self.purge()
+
+    def delete(self, namespace: str, key: str):
+        self._connection().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def keys(self, namespace: str) -> Iterator[str]:
+        rows = self._connection().execute(
+            "SELECT key FROM kv WHERE namespace = ? AND (expires IS NULL OR expires > ?)", (namespace, time.time())
+        ).fetchall()
+        return (row[0] for row in rows)
+
+    def count(self, namespace: str) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM kv WHERE namespace = ? AND (expires IS NULL OR expires > ?)", (namespace, time.time())
+        ).fetchone()[0]
+
+    def purge(self):
+        deleted = self._connection().execute("DELETE FROM kv WHERE expires <= ?", (time.time(),)).rowcount
+        if deleted:
+            logger.debug(f"Purged {deleted} expired entries from {self.path}")
+
+
+class StoredMapping(MutableMapping):
+    """Dict interface over one namespace of a SharedStore."""
+
+    def __init__(self, store: SharedStore, namespace: str, dumps: Callable[[Any], bytes] = pickle.dumps,
+                 loads: Callable[[bytes], Any] = pickle.loads):
+        self.store = store
+        self.namespace = namespace
+        self.dumps = dumps
+        self.loads = loads
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.store.get(self.namespace, key)
+        if value is None:
+            raise KeyError(key)
+        return self.loads(value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key is None:
+            return default
+        value = self.store.get(self.namespace, key)
+        return default if value is None else self.loads(value)
+
+    def __setitem__(self, key: str, value: Any):
+        self.store.put(self.namespace, key, self.dumps(value))
+
+    def __delitem__(self, key: str):
+        self.store.delete(self.namespace, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.store.keys(self.namespace)
+
+    def __len__(self) -> int:
+        return self.store.count(self.namespace)
+
+
+STORE = SharedStore(STATE_DB_PATH) if STATE_DB_PATH else None
+
+
+def state_mapping(namespace: str, dumps: Callable[[Any], bytes] = pickle.dumps,
+                  loads: Callable[[bytes], Any] = pickle.loads) -> MutableMapping:
+    """A StoredMapping when STATE_DB_PATH is set, else a plain per-process dict."""
+    return StoredMapping(STORE, namespace, dumps, loads) if STORE is not None else {}
+
+
+async def load(mapping: MutableMapping, key: str, default: Any = None) -> Any:
+    """`mapping.get(key, default)`, off the event loop for a StoredMapping."""
+    if isinstance(mapping, StoredMapping):
+        return await asyncio.to_thread(mapping.get, key, default)
+    return mapping.get(key, default)
+
+
+async def save(mapping: MutableMapping, key: str, value: Any):
+    """`mapping[key] = value`, off the event loop for a StoredMapping."""
+    if isinstance(mapping, StoredMapping):
+        await asyncio.to_thread(mapping.__setitem__, key, value)
+    else:
+        mapping[key] = value
@@ -0,0 +1,88 @@
+"""Precompiled prompt templates.
+
+Each template is parsed once, when `utils.prompts` is imported, into literal
+segments and named slots. Rendering fills the slots into a copy of the segment
+list and joins it, so the template text is never re-parsed. Templates with
+anything but plain `{name}` slots, or whose slots differ from the declared
+ones, fail at import time rather than on the first request.
+
+    REVIEW_CONTEXT = template("review_context", REVIEW_CONTEXT_TEMPLATE, {"opportunity", "application"})
+    sys_prompt = REVIEW_CONTEXT.render(opportunity=..., application=...)
+    REVIEW_CONTEXT.digest  # stable id of the template text, for cache keys
+
+Literal braces are written `{{` and `}}` as with `str.format`.
+"""
+import hashlib
+from string import Formatter
+from typing import Dict, Iterable, Optional
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class Template:
+    __slots__ = ("name", "text", "segments", "positions", "slots", "digest")
+
+    def __init__(self, text: str, name: str = None, slots: Optional[Iterable[str]] = None):
+        self.name = name or "<anonymous>"
+        self.text = text
+        segments, positions = [], []
+        try:
+            parsed = list(Formatter().parse(text))
+        except ValueError as e:
+            raise TemplateError(f"Template '{self.name}': {e}") from None
+
+        literal = []
+        for text_part, field, spec, conversion in parsed:
+            literal.append(text_part)
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                shown = field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "")
+                raise TemplateError(f"Template '{self.name}': only plain named slots are supported, got '{{{shown}}}'")
+            segments.append("".join(literal))
+            literal = []
+            positions.append((len(segments), field))
+            # Placeholder, replaced by the value on every render
+            segments.append(None)
+        segments.append("".join(literal))
+
+        self.segments = tuple(segments)
+        self.positions = tuple(positions)
+        self.slots = frozenset(field for _, field in positions)
+        if slots is not None and self.slots != frozenset(slots):
+            raise TemplateError(
+                f"Template '{self.name}' has slots {sorted(self.slots)}, expected {sorted(slots)}"
+            )
+        self.digest = hashlib.sha256(text.encode()).hexdigest()[:16]
+
+    def render(self, **values) -> str:
+        parts = list(self.segments)
+        try:
+            for position, field in self.positions:
+                value = values[field]
+                parts[position] = value if type(value) is str else str(value)
+        except KeyError as e:
+            raise TemplateError(f"Template '{self.name}' is missing a value for {e}") from None
+        return "".join(parts)
+
+    def __repr__(self):
+        return f"Template({self.name!r}, slots={sorted(self.slots)}, digest={self.digest!r})"
+
+
+TEMPLATES: Dict[str, Template] = {}
+
+
+def template(name: str, text: str, slots: Optional[Iterable[str]] = None) -> Template:
+    """Compile `text` and register it under `name`."""
+    compiled = Template(text, name, slots)
+    existing = TEMPLATES.get(name)
+    if existing is not None and existing.text != text:
+        raise TemplateError(f"Template '{name}' is already registered with different text")
+    TEMPLATES[name] = compiled
+    return compiled
+
+
+def template_digests() -> Dict[str, str]:
+    return {name: compiled.digest for name, compiled in TEMPLATES.items()}
@@ -0,0 +1,261 @@
+"""Lightweight per-request tracing and Prometheus metrics.
+
+Spans are propagated through a context variable, so they follow `await`s and
+`asyncio.to_thread` calls without being passed around explicitly:
+
+    with span("reviewer.feedback", reviewer=reviewer.name):
+        ...
+        increment("retries")
+
+    @traced("bias.analyze")
+    async def analyze_reviews(...): ...
+
+Finished spans update the `lvlr_span_duration_seconds` histogram and, when
+TRACE_EXPORT_PATH is set, are written as JSON lines by a background thread.
+"""
+import os, json, time, uuid, queue, asyncio, inspect, logging, functools, threading, contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from utils.cancellation import RequestCancelled
+from configs import TRACE_EXPORT_PATH
+
+logger = logging.getLogger(__name__)
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _labels(pairs) -> str:
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for key, (counts, total, count) in sorted(self.series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    yield f"{self.name}_bucket{_labels(key + (('le', bound),))} {bucket_count}"
+                yield f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {count}"
+                yield f"{self.name}_sum{_labels(key)} {total}"
+                yield f"{self.name}_count{_labels(key)} {count}"
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.series: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for key, value in sorted(self.series.items()):
+                yield f"{self.name}{_labels(key)} {value}"
+
+
+SPAN_DURATION = Histogram("lvlr_span_duration_seconds", "Duration of traced operations")
+LLM_TOKENS = Counter("lvlr_llm_tokens_total", "Prompt and completion tokens reported by providers")
+SPAN_EVENTS = Counter("lvlr_span_events_total", "Retries, cache hits and other counted span events")
+METRICS = [SPAN_DURATION, LLM_TOKENS, SPAN_EVENTS]
+
+
+def render_prometheus() -> str:
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+class JsonLinesExporter:
+    """Writes finished spans from a background thread so that tracing never
+    does file I/O on the request path. Spans are dropped if the queue is full."""
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        threading.Thread(target=self._run, daemon=True, name="trace-exporter").start()
+
+    def export(self, record: Dict):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a") as f:
+            while True:
+                record = self.queue.get()
+                f.write(json.dumps(record, default=str) + "\n")
+                if self.queue.empty():
+                    f.flush()
+
+
+EXPORTER = JsonLinesExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "attributes", "status")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def increment(self, key: str, amount: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+        SPAN_EVENTS.inc(amount, span=self.name, event=key)
+
+    def end(self, error: BaseException = None):
+        if self.duration is not None:
+            return
+        self.duration = time.time() - self.start
+        if isinstance(error, (GeneratorExit, asyncio.CancelledError, RequestCancelled)):
+            self.status = "cancelled"
+        elif error is not None:
+            self.status = "error"
+            self.attributes["error"] = repr(error)
+        SPAN_DURATION.observe(self.duration, name=self.name, status=self.status)
+        if EXPORTER:
+            EXPORTER.export(self.to_dict())
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def start_span(name: str, **attributes) -> Span:
+    """Start a child of the current span without making it current. Use for
+    work that outlives the calling frame, such as a provider stream."""
+    return Span(name, current_span.get(), **attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    current = Span(name, current_span.get(), **attributes)
+    token = current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    finally:
+        current.end()
+        try:
+            current_span.reset(token)
+        except ValueError:
+            # Async generators may be closed from a different context
+            pass
+
+
+def traced(name: str = None, **attributes):
+    """Decorator form of `span` for sync and async functions."""
+
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+async def trace_stream(name: str, stream, **attributes):
+    """Wrap an async generator (e.g. an SSE response body) in a span that
+    lasts until the stream is exhausted or closed."""
+    with span(name, **attributes) as current:
+        start, chunks = time.perf_counter(), 0
+        async for chunk in stream:
+            if not chunks:
+                current.set(time_to_first_byte=round(time.perf_counter() - start, 4))
+            chunks += 1
+            yield chunk
+        current.set(chunks=chunks)
+
+
+def set_attributes(**attributes):
+    current = current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def increment(key: str, amount: float = 1):
+    current = current_span.get()
+    if current is not None:
+        current.increment(key, amount)
+    else:
+        SPAN_EVENTS.inc(amount, span="none", event=key)
+
+
+def cached_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prompt cache, 0 when not reported."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+def record_usage(usage, route: str, current: Span = None):
+    """Attach provider token usage to a span and the token counters."""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cached = cached_tokens(usage)
+    current = current or current_span.get()
+    if current is not None:
+        current.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_tokens=cached)
+    LLM_TOKENS.inc(prompt_tokens, route=route, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, route=route, kind="completion")
+    LLM_TOKENS.inc(cached, route=route, kind="cached")
@@ -0,0 +1,391 @@
+"""Translation memory for output translated into OTHER_LANGUAGES.
+
+Narrated results repeat the same phrases: headings, labels, "Recommendation:
+accept", score categories and priorities. Before a line is translated it is
+split into segments around its markdown (list markers, emphasis, the " — "
+separator, brackets, colons and commas at the edges). Numbers are replaced
+with placeholders, so "Average score: 7.0/10" and "Average score: 6.5/10"
+share the entry "Average score: {0}". Each segment is then looked up by
+(language, normalized segment):
+
+    - exact: the same normalized segment was translated before
+    - fuzzy: a stored segment with the same placeholders and the same words
+      up to spacing, punctuation and word endings ("potential" and
+      "potentials", not "able" and "unable") is at least
+      TRANSLATION_FUZZY_THRESHOLD similar (`difflib` ratio)
+
+Only the segments found in neither way go to the provider, batched:
+
+    for line in TRANSLATIONS.translate(lines, "Yoruba", translate_output, scope=tenant):
+        yield line
+
+The fixed strings registered with `register_glossary` are translated in one
+request the first time a language is used. TRANSLATION_GLOSSARY can name a
+JSON file of curated translations, {"Yoruba": {"Strengths": "..."}}. Those
+are used as they are and never replaced.
+
+Only the glossary is written to a SQLite file (TRANSLATION_MEMORY_PATH) shared
+by the workers of a host. The rest is free text from CVs and evaluations: its
+translations are kept in memory per `scope` (the tenant) and language, for at
+most TRANSLATION_CACHE_TTL seconds and TRANSLATION_MEMORY_SIZE segments per
+scope. Fuzzy matches are looked for among those and the glossary.
+"""
+import os, re, json, time, sqlite3, difflib, logging, threading, unicodedata
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from configs import (
+    TRANSLATION_MEMORY_PATH, TRANSLATION_MEMORY_SIZE, TRANSLATION_CACHE_TTL, TRANSLATION_FUZZY_THRESHOLD,
+    TRANSLATION_BATCH_SIZE, TRANSLATION_GLOSSARY,
+)
+
+logger = logging.getLogger(__name__)
+
+# Translates a batch of segments into a language: one translation per segment, in
+# order, or None for a segment it could not translate
+TranslateBatch = Callable[[List[str], str], List[Optional[str]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS glossary (
+    language TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    translation TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (language, segment)
+);
+"""
+
+_PREFIX = re.compile(r"^\s*(?:#{1,6}\s+|[-*+]\s+|\d+[.)]\s+)?")
+_SPLIT = re.compile(r"(\*{1,2}|\s+—\s+)")
+_EDGES = re.compile(r"^([\s(:,]*)(.*?)([\s):,]*)$", re.S)
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*(?:/\d+)?")
+_PLACEHOLDER = re.compile(r"\{(\d+)\}")
+_SPACES = re.compile(r"\s+")
+_WORDS = re.compile(r"\w+")
+# Shorter segments differ too much with each character for a fuzzy match to be safe
+_FUZZY_MIN_LENGTH = 20
+# Fuzzy matches are looked for among the glossary and this many most recently used segments
+_FUZZY_CANDIDATES = 2000
+
+
+def normalize(text: str) -> str:
+    return _SPACES.sub(" ", unicodedata.normalize("NFC", text)).strip().casefold()
+
+
+def mask_numbers(text: str) -> Tuple[str, List[str]]:
+    """"2 high priority, 1 low priority" -> ("{0} high priority, {1} low priority", ["2", "1"])."""
+    numbers = []
+
+    def placeholder(match):
+        numbers.append(match.group())
+        return f"{{{len(numbers) - 1}}}"
+
+    return _NUMBER.sub(placeholder, text), numbers
+
+
+def fill_numbers(text: str, numbers: List[str]) -> Optional[str]:
+    """Put the numbers back, or None when the translation lost or invented a placeholder."""
+    if sorted(map(int, _PLACEHOLDER.findall(text))) != list(range(len(numbers))):
+        return None
+    return _PLACEHOLDER.sub(lambda match: numbers[int(match.group(1))], text)
+
+
+def _same_placeholders(text: str, translation: str) -> bool:
+    return sorted(_PLACEHOLDER.findall(text)) == sorted(_PLACEHOLDER.findall(translation))
+
+
+def _same_words(text: str, candidate: str) -> bool:
+    """Whether two segments differ only in spacing, punctuation and word endings."""
+    words, others = _WORDS.findall(text), _WORDS.findall(candidate)
+    if len(words) != len(others):
+        return False
+    for word, other in zip(words, others):
+        if word == other:
+            continue
+        shared = len(os.path.commonprefix((word, other)))
+        # An inflection or spelling variant keeps all but the last couple of letters
+        if shared < max(3, min(len(word), len(other)) - 2):
+            return False
+    return True
+
+
+def segment(line: str) -> List[Tuple[bool, str]]:
+    """Split a line into (translatable, text) pieces that join back into the line."""
+    prefix = _PREFIX.match(line).group()
+    pieces = [(False, prefix)] if prefix else []
+    for part in _SPLIT.split(line[len(prefix):]):
+        if not part:
+            continue
+        if _SPLIT.fullmatch(part):
+            pieces.append((False, part))
+            continue
+        before, text, after = _EDGES.match(part).groups()
+        # Keep "Python (Django)" whole rather than splitting off its closing bracket
+        while after.startswith(")") and text.count("(") > text.count(")"):
+            text, after = text + ")", after[1:]
+        if before:
+            pieces.append((False, before))
+        if text:
+            # Numbers, scores and punctuation alone are left as they are
+            pieces.append((any(c.isalpha() for c in text), text))
+        if after:
+            pieces.append((False, after))
+    return pieces
+
+
+class TranslationMemory:
+    def __init__(self, path: Optional[str] = TRANSLATION_MEMORY_PATH, size: int = TRANSLATION_MEMORY_SIZE,
+                 fuzzy_threshold: float = TRANSLATION_FUZZY_THRESHOLD, batch_size: int = TRANSLATION_BATCH_SIZE,
+                 curated: Optional[str] = TRANSLATION_GLOSSARY, ttl: float = TRANSLATION_CACHE_TTL):
+        self.path = path
+        self.size = size
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self.batch_size = batch_size
+        self.stats = {"exact": 0, "fuzzy": 0, "translated": 0, "requests": 0}
+        self._lock = threading.Lock()
+        # (scope, language) -> key -> (translation, stored at), most recently stored last, up to `size` each
+        self._recent: Dict[Tuple[str, str], "OrderedDict[str, Tuple[str, float]]"] = {}
+        # language -> key -> translation; never evicted
+        self._glossary: Dict[str, Dict[str, str]] = {}
+        self._curated: Dict[str, Dict[str, str]] = {}
+        self._glossary_texts: List[str] = []
+        self._seeded = set()
+        # The file is created on first use, not when the module is imported
+        self._created = False
+        if curated:
+            with open(curated) as f:
+                for language, entries in json.load(f).items():
+                    self._curated[language] = {
+                        self.key(text): translation for text, translation in entries.items()
+                    }
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        if not self._created:
+            db.executescript(_SCHEMA)
+            self._created = True
+        return db
+
+    @staticmethod
+    def key(text: str) -> str:
+        return normalize(mask_numbers(text)[0])
+
+    def register_glossary(self, texts: Iterable[str]):
+        """Fixed strings to translate in one request when a language is first used."""
+        with self._lock:
+            self._glossary_texts.extend(text for text in texts if text not in self._glossary_texts)
+            self._seeded.clear()
+
+    def _stored(self, language: str, keys: List[str]) -> Dict[str, str]:
+        if not self.path or not keys:
+            return {}
+        db = self._connect()
+        try:
+            found = {}
+            # Under SQLite's default limit of 999 variables per statement
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                found.update(db.execute(
+                    f"SELECT segment, translation FROM glossary WHERE language = ? "
+                    f"AND segment IN ({', '.join('?' * len(chunk))})",
+                    (language, *chunk),
+                ).fetchall())
+            return found
+        finally:
+            db.close()
+
+    def _store_glossary(self, language: str, entries: Dict[str, str]):
+        if not self.path or not entries:
+            return
+        db = self._connect()
+        try:
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO glossary VALUES (?, ?, ?, ?)",
+                    [(language, key, translation, time.time()) for key, translation in entries.items()],
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store {len(entries)} glossary translations: {e}")
+        finally:
+            db.close()
+
+    def _recent_entries(self, scope: str, language: str) -> "OrderedDict[str, Tuple[str, float]]":
+        """The live entries of a scope; expired ones are dropped on the way."""
+        recent = self._recent.get((scope, language))
+        if recent is None:
+            return OrderedDict()
+        # Oldest first, so the expired ones are at the front
+        expired = time.monotonic() - self.ttl
+        while recent and next(iter(recent.values()))[1] < expired:
+            recent.popitem(last=False)
+        if not recent:
+            del self._recent[(scope, language)]
+        return recent
+
+    def _remember(self, scope: str, language: str, entries: Dict[str, str]):
+        now = time.monotonic()
+        if (scope, language) not in self._recent:
+            # A new scope: forget the scopes nothing was stored in for a TTL
+            self._recent = {
+                name: recent for name, recent in self._recent.items()
+                if recent and next(reversed(recent.values()))[1] >= now - self.ttl
+            }
+        recent = self._recent.setdefault((scope, language), OrderedDict())
+        for key, translation in entries.items():
+            recent[key] = (translation, now)
+            recent.move_to_end(key)
+        while len(recent) > self.size:
+            recent.popitem(last=False)
+
+    def _fuzzy(self, key: str, candidates: List[Tuple[str, str]]) -> Optional[str]:
+        if self.fuzzy_threshold >= 1 or len(key) < _FUZZY_MIN_LENGTH:
+            return None
+        placeholders = _PLACEHOLDER.findall(key)
+        slack = len(key) * (1 - self.fuzzy_threshold)
+        matcher = difflib.SequenceMatcher(b=key, autojunk=False)
+        best, best_ratio = None, self.fuzzy_threshold
+        for candidate, translation in candidates:
+            if abs(len(candidate) - len(key)) > slack or _PLACEHOLDER.findall(candidate) != placeholders:
+                continue
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() >= best_ratio and matcher.quick_ratio() >= best_ratio:
+                ratio = matcher.ratio()
+                if ratio >= best_ratio and _same_words(key, candidate):
+                    best, best_ratio = translation, ratio
+        return best
+
+    def lookup(self, language: str, keys: List[str], scope: str = "") -> Dict[str, str]:
+        """Translations of the keys found exactly or fuzzily; the others are missing."""
+        found, missing = {}, []
+        with self._lock:
+            curated, glossary = self._curated.get(language, {}), self._glossary.get(language, {})
+            recent = self._recent_entries(scope, language)
+            for key in keys:
+                translation = curated.get(key) or glossary.get(key)
+                if translation is None and key in recent:
+                    translation = recent[key][0]
+                if translation is None:
+                    missing.append(key)
+                else:
+                    found[key] = translation
+            self.stats["exact"] += len(found)
+            candidates = [
+                *glossary.items(),
+                *((key, translation) for key, (translation, _) in islice(reversed(recent.items()), _FUZZY_CANDIDATES)),
+            ] if missing else []
+        for key in missing:
+            if (translation := self._fuzzy(key, candidates)) is not None:
+                found[key] = translation
+                with self._lock:
+                    self.stats["fuzzy"] += 1
+        return found
+
+    def _request(self, texts: List[str], language: str, translate_batch: TranslateBatch) -> List[Optional[str]]:
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["translated"] += len(texts)
+        return translate_batch(texts, language)
+
+    def seed(self, language: str, translate_batch: TranslateBatch):
+        """Translate the glossary into `language`, once per process."""
+        with self._lock:
+            if language in self._seeded:
+                return
+            curated = self._curated.get(language, {})
+            texts = {
+                self.key(text): mask_numbers(text)[0].strip() for text in self._glossary_texts
+                if self.key(text) not in curated
+            }
+        known = self._stored(language, list(texts))
+        novel = {key: text for key, text in texts.items() if key not in known}
+        if novel:
+            translations = self._request(list(novel.values()), language, translate_batch)
+            entries = {
+                key: translation for (key, text), translation in zip(novel.items(), translations)
+                if translation and _same_placeholders(text, translation)
+            }
+            self._store_glossary(language, entries)
+            known.update(entries)
+        with self._lock:
+            self._glossary[language] = known
+            self._seeded.add(language)
+
+    def _translate_novel(self, language: str, novel: Dict[str, str], translate_batch: TranslateBatch,
+                         scope: str) -> Dict[str, str]:
+        """Send the novel segments in one request and remember the usable translations."""
+        results = self._request(list(novel.values()), language, translate_batch)
+        translations = {
+            key: translation for (key, masked), translation in zip(novel.items(), results)
+            if translation and _same_placeholders(masked, translation)
+        }
+        with self._lock:
+            self._remember(scope, language, translations)
+        return translations
+
+    def _assemble(self, language: str, lines: List[Tuple[List, Dict[str, str]]],
+                  translate_batch: TranslateBatch) -> Iterator[str]:
+        """Join the pieces of each line with their translations. Segments without a usable
+        translation are sent again as they are, all in one request, not remembered, and
+        left untranslated if that fails too."""
+        filled = [
+            [
+                piece if type(piece) is str else
+                fill_numbers(known[piece[0]], piece[2]) if piece[0] in known else None
+                for piece in pieces
+            ]
+            for pieces, known in lines
+        ]
+        failed = list(dict.fromkeys(
+            piece[3] for (pieces, _), texts in zip(lines, filled)
+            for piece, text in zip(pieces, texts) if text is None
+        ))
+        retried = dict(zip(failed, self._request(failed, language, translate_batch))) if failed else {}
+        for (pieces, _), texts in zip(lines, filled):
+            yield "".join(
+                text if text is not None else retried.get(piece[3]) or piece[3]
+                for piece, text in zip(pieces, texts)
+            )
+
+    def translate(self, lines: Iterable[str], language: str, translate_batch: TranslateBatch,
+                  scope: str = "") -> Iterator[str]:
+        """
+        Yield `lines` translated into `language`, in order. Lines the memory covers
+        are yielded at once; the others wait until `batch_size` novel segments have
+        been collected or the lines run out. Free text is only reused within `scope`.
+        """
+        self.seed(language, translate_batch)
+        # (pieces, translations known for them) per line waiting for the next request
+        pending: List[Tuple[List, Dict[str, str]]] = []
+        novel: Dict[str, str] = {}
+        for line in (line for text in lines for line in text.splitlines(keepends=True)):
+            pieces = []
+            for translatable, text in segment(line):
+                if translatable:
+                    masked, numbers = mask_numbers(text)
+                    pieces.append((normalize(masked), masked, numbers, text))
+                else:
+                    pieces.append(text)
+            keys = [piece[0] for piece in pieces if type(piece) is tuple]
+            known = self.lookup(language, keys, scope) if keys else {}
+            missing = {piece[0]: piece[1] for piece in pieces if type(piece) is tuple and piece[0] not in known}
+            if not pending and not missing:
+                yield from self._assemble(language, [(pieces, known)], translate_batch)
+                continue
+            pending.append((pieces, known))
+            novel.update(missing)
+            if len(novel) >= self.batch_size:
+                translations = self._translate_novel(language, novel, translate_batch, scope)
+                yield from self._assemble(
+                    language, [(pieces, {**known, **translations}) for pieces, known in pending], translate_batch
+                )
+                pending, novel = [], {}
+        if pending:
+            translations = self._translate_novel(language, novel, translate_batch, scope) if novel else {}
+            yield from self._assemble(
+                language, [(pieces, {**known, **translations}) for pieces, known in pending], translate_batch
+            )
+
+
+TRANSLATIONS = TranslationMemory()
@@ -0,0 +1,395 @@
+"""Per-tenant accounting of LLM token usage and cost, with quotas.
+
+Every provider response that reports usage is charged to the caller's tenant
+(the API key it sent, hashed, or "anonymous") and `application_id`, by route
+and model. Totals are kept in memory and added to a SQLite table every
+USAGE_FLUSH_INTERVAL seconds, so they survive restarts and are shared by
+workers on the same host. Without a database path the charges stay in memory
+and days older than USAGE_MEMORY_DAYS are dropped.
+
+Before a call is dispatched the tenant's spend for the current UTC day and
+the application's total spend are checked against USAGE_QUOTAS, e.g.
+
+    {"tenant": {"tokens_per_day": 2000000, "usd_per_day": 5},
+     "application": {"tokens": 500000},
+     "overrides": {"key:3f2a9c1e0b7d4a55": {"usd_per_day": 50}}}
+
+and `QuotaExceeded` is raised when one is used up. Calls already in flight
+are not counted until they finish, so a tenant can overshoot by at most those.
+With several workers on one database, each re-reads the totals it checks once
+they are a flush interval old, so other workers' charges count after at most
+about two flush intervals.
+"""
+import json, time, sqlite3, hashlib, logging, threading, contextvars
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from utils.scheduler import application_id_var
+from utils.tracing import cached_tokens
+from configs import USAGE_DB_PATH, USAGE_FLUSH_INTERVAL, USAGE_MEMORY_DAYS, USAGE_QUOTAS, LLM_PRICES
+
+logger = logging.getLogger(__name__)
+
+# Set by the API from the X-API-Key header, inherited by asyncio.to_thread
+api_key_var = contextvars.ContextVar("api_key", default=None)
+
+# USD per million prompt and completion tokens
+DEFAULT_PRICES = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.1-70b-versatile": (0.59, 0.79),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+# Share of the prompt price charged for prompt tokens served from the provider's cache
+CACHED_PROMPT_RATE = 0.5
+
+DEFAULT_QUOTAS = {
+    "tenant": {"tokens_per_day": None, "usd_per_day": None},
+    "application": {"tokens": 500000, "usd": None},
+    "overrides": {},
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_usage (
+    day TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    application_id TEXT NOT NULL,
+    route TEXT NOT NULL,
+    model TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    cached_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (day, tenant, application_id, route, model)
+);
+CREATE INDEX IF NOT EXISTS llm_usage_application ON llm_usage (application_id);
+"""
+_UPSERT = """
+INSERT INTO llm_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, tenant, application_id, route, model) DO UPDATE SET
+    calls = calls + excluded.calls,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    cached_tokens = cached_tokens + excluded.cached_tokens,
+    cost = cost + excluded.cost
+"""
+_TOTALS = "SUM(calls), SUM(prompt_tokens), SUM(completion_tokens), SUM(cached_tokens), SUM(cost)"
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, scope: str, subject: str, limit: str, used: float, allowed: float):
+        self.scope = scope
+        self.subject = subject
+        self.limit = limit
+        self.used = used
+        self.allowed = allowed
+        super().__init__(f"{scope} '{subject}' has used {used:g} of its {allowed:g} {limit} quota")
+
+
+def tenant_id(api_key: Optional[str] = None) -> str:
+    """Stable, non-secret id for an API key."""
+    if not api_key:
+        return "anonymous"
+    return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def current_tenant() -> str:
+    return tenant_id(api_key_var.get())
+
+
+def _today(offset: int = 0) -> str:
+    return (datetime.now(timezone.utc).date() - timedelta(days=offset)).isoformat()
+
+
+class UsageTotals:
+    __slots__ = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "cost")
+
+    def __init__(self, calls=0, prompt_tokens=0, completion_tokens=0, cached_tokens=0, cost=0.0):
+        self.calls = calls or 0
+        self.prompt_tokens = prompt_tokens or 0
+        self.completion_tokens = completion_tokens or 0
+        self.cached_tokens = cached_tokens or 0
+        self.cost = cost or 0.0
+
+    def add(self, other: "UsageTotals"):
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cached_tokens += other.cached_tokens
+        self.cost += other.cost
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def as_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "tokens": self.tokens,
+            "cost_usd": round(self.cost, 6),
+        }
+
+
+def load_quotas(config: Optional[str] = USAGE_QUOTAS) -> Dict:
+    """USAGE_QUOTAS merged over DEFAULT_QUOTAS, section by section."""
+    if not config:
+        return DEFAULT_QUOTAS
+    loaded = json.loads(config)
+    return {**DEFAULT_QUOTAS, **{key: {**DEFAULT_QUOTAS.get(key, {}), **value} for key, value in loaded.items()}}
+
+
+class UsageLedger:
+    def __init__(self, path: Optional[str] = USAGE_DB_PATH, prices: Dict = None, quotas: Dict = None,
+                 flush_interval: float = USAGE_FLUSH_INTERVAL, max_applications: int = 10000,
+                 memory_days: int = USAGE_MEMORY_DAYS):
+        self.path = path
+        self.memory_days = memory_days
+        self.prices = {**DEFAULT_PRICES, **(prices or {})}
+        self.quotas = quotas or DEFAULT_QUOTAS
+        self.flush_interval = flush_interval
+        self.max_applications = max_applications
+        self._lock = threading.Lock()
+        # Not yet written (without a database: all of them), (day, tenant, application_id, route, model) -> totals
+        self._pending: Dict[Tuple[str, str, str, str, str], UsageTotals] = {}
+        # Running totals for quota checks and when they were loaded from the database,
+        # reloaded every flush interval to pick up other workers' charges
+        self._tenants: Dict[Tuple[str, str], Tuple[UsageTotals, float]] = {}
+        self._applications: "OrderedDict[str, Tuple[UsageTotals, float]]" = OrderedDict()
+        # Charges being written by `flush`, and how many flushes have started
+        self._flushing: Optional[Dict[Tuple[str, str, str, str, str], UsageTotals]] = None
+        self._flushes = 0
+        self._stop = threading.Event()
+        self._thread = None
+        # The file is created on first use, not when the module is imported
+        self._created = False
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        if not self._created:
+            db.executescript(_SCHEMA)
+            self._created = True
+        return db
+
+    def _query(self, sql: str, parameters=()) -> List[tuple]:
+        if not self.path:
+            return []
+        db = self._connect()
+        try:
+            return db.execute(sql, parameters).fetchall()
+        finally:
+            db.close()
+
+    def price(self, model: str, prompt_tokens: int, completion_tokens: int, cached: int = 0) -> float:
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        prompt_cost = (prompt_tokens - cached + cached * CACHED_PROMPT_RATE) * prompt_price
+        return (prompt_cost + completion_tokens * completion_price) / 1e6
+
+    def _pending_totals(self, matches, flushing: bool = False) -> UsageTotals:
+        totals = UsageTotals()
+        for charges in (self._pending, self._flushing if flushing else None):
+            for key, value in (charges or {}).items():
+                if matches(key):
+                    totals.add(value)
+        return totals
+
+    def _stale(self, loaded_at: float) -> bool:
+        # Other workers' charges only reach this one through the database
+        return bool(self.path) and time.monotonic() - loaded_at >= self.flush_interval
+
+    def _load(self, cache: Dict, key, sql: str, parameters: tuple, matches) -> UsageTotals:
+        """Totals cached under `key`, re-read from the database when missing or stale.
+
+        The database is read outside the lock, so a slow or locked file delays only
+        this check, not every call that records usage. When a flush overlapped the
+        read the rows being flushed may or may not be in it: the cached totals are
+        kept, or without any the flushed rows are counted on top (an overestimate)."""
+        with self._lock:
+            cached = cache.get(key)
+            if cached is not None and not self._stale(cached[1]):
+                return cached[0]
+            epoch, busy = self._flushes, self._flushing is not None
+        try:
+            rows = self._query(sql, parameters)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read LLM usage totals: {e}")
+            rows, busy = None, True
+        totals = UsageTotals(*rows[0]) if rows else UsageTotals()
+        with self._lock:
+            if busy or self._flushes != epoch:
+                if cached is not None:
+                    return cached[0]
+                totals.add(self._pending_totals(matches, flushing=True))
+                return totals
+            totals.add(self._pending_totals(matches))
+            cache[key] = (totals, time.monotonic())
+            return totals
+
+    def _tenant_totals(self, day: str, tenant: str) -> UsageTotals:
+        with self._lock:
+            # Only today's totals are checked, drop earlier days
+            for key in [key for key in self._tenants if key[0] != day]:
+                del self._tenants[key]
+        return self._load(
+            self._tenants, (day, tenant), f"SELECT {_TOTALS} FROM llm_usage WHERE day = ? AND tenant = ?",
+            (day, tenant), lambda key: key[0] == day and key[1] == tenant,
+        )
+
+    def _application_totals(self, application_id: str) -> UsageTotals:
+        totals = self._load(
+            self._applications, application_id, f"SELECT {_TOTALS} FROM llm_usage WHERE application_id = ?",
+            (application_id,), lambda key: key[2] == application_id,
+        )
+        with self._lock:
+            if application_id in self._applications:
+                self._applications.move_to_end(application_id)
+            while len(self._applications) > self.max_applications:
+                self._applications.popitem(last=False)
+        return totals
+
+    def record(self, route: str, model: str, usage, tenant: str = None, application_id: str = None):
+        """Charge a provider response's `usage` to the tenant and application of the current request."""
+        if usage is None:
+            return
+        tenant = tenant or current_tenant()
+        application_id = application_id or application_id_var.get() or ""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cached = cached_tokens(usage)
+        charge = UsageTotals(1, prompt_tokens, completion_tokens, cached,
+                             self.price(model, prompt_tokens, completion_tokens, cached))
+        day = _today()
+        with self._lock:
+            self._pending.setdefault((day, tenant, application_id, route, model), UsageTotals()).add(charge)
+            if (day, tenant) in self._tenants:
+                self._tenants[(day, tenant)][0].add(charge)
+            if application_id in self._applications:
+                self._applications[application_id][0].add(charge)
+
+    def limits(self, tenant: str) -> Dict:
+        return {**self.quotas["tenant"], **self.quotas["overrides"].get(tenant, {})}
+
+    def check(self, tenant: str = None, application_id: str = None):
+        """Raise QuotaExceeded if the tenant or application has used up a quota."""
+        tenant = tenant or current_tenant()
+        application_id = application_id or application_id_var.get()
+        limits, application_limits = self.limits(tenant), self.quotas["application"]
+        if limits.get("tokens_per_day") is not None or limits.get("usd_per_day") is not None:
+            totals = self._tenant_totals(_today(), tenant)
+            for limit, used in (("tokens_per_day", totals.tokens), ("usd_per_day", totals.cost)):
+                if limits.get(limit) is not None and used >= limits[limit]:
+                    raise QuotaExceeded("tenant", tenant, limit, used, limits[limit])
+        if application_id and any(application_limits.get(limit) is not None for limit in ("tokens", "usd")):
+            totals = self._application_totals(application_id)
+            for limit, used in (("tokens", totals.tokens), ("usd", totals.cost)):
+                if application_limits.get(limit) is not None and used >= application_limits[limit]:
+                    raise QuotaExceeded("application", application_id, limit, used, application_limits[limit])
+
+    def flush(self):
+        with self._lock:
+            if not self.path:
+                # Nothing to write to: the pending charges are the totals, keep the last days of them
+                oldest = _today(self.memory_days - 1)
+                self._pending = {key: value for key, value in self._pending.items() if key[0] >= oldest}
+                return
+            if not self._pending or self._flushing is not None:
+                return
+            # Written outside the lock; `_load` knows the rows may be on either side meanwhile
+            self._flushing, self._pending = self._pending, {}
+            self._flushes += 1
+        rows = [
+            (*key, value.calls, value.prompt_tokens, value.completion_tokens, value.cached_tokens, value.cost)
+            for key, value in self._flushing.items()
+        ]
+        try:
+            db = self._connect()
+            try:
+                with db:
+                    db.executemany(_UPSERT, rows)
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not flush LLM usage, keeping it for the next flush: {e}")
+            with self._lock:
+                for key, value in self._flushing.items():
+                    self._pending.setdefault(key, UsageTotals()).add(value)
+                self._flushing = None
+            return
+        with self._lock:
+            self._flushing = None
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="usage-flush")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _memory_summary(self, tenant: str, application_id: Optional[str], since: str):
+        by_day, by_route = {}, {}
+        with self._lock:
+            for (day, key_tenant, key_application, route, model), value in self._pending.items():
+                if key_tenant != tenant or day < since or (application_id and key_application != application_id):
+                    continue
+                by_day.setdefault(day, UsageTotals()).add(value)
+                by_route.setdefault((route, model), UsageTotals()).add(value)
+        return sorted(by_day.items()), sorted(by_route.items())
+
+    def summary(self, tenant: str, application_id: str = None, days: int = 7) -> Dict:
+        """Usage of `tenant` (optionally one of its applications) over the last `days` UTC days."""
+        self.flush()
+        since = _today(max(days - 1, 0))
+        if self.path:
+            where, parameters = "tenant = ? AND day >= ?", [tenant, since]
+            if application_id:
+                where += " AND application_id = ?"
+                parameters.append(application_id)
+            by_day = [
+                (row[0], UsageTotals(*row[1:]))
+                for row in self._query(
+                    f"SELECT day, {_TOTALS} FROM llm_usage WHERE {where} GROUP BY day ORDER BY day", parameters
+                )
+            ]
+            by_route = [
+                ((row[0], row[1]), UsageTotals(*row[2:]))
+                for row in self._query(
+                    f"SELECT route, model, {_TOTALS} FROM llm_usage WHERE {where} "
+                    "GROUP BY route, model ORDER BY route, model",
+                    parameters,
+                )
+            ]
+        else:
+            by_day, by_route = self._memory_summary(tenant, application_id, since)
+        total = UsageTotals()
+        for _, totals in by_day:
+            total.add(totals)
+        today = self._tenant_totals(_today(), tenant)
+        return {
+            "tenant": tenant,
+            "application_id": application_id,
+            "days": days,
+            "total": total.as_dict(),
+            "today": today.as_dict(),
+            "limits": self.limits(tenant),
+            "by_day": [{"day": day, **totals.as_dict()} for day, totals in by_day],
+            "by_route": [{"route": route, "model": model, **totals.as_dict()} for (route, model), totals in by_route],
+        }
+
+LEDGER = UsageLedger(
+    USAGE_DB_PATH or None,
+    {model: tuple(price) for model, price in json.loads(LLM_PRICES).items()} if LLM_PRICES else None,
+    load_quotas(),
+)
@@ -1,12 +1,11 @@
 """Beautiful Soup Web scraper."""
-import os, traceback, requests, logging, asyncio
+import os, traceback, requests, logging, asyncio, contextvars
 from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, cast
 from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError, CancelledError
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 
-from llama_index.core.readers.base import BaseReader
-from llama_index.core.schema import Document
+from utils.tracing import span, traced, set_attributes
 
 """Simple Web scraper."""
 # from langchain.requests import RequestsWrapper
@@ -14,6 +13,25 @@ from llama_index.core.schema import Document
 logger = logging.getLogger(__name__)
 
 
+class Document:
+    """Text of a scraped page with its metadata (URL, title, ...)."""
+    __slots__ = ("text", "extra_info")
+
+    def __init__(self, text: str = "", extra_info: Optional[Dict[str, Any]] = None) -> None:
+        self.text = text
+        self.extra_info = extra_info or {}
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.extra_info
+
+    def get_text(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"Document({len(self.text)} chars, extra_info={self.extra_info!r})"
+
+
 def _substack_reader(soup: Any, **kwargs) -> Tuple[str, Dict[str, Any]]:
     """Extract text from Substack blog post."""
     extra_info = {
@@ -135,7 +153,7 @@ DEFAULT_WEBSITE_EXTRACTOR: Dict[
 }
 
 
-class BeautifulSoupWebReader(BaseReader):
+class BeautifulSoupWebReader:
     """BeautifulSoup web page reader.
 
     Reads pages from the web.
@@ -179,7 +197,7 @@ class BeautifulSoupWebReader(BaseReader):
                 page = requests.get(url)
             except Exception:
                 # raise ValueError(f"One of the inputs is not a valid url: {url}")
-                print(f"One of the inputs is not a valid url: {url}")
+                logger.warning(f"One of the inputs is not a valid url: {url}")
                 documents.append(Document(text="", extra_info={"URL": url}))
 
             hostname = custom_hostname or urlparse(url).hostname or ""
@@ -208,7 +226,18 @@ class BeautifulSoupWebReader(BaseReader):
         include_url_in_text: Optional[bool], 
         # website_extractor: dict
     ) -> Document:
-        
+        with span("web.fetch", url=url) as current:
+            document = self._fetch(url, custom_hostname, include_url_in_text)
+            current.set(chars=len(document.text))
+        return document
+
+    def _fetch(
+        self,
+        url: str,
+        custom_hostname: Optional[str],
+        include_url_in_text: Optional[bool],
+    ) -> Document:
+
         try:
             page = requests.get(url)
         except Exception:
@@ -232,6 +261,7 @@ class BeautifulSoupWebReader(BaseReader):
 
         return Document(text=data, extra_info=extra_info)
 
+    @traced("web.multi_load_data")
     async def multi_load_data(
         self,
         urls: List[str],
@@ -253,12 +283,16 @@ class BeautifulSoupWebReader(BaseReader):
         """
         documents = []
         loop = asyncio.get_running_loop()
+        set_attributes(urls=len(urls))
 
         workers = len(urls) if len(urls) < os.cpu_count() else os.cpu_count()
         executor = ThreadPoolExecutor(max_workers=workers or None)
 
         future_to_url = [
-            loop.run_in_executor(executor, self.fetch, url, custom_hostname, include_url_in_text)
+            # run_in_executor does not propagate contextvars, so copy them for the trace context
+            loop.run_in_executor(
+                executor, contextvars.copy_context().run, self.fetch, url, custom_hostname, include_url_in_text
+            )
             for url in urls
         ]
         
@@ -274,7 +308,6 @@ class BeautifulSoupWebReader(BaseReader):
 
             documents.append(document or Document(text="", extra_info={"URL": urls[idx]}))
 
-        print("Completed web scraping, exiting loop...")
-        print("Returning documents...")
+        logger.debug(f"Completed web scraping of {len(urls)} URLs")
         return documents
 
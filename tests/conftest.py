@@ -0,0 +1,15 @@
+"""Shared setup for the unit tests.
+
+`configs` reads the environment when it is imported, so this runs before any
+module under `src/` is. Usage totals and translations stay in memory, and
+nothing is shared through a state database.
+"""
+import os, sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+os.environ.setdefault("USAGE_DB_PATH", "")
+os.environ.setdefault("TRANSLATION_MEMORY_PATH", "")
+os.environ["STATE_DB_PATH"] = ""
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
@@ -0,0 +1,62 @@
+import threading
+from utils.gateway import CircuitBreaker
+
+
+def test_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Everyone else waits for the probe's verdict
+    assert not breaker.allow()
+
+
+def test_probe_success_closes():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_probe_failure_reopens():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=60)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.opened_at -= 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+
+
+def test_release_lets_the_next_caller_probe_at_once():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker.opened_at -= 60
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.is_open
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_release_from_another_thread_is_ignored():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    thread = threading.Thread(target=breaker.release)
+    thread.start()
+    thread.join()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
@@ -0,0 +1,81 @@
+import time, threading
+from utils.scheduler import ProviderScheduler, TokenBucket, INTERACTIVE, STANDARD, BACKGROUND
+
+
+def _queue(scheduler, granted, *tickets):
+    """Queue `(name, priority, tenant)` tickets one at a time, in order, each in its own thread."""
+    threads = []
+    for name, priority, tenant in tickets:
+        waiting = sum(scheduler.status()["waiting"].values())
+        thread = threading.Thread(
+            target=lambda name=name, priority=priority, tenant=tenant: (
+                scheduler.acquire(1, priority, tenant) and granted.append(name)
+            )
+        )
+        thread.start()
+        threads.append(thread)
+        deadline = time.monotonic() + 2
+        while sum(scheduler.status()["waiting"].values()) == waiting:
+            assert time.monotonic() < deadline, "ticket was never queued"
+            time.sleep(0.001)
+    return threads
+
+
+def _empty(rpm):
+    # Nothing is granted until every ticket is queued, then one every 60 / rpm seconds
+    scheduler = ProviderScheduler(rpm, 1e9)
+    scheduler.requests.tokens = 0
+    scheduler.pause(0.3)
+    return scheduler
+
+
+def test_bucket_refills_at_its_rate():
+    bucket = TokenBucket(per_minute=60)
+    bucket.take(60)
+    assert 0.9 < bucket.wait_time(1) <= 1.0
+    # Bigger than the bucket: waits for a full bucket instead of forever
+    assert bucket.wait_time(1000) <= 60
+
+
+def test_higher_priority_goes_first():
+    scheduler, granted = _empty(rpm=1200), []
+    threads = _queue(
+        scheduler, granted,
+        ("background", BACKGROUND, "a"), ("standard", STANDARD, "a"), ("interactive", INTERACTIVE, "a"),
+    )
+    for thread in threads:
+        thread.join()
+    assert granted == ["interactive", "standard", "background"]
+
+
+def test_tenants_take_turns_within_a_priority():
+    scheduler, granted = _empty(rpm=1200), []
+    threads = _queue(
+        scheduler, granted,
+        ("a1", STANDARD, "a"), ("a2", STANDARD, "a"), ("a3", STANDARD, "a"),
+        ("b1", STANDARD, "b"), ("b2", STANDARD, "b"),
+    )
+    for thread in threads:
+        thread.join()
+    assert granted == ["a1", "b1", "a2", "b2", "a3"]
+
+
+def test_timeout_gives_up_the_place_in_line():
+    scheduler = _empty(rpm=1)
+    assert scheduler.acquire(1, timeout=0.05) is False
+    assert sum(scheduler.status()["waiting"].values()) == 0
+
+
+def test_pause_holds_back_every_caller():
+    scheduler = ProviderScheduler(1e6, 1e9)
+    scheduler.pause(0.2)
+    started = time.monotonic()
+    assert scheduler.acquire(1)
+    assert time.monotonic() - started >= 0.19
+
+
+def test_settle_returns_unused_tokens():
+    scheduler = ProviderScheduler(1e6, 1000)
+    scheduler.acquire(800)
+    scheduler.settle(800, 100)
+    assert scheduler.tokens.wait_time(800) == 0
@@ -0,0 +1,95 @@
+import random
+from utils.semantic_cache import SemanticCache, MinHasher, shingles, jaccard, lsh_params
+
+WORDS = [f"word{i}" for i in range(2000)]
+
+
+def _document(seed, length=400):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def _edit(text, changes, seed=0):
+    rng, words = random.Random(seed), text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+def _cache(**kwargs):
+    return SemanticCache("test", enabled=True, shared=None, **kwargs)
+
+
+def test_signature_estimates_jaccard():
+    hasher = MinHasher(128)
+    a, b = shingles(_document(1)), shingles(_edit(_document(1), 40))
+    x, y = hasher.signature(a), hasher.signature(b)
+    estimate = sum(p == q for p, q in zip(x, y)) / len(x)
+    assert abs(estimate - jaccard(a, b)) < 0.15
+
+
+def test_lsh_params_cover_every_permutation():
+    bands, rows = lsh_params(0.9, 128)
+    assert bands * rows <= 128
+
+
+def test_exact_and_near_duplicates_hit():
+    cache, text = _cache(threshold=0.8), _document(1)
+    cache.put(text, "value")
+    assert cache.get(text).similarity == 1.0
+    hit = cache.get(_edit(text, 3))
+    assert hit is not None and hit.value == "value" and hit.similarity >= 0.8
+
+
+def test_below_threshold_misses():
+    text = _document(1)
+    edited = _edit(text, 10)
+    assert 0.8 <= jaccard(shingles(text), shingles(edited)) < 0.9
+    strict, loose = _cache(threshold=0.9), _cache(threshold=0.8)
+    for cache in (strict, loose):
+        cache.put(text, "value")
+        assert cache.get(_document(2)) is None
+    assert strict.get(edited) is None
+    assert loose.get(edited).value == "value"
+
+
+def test_namespaces_are_isolated():
+    cache, text = _cache(), _document(1)
+    cache.put(text, "first", namespace="tenant-a")
+    assert cache.get(text, namespace="tenant-b") is None
+    assert cache.get(text) is None
+    assert cache.get(text, namespace="tenant-a").value == "first"
+    cache.put(text, "second", namespace="tenant-b")
+    assert cache.get(text, namespace="tenant-a").value == "first"
+    assert cache.get(text, namespace="tenant-b").value == "second"
+
+
+def test_sketch_can_be_reused_for_get_and_put():
+    cache, text = _cache(), _document(1)
+    sketch = cache.sketch(text)
+    assert cache.sketch(text) is sketch
+    assert cache.get(text, sketch=sketch) is None
+    cache.put(text, "value", sketch=sketch)
+    assert cache.get(text).value == "value"
+
+
+def test_cluster_groups_near_duplicates():
+    cache, text = _cache(), _document(1)
+    assert cache.cluster(text) == cache.cluster(_edit(text, 2))
+    assert cache.cluster(text) != cache.cluster(_document(2))
+
+
+def test_oldest_entries_are_evicted():
+    cache = _cache(max_entries=2)
+    for seed in range(3):
+        cache.put(_document(seed), seed)
+    assert cache.get(_document(0)) is None
+    assert cache.get(_document(2)).value == 2
+    assert cache.stats()["entries"] == 2
+
+
+def test_disabled_cache_stores_nothing():
+    cache = SemanticCache("off", enabled=False, shared=None)
+    cache.put(_document(1), "value")
+    assert cache.get(_document(1)) is None
+    assert cache.sketch(_document(1)) is None
@@ -0,0 +1,132 @@
+import gc, time, threading
+import pytest
+from utils.singleflight import SingleFlight, fingerprint
+
+
+def _join(flights, key, fn, **kwargs):
+    """Run `flights.do` in a thread; returns the thread and a dict with its result or error."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = flights.do(key, fn, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_fingerprint_ignores_dispatch_arguments_but_not_scope():
+    key = fingerprint("review", "system", "message", {"temperature": 0.1, "deadline": 5})
+    assert key == fingerprint("review", "system", "message", {"temperature": 0.1, "hedge": True})
+    assert key != fingerprint("review", "system", "message", {"temperature": 0.1}, scope="key:other")
+
+
+def test_followers_share_the_leaders_result():
+    flights, release, calls = SingleFlight(), threading.Event(), []
+
+    def fn():
+        calls.append(1)
+        release.wait()
+        return "answer"
+
+    leader, leader_outcome = _join(flights, "k", fn)
+    _wait_for(lambda: flights.stats()["in_flight"])
+    shared = []
+    follower, follower_outcome = _join(flights, "k", fn, on_shared=lambda: shared.append(1))
+    _wait_for(lambda: shared)
+    release.set()
+    leader.join()
+    follower.join()
+    assert leader_outcome["result"] == follower_outcome["result"] == "answer"
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 1}
+
+
+def test_leader_error_reaches_followers_and_is_not_cached():
+    flights, release = SingleFlight(), threading.Event()
+
+    def fail():
+        release.wait()
+        raise ValueError("provider down")
+
+    leader, leader_outcome = _join(flights, "k", fail)
+    _wait_for(lambda: flights.stats()["in_flight"])
+    shared = []
+    follower, follower_outcome = _join(flights, "k", fail, on_shared=lambda: shared.append(1))
+    _wait_for(lambda: shared)
+    release.set()
+    leader.join()
+    follower.join()
+    assert isinstance(leader_outcome["error"], ValueError)
+    assert follower_outcome["error"] is leader_outcome["error"]
+    # The next call starts a new flight
+    assert flights.do("k", lambda: "recovered") == "recovered"
+
+
+def _upstream(produced, items=1000):
+    for i in range(items):
+        produced.append(i)
+        time.sleep(0.002)
+        yield i
+
+
+def test_stream_is_replayed_to_late_joiners():
+    flights, produced = SingleFlight(), []
+    leader = flights.do("k", lambda: _upstream(produced, 20), stream=True)
+    assert [next(leader), next(leader)] == [0, 1]
+    follower = flights.do("k", lambda: _upstream(produced, 20), stream=True)
+    assert list(follower) == list(range(20))
+    assert list(leader) == list(range(2, 20))
+    assert flights.stats()["leaders"] == 1
+
+
+def test_follower_cancel_keeps_the_stream_for_the_others():
+    flights, produced = SingleFlight(), []
+    leader = flights.do("k", lambda: _upstream(produced, 20), stream=True)
+    follower = flights.do("k", lambda: _upstream(produced, 20), stream=True)
+    assert next(follower) == 0
+    follower.close()
+    assert list(leader) == list(range(20))
+
+
+def test_stream_stops_when_every_subscriber_leaves():
+    flights, produced = SingleFlight(), []
+    leader = flights.do("k", lambda: _upstream(produced), stream=True)
+    follower = flights.do("k", lambda: _upstream(produced), stream=True)
+    next(leader)
+    leader.close()
+    follower.close()
+    _wait_for(lambda: flights.stats()["in_flight"] == 0)
+    stopped = len(produced)
+    time.sleep(0.05)
+    assert len(produced) <= stopped + 1 < 1000
+
+
+def test_unread_subscription_is_released_when_dropped():
+    flights, produced = SingleFlight(), []
+    subscription = flights.do("k", lambda: _upstream(produced), stream=True)
+    del subscription
+    gc.collect()
+    _wait_for(lambda: flights.stats()["in_flight"] == 0)
+    assert len(produced) < 1000
+
+
+def test_stream_error_reaches_subscribers():
+    def broken():
+        yield "partial"
+        raise ConnectionError("reset")
+
+    subscription = SingleFlight().do("k", broken, stream=True)
+    assert next(subscription) == "partial"
+    with pytest.raises(ConnectionError):
+        next(subscription)
@@ -0,0 +1,85 @@
+from utils.translation_memory import TranslationMemory, mask_numbers, fill_numbers, segment
+
+
+class Translator:
+    """Stands in for the provider: tags each segment, and records every batch it is sent."""
+
+    def __init__(self, drop_placeholders=False):
+        self.batches = []
+        self.drop_placeholders = drop_placeholders
+
+    def __call__(self, texts, language):
+        self.batches.append(list(texts))
+        translations = [f"[{language}] {text}" for text in texts]
+        if self.drop_placeholders:
+            translations = [translation.replace("{0}", "") for translation in translations]
+        return translations
+
+
+def _memory(path=None, **kwargs):
+    return TranslationMemory(path=str(path) if path else None, curated=None, **kwargs)
+
+
+def test_numbers_round_trip_through_placeholders():
+    masked, numbers = mask_numbers("2 high priority, 1 low priority, score 7.5/10")
+    assert masked == "{0} high priority, {1} low priority, score {2}"
+    assert fill_numbers(masked, numbers) == "2 high priority, 1 low priority, score 7.5/10"
+    # Reordered by the translation is fine, lost or invented is not
+    assert fill_numbers("score {2}, {1} low, {0} high", numbers) == "score 7.5/10, 1 low, 2 high"
+    assert fill_numbers("{0} high priority", numbers) is None
+    assert fill_numbers("{0} {1} {2} {3}", numbers) is None
+
+
+def test_segments_join_back_into_the_line():
+    line = "- **Strengths:** Python (Django) — 5 years\n"
+    assert "".join(text for _, text in segment(line)) == line
+    assert (True, "Python (Django)") in segment(line)
+
+
+def test_glossary_is_translated_once_and_reused_with_other_numbers():
+    memory, translator = _memory(), Translator()
+    memory.register_glossary(["Strengths", "Average score: 7.0/10"])
+    lines = list(memory.translate(["Strengths\n", "Average score: 6.5/10\n"], "Yoruba", translator))
+    assert lines == ["[Yoruba] Strengths\n", "[Yoruba] Average score: 6.5/10\n"]
+    assert translator.batches == [["Strengths", "Average score: {0}"]]
+    list(memory.translate(["Average score: 9/10"], "Yoruba", translator))
+    assert len(translator.batches) == 1
+
+
+def test_glossary_is_shared_through_the_database(tmp_path):
+    first, translator = _memory(tmp_path / "translations.db"), Translator()
+    first.register_glossary(["Weaknesses"])
+    list(first.translate(["Weaknesses"], "Hausa", translator))
+    second = _memory(tmp_path / "translations.db")
+    second.register_glossary(["Weaknesses"])
+    assert list(second.translate(["Weaknesses"], "Hausa", translator)) == ["[Hausa] Weaknesses"]
+    assert len(translator.batches) == 1
+
+
+def test_free_text_is_reused_within_its_scope_only():
+    memory, translator = _memory(), Translator()
+    list(memory.translate(["Led a team of 4 engineers"], "Igbo", translator, scope="tenant-a"))
+    again = list(memory.translate(["Led a team of 6 engineers"], "Igbo", translator, scope="tenant-a"))
+    assert again == ["[Igbo] Led a team of 6 engineers"]
+    assert len(translator.batches) == 1
+    list(memory.translate(["Led a team of 4 engineers"], "Igbo", translator, scope="tenant-b"))
+    assert len(translator.batches) == 2
+
+
+def test_translation_that_loses_a_placeholder_is_retried_unmasked():
+    memory, translator = _memory(), Translator(drop_placeholders=True)
+    lines = list(memory.translate(["Scored 8 out of ten"], "Swahili", translator))
+    assert translator.batches == [["Scored {0} out of ten"], ["Scored 8 out of ten"]]
+    assert lines == ["[Swahili] Scored 8 out of ten"]
+    # Not remembered, since it never came back usable
+    assert memory.lookup("Swahili", [TranslationMemory.key("Scored 8 out of ten")]) == {}
+
+
+def test_fuzzy_match_needs_the_same_words():
+    memory, translator = _memory(fuzzy_threshold=0.9), Translator()
+    list(memory.translate(["Strong communication potential"], "Yoruba", translator))
+    assert list(memory.translate(["Strong communication potentials"], "Yoruba", translator)) == [
+        "[Yoruba] Strong communication potential"
+    ]
+    list(memory.translate(["Strong communication inability"], "Yoruba", translator))
+    assert len(translator.batches) == 2
@@ -0,0 +1,104 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from utils.usage import UsageLedger, QuotaExceeded
+
+QUOTAS = {
+    "tenant": {"tokens_per_day": 100, "usd_per_day": None},
+    "application": {"tokens": None, "usd": None},
+    "overrides": {"key:big": {"tokens_per_day": 1000}},
+}
+
+
+def _usage(prompt, completion):
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion)
+
+
+def _ledger(path, **kwargs):
+    return UsageLedger(str(path) if path else None, quotas=QUOTAS, flush_interval=3600, **kwargs)
+
+
+def test_check_raises_once_the_quota_is_used(tmp_path):
+    ledger = _ledger(tmp_path / "usage.db")
+    ledger.check("key:a")
+    ledger.record("review", "gpt-4o", _usage(60, 30), tenant="key:a", application_id="app")
+    ledger.check("key:a")
+    ledger.record("review", "gpt-4o", _usage(10, 0), tenant="key:a", application_id="app")
+    with pytest.raises(QuotaExceeded) as error:
+        ledger.check("key:a")
+    assert (error.value.scope, error.value.limit, error.value.used) == ("tenant", "tokens_per_day", 100)
+    # Other tenants and overrides are counted on their own
+    ledger.check("key:b")
+    ledger.record("review", "gpt-4o", _usage(60, 40), tenant="key:big", application_id="app")
+    ledger.check("key:big")
+
+
+def test_totals_survive_a_flush(tmp_path):
+    ledger = _ledger(tmp_path / "usage.db")
+    ledger.record("review", "gpt-4o", _usage(50, 10), tenant="key:a", application_id="app")
+    ledger.check("key:a")
+    ledger.flush()
+    # Neither lost nor counted twice: 60 before, 60 + 30 after
+    ledger.check("key:a")
+    ledger.record("review", "gpt-4o", _usage(30, 0), tenant="key:a", application_id="app")
+    ledger.check("key:a")
+    ledger.flush()
+    ledger.record("review", "gpt-4o", _usage(10, 0), tenant="key:a", application_id="app")
+    with pytest.raises(QuotaExceeded):
+        ledger.check("key:a")
+
+
+def test_other_workers_see_flushed_charges(tmp_path):
+    ledger = _ledger(tmp_path / "usage.db")
+    other = UsageLedger(str(tmp_path / "usage.db"), quotas=QUOTAS, flush_interval=0)
+    ledger.record("review", "gpt-4o", _usage(80, 20), tenant="key:a", application_id="app")
+    other.check("key:a")
+    ledger.flush()
+    with pytest.raises(QuotaExceeded):
+        other.check("key:a")
+
+
+def test_charges_being_flushed_still_count(tmp_path):
+    ledger = _ledger(tmp_path / "usage.db")
+    ledger.record("review", "gpt-4o", _usage(80, 20), tenant="key:a", application_id="app")
+    writing, release = threading.Event(), threading.Event()
+    connect = ledger._connect
+
+    def slow_connect():
+        if threading.current_thread().name == "flush":
+            writing.set()
+            release.wait()
+        return connect()
+
+    ledger._connect = slow_connect
+    flush = threading.Thread(target=ledger.flush, name="flush")
+    flush.start()
+    try:
+        assert writing.wait(2)
+        # Recording is not held up by the write, and the rows in flight are counted
+        ledger.record("review", "gpt-4o", _usage(1, 0), tenant="key:b", application_id="app")
+        with pytest.raises(QuotaExceeded):
+            ledger.check("key:a")
+    finally:
+        release.set()
+        flush.join()
+    with pytest.raises(QuotaExceeded) as error:
+        ledger.check("key:a")
+    assert error.value.used == 100
+
+
+def test_failed_flush_keeps_the_charges(tmp_path):
+    ledger = _ledger(tmp_path / "missing" / "usage.db")
+    ledger.record("review", "gpt-4o", _usage(80, 20), tenant="key:a", application_id="app")
+    ledger.flush()
+    with pytest.raises(QuotaExceeded):
+        ledger.check("key:a")
+
+
+def test_memory_mode_summary():
+    ledger = _ledger(None)
+    ledger.record("review", "llama-3.1-8b-instant", _usage(1000, 500), tenant="key:a", application_id="app")
+    ledger.flush()
+    summary = ledger.summary("key:a", "app")
+    assert summary["total"]["calls"] == 1
+    assert summary["total"]["prompt_tokens"] == 1000